@@ -0,0 +1,164 @@
+"""Backtest the shipped waterlogging models against the labelled sensor history.
+
+Replays the labelled rows through the server's feature plan, scores them in
+chunks across a process pool and reports accuracy per split plus serving
+speed (batched rows/sec and single-row p50/p99 latency).
+
+    cd backend && python backtest.py --workers 4 --chunk-size 256
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ML_DIR = Path(__file__).parent / "ML"
+
+_models = None
+
+
+def _init_worker(model_dir: str):
+    global _models
+    _models = (
+        joblib.load(Path(model_dir) / "rf_classifier.joblib"),
+        joblib.load(Path(model_dir) / "xgb_regressor.joblib"),
+    )
+
+
+def _score_chunk(task):
+    """Score one chunk as a single batch; returns class indices and model time."""
+    start, matrix = task
+    rf, xgb = _models
+    began = time.perf_counter()
+    proba = rf.predict_proba(matrix)
+    xgb.predict(matrix)
+    return start, proba.argmax(axis=1), time.perf_counter() - began
+
+
+def _row_latencies(matrix: np.ndarray, samples: int) -> list:
+    """Time the single-row serving path (one predict_proba + one predict)."""
+    rf, xgb = _models
+    rows = np.random.default_rng(0).choice(len(matrix), min(samples, len(matrix)), replace=False)
+    latencies = []
+    for i in rows:
+        row = matrix[i:i + 1]
+        began = time.perf_counter()
+        rf.predict_proba(row)
+        xgb.predict(row)
+        latencies.append(time.perf_counter() - began)
+    return latencies
+
+
+def raw_labels(timestamps: np.ndarray):
+    """Labels and splits from the CSV rows themselves, aligned to `timestamps`.
+
+    The store forward-fills gaps, so its label columns also hold copies of
+    the previous hour's label; hours the CSV leaves unlabelled come back NaN.
+    """
+    from services.data_store import AIR_CSV, SOIL_CSV
+    from services.sensor_store import epochs_from_datetimes
+
+    for path in (SOIL_CSV, AIR_CSV):
+        df = pd.read_csv(path)
+        if "waterlogging_risk" in df.columns:
+            break
+    else:
+        raise ValueError("No sensor CSV has a waterlogging_risk column")
+    df.index = epochs_from_datetimes(pd.to_datetime(df["hour"]))
+    df = df[~df.index.duplicated(keep="last")].reindex(timestamps)
+    return df["waterlogging_risk"].to_numpy(dtype=object), df["split"].to_numpy(dtype=object)
+
+
+def build_matrix(plan_names):
+    """Feature matrix for every stored row, plus labels and splits."""
+    from services.data_store import data_store
+    from services.feature_plan import FeaturePlan, WeatherTrack
+
+    # No historical weather is stored, so rain/et0 features replay as zero
+    matrix = FeaturePlan(plan_names).fill(data_store.feature_frame(), WeatherTrack.from_forecast(None))
+    labels, splits = raw_labels(data_store.sensors.timestamps)
+    return np.ascontiguousarray(matrix), labels, splits
+
+
+def run(model_dir: Path, workers: int, chunk_size: int, latency_samples: int) -> dict:
+    names = json.loads((model_dir / "feature_list.json").read_text())
+    matrix, labels, splits = build_matrix(names)
+    _init_worker(str(model_dir))
+    classes = _models[0].classes_
+    labelled = np.isin(labels, classes)
+    matrix, labels, splits = matrix[labelled], labels[labelled], splits[labelled]
+
+    tasks = [(start, matrix[start:start + chunk_size]) for start in range(0, len(matrix), chunk_size)]
+
+    # Workers load the models once; wall time includes pool start-up and
+    # shipping the chunks, so it is the honest end-to-end rate
+    began = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(model_dir),)) as pool:
+            results = list(pool.map(_score_chunk, tasks))
+    else:
+        results = [_score_chunk(task) for task in tasks]
+    wall_seconds = time.perf_counter() - began
+    latencies = _row_latencies(matrix, latency_samples)
+
+    predicted = np.empty(len(matrix), dtype=np.int64)
+    batch_seconds = 0.0
+    for start, best, seconds in results:
+        predicted[start:start + len(best)] = best
+        batch_seconds += seconds
+
+    correct = classes[predicted] == labels
+    report = {
+        "rows": int(len(matrix)),
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "accuracy": {"all": round(float(correct.mean()), 4)},
+        "support": {"all": int(len(matrix))},
+        "rows_per_sec": round(len(matrix) / wall_seconds, 1),
+        "batch_rows_per_sec": round(len(matrix) / batch_seconds, 1),
+        "row_latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies else None,
+            "p99": round(float(np.percentile(latencies, 99)) * 1000, 3) if latencies else None,
+            "samples": len(latencies),
+        },
+    }
+    for split in ("train", "val", "test"):
+        mask = splits == split
+        if mask.any():
+            report["accuracy"][split] = round(float(correct[mask].mean()), 4)
+            report["support"][split] = int(mask.sum())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", type=Path, default=ML_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Process pool size (0 scores in this process)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--latency-samples", type=int, default=200,
+                        help="Rows also scored one at a time for the latency percentiles")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.model_dir, args.workers, args.chunk_size, args.latency_samples)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Backtest: {report['rows']} labelled rows, {args.workers} workers, chunks of {args.chunk_size}")
+    for split, accuracy in report["accuracy"].items():
+        print(f"  accuracy {split:<5} {accuracy:.4f}  (n={report['support'][split]})")
+    print(f"  throughput      {report['rows_per_sec']} rows/sec "
+          f"({report['batch_rows_per_sec']} rows/sec inside batches)")
+    latency = report["row_latency_ms"]
+    print(f"  row latency     p50 {latency['p50']} ms, p99 {latency['p99']} ms ({latency['samples']} rows)")
+
+
+if __name__ == "__main__":
+    main()
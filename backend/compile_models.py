@@ -0,0 +1,64 @@
+"""Compile the tree models into flat node arrays for fast single-row inference.
+
+Writes <model>.npz next to each joblib file. The server loads the compiled
+file instead of the joblib one while its recorded digest matches the source,
+so rerun this after retraining.
+
+    cd backend && python compile_models.py
+"""
+import argparse
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from services.shared_store import load_artifact
+from services.tree_ensemble import compile_file, compiled_path
+
+ML_DIR = Path(__file__).parent / "ML"
+MODELS = [
+    ML_DIR / "rf_classifier.joblib",
+    ML_DIR / "xgb_regressor.joblib",
+    ML_DIR / "Irrigation" / "xgb_regressor.joblib",
+]
+
+
+def _latency_us(fn, row, repeats: int = 200) -> float:
+    fn(row)
+    times = []
+    for _ in range(repeats):
+        began = time.perf_counter()
+        fn(row)
+        times.append(time.perf_counter() - began)
+    return float(np.median(times)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("models", nargs="*", type=Path, default=MODELS)
+    parser.add_argument("--rows", type=int, default=1000, help="Random rows checked for parity")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for path in args.models:
+        with warnings.catch_warnings():
+            # Models pickled by an older scikit-learn still load and compile exactly
+            warnings.simplefilter("ignore")
+            original = load_artifact(path)
+            compiled = compile_file(path)
+        X = rng.normal(0, 50, (args.rows, compiled.n_features_in_)).astype(np.float32)
+        if compiled.kind == "proba":
+            reference, fast = original.predict_proba, compiled.predict_proba
+        else:
+            reference, fast = original.predict, compiled.predict
+        worst = float(np.abs(reference(X) - fast(X)).max())
+        row = X[:1]
+        print(f"{path.relative_to(ML_DIR)} -> {compiled_path(path).name}: "
+              f"{compiled.n_trees} trees, {compiled.n_nodes} nodes, depth {compiled.depth}, "
+              f"{path.stat().st_size // 1024} KB -> {compiled_path(path).stat().st_size // 1024} KB")
+        print(f"  max |diff| {worst:.2e}; single row {_latency_us(reference, row):.0f} us -> {_latency_us(fast, row):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
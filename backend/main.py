@@ -5,13 +5,15 @@ from dotenv import load_dotenv
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+import asyncio
 import os
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 # Import routers
-from routers import dashboard, history, irrigation, npk, analytics, chat
+from routers import dashboard, history, irrigation, npk, analytics, chat, ingest, registry
 
 app = FastAPI(title="Smart Soil Health Monitoring System API")
 
@@ -30,6 +32,8 @@ app.include_router(history.router, prefix="/api")
 app.include_router(irrigation.router, prefix="/api")
 app.include_router(npk.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")
+app.include_router(ingest.router, prefix="/api")
+app.include_router(registry.router, prefix="/api")
 app.include_router(chat.router) # Router already has /api/chat prefix
 
 # Configure logging
@@ -39,6 +43,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# In shared mode gunicorn runs with --preload, so models loaded here live in
+# the master process and forked workers share their pages copy-on-write.
+from services.shared_store import SHARED_MODE
+if SHARED_MODE:
+    from services.model_registry import model_registry
+    model_registry.preload()
+
+# Warm every prediction response, then keep them fresh in the background
+from services.precompute import PRECOMPUTE_ENABLED, precompute
+from services.batcher import batchers, bind_batchers
+from services.weather_service import WEATHER_PREFETCH_ENABLED, weather_service
+
+@app.on_event("startup")
+async def start_precompute():
+    # Micro-batchers collect concurrent single-row predictions on this loop
+    bind_batchers(asyncio.get_running_loop())
+    # Every worker runs the prefetcher; one fetches, the rest read its file
+    if WEATHER_PREFETCH_ENABLED:
+        weather_service.start_prefetch()
+    if PRECOMPUTE_ENABLED:
+        precompute.start()
+
+@app.on_event("shutdown")
+def close_weather_client():
+    weather_service.close()
+
+# Inference runs on a bounded worker pool; a full pool answers 503 instead of queueing
+from services.executor import PoolSaturated, pools
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated(request: Request, exc: PoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.get("/api/pools")
+async def get_pools():
+    """Returns load and latency metrics for each worker pool and micro-batcher, and the weather client"""
+    return {
+        "pools": [pool.metrics() for pool in pools.values()],
+        "batchers": [batcher.metrics() for batcher in batchers.values()],
+        "weather": weather_service.metrics(),
+    }
+
 @app.get("/")
 async def root():
     return {"message": "Smart Soil Health Monitoring System API is running"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
 from datetime import datetime
 
@@ -23,6 +23,15 @@ class StatusResponse(BaseModel):
     last_updated: str
 
 
+class PredictionSpread(BaseModel):
+    """A prediction and its spread across the trees of the ensemble."""
+    mean: float
+    p10: float
+    p50: float
+    p90: float
+    spread: float
+
+
 # NpkValue, Recommendation, NpkPredictionResponse moved to models/npk.py
 
 class WaterloggingRiskResponse(BaseModel):
@@ -40,6 +49,7 @@ class WaterloggingRiskResponse(BaseModel):
     ml_confidence: float
     ml_risk_probabilities: Dict[str, float]
     ml_hours_until_waterlogging: float
+    ml_uncertainty: Optional[Dict[str, PredictionSpread]] = None
     ml_alert_active: bool
     ml_source: str
     rain_next_6h_mm: float = 0.0
@@ -47,10 +57,48 @@ class WaterloggingRiskResponse(BaseModel):
     peak_rain_hour: str = ""
     hourly_forecast: Optional[List[Dict]] = None
 
+class WaterloggingTimelinePoint(BaseModel):
+    timestamp: str
+    wfps: float
+    risk_class: str
+    confidence: float
+    probabilities: Dict[str, float]
+    hours_until_waterlogging: float
+
+class WaterloggingTimelineResponse(BaseModel):
+    classes: List[str]
+    count: int
+    points: List[WaterloggingTimelinePoint]
+
 class SensorHistoryResponse(BaseModel):
     parameter: str
     days: int
+    resolution: str = "raw"
     data: List[Dict]
     count: int
     min_value: float = 0.0
     max_value: float = 0.0
+
+class SensorStatsResponse(BaseModel):
+    parameter: str
+    from_: Optional[str] = Field(None, alias="from")
+    to: Optional[str] = None
+    count: int
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    latest: Optional[float] = None
+
+class SensorSeries(BaseModel):
+    timestamps: List[str]
+    values: List[float]
+    count: int
+    min: Optional[List[float]] = None
+    max: Optional[List[float]] = None
+
+class MultiSensorHistoryResponse(BaseModel):
+    parameters: List[str]
+    days: int
+    resolution: str = "raw"
+    series: Dict[str, SensorSeries]
@@ -1,14 +1,18 @@
 from pydantic import BaseModel
-from typing import List, Any
+from typing import List, Any, Optional
 from datetime import datetime
 
 class HistoryItem(BaseModel):
     timestamp: str
     value: float
+    # Bucket extremes, present for rollup resolutions
+    min: Optional[float] = None
+    max: Optional[float] = None
 
 class HistoryResponse(BaseModel):
     parameter: str
     days: int
+    resolution: str = "raw"
     data: List[HistoryItem]
 
 class Alert(BaseModel):
@@ -0,0 +1,39 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class SoilReading(BaseModel):
+    node_id: str
+    timestamp: datetime
+    moisture_pct: Optional[float] = None
+    soil_temp_c: Optional[float] = None
+    pH: Optional[float] = None
+    ec_mscm: Optional[float] = None
+    nitrogen_mgkg: Optional[float] = None
+    phosphorus_mgkg: Optional[float] = None
+    potassium_mgkg: Optional[float] = None
+    wfps_pct: Optional[float] = None
+    wfps_rate_1h: Optional[float] = None
+    above_fc: Optional[bool] = None
+
+class AirReading(BaseModel):
+    node_id: str
+    timestamp: datetime
+    air_temp_c: Optional[float] = None
+    humidity_pct: Optional[float] = None
+    vpd_kpa: Optional[float] = None
+    humidity_rate_1h: Optional[float] = None
+    air_temp_rate_1h: Optional[float] = None
+
+class IngestRequest(BaseModel):
+    soil: List[SoilReading] = Field(default_factory=list)
+    air: List[AirReading] = Field(default_factory=list)
+
+class IngestResponse(BaseModel):
+    accepted: int
+    merged: int = 0
+    duplicates: int
+    out_of_order: int
+    empty: int
+    total_records: int
+    latest_timestamp: Optional[str] = None
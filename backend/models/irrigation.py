@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, confloat
 from typing import Dict, List, Optional
+from models.dashboard import PredictionSpread
 
 class IrrigationStatus(BaseModel):
     soil_moisture: float
@@ -26,6 +27,8 @@ class IrrigationPredictionResponse(BaseModel):
     predictions: Dict[str, float]
     trend: str
     confidence: str
+    # Spread of the 24h prediction; None when the fallback trend is served
+    uncertainty: Optional[PredictionSpread] = None
     recommendation: IrrigationRecommendation
     coordination: Coordination
 
@@ -45,3 +48,62 @@ class IrrigationLogRequest(BaseModel):
     moisture_before: Optional[float] = None
     moisture_after: Optional[float] = None
     cost: Optional[float] = None
+
+# What-if bounds: four times the largest single irrigation (35 L/m²), and
+# weather changes well beyond anything the forecast or the model has seen
+SCENARIO_MAX_VOLUME_L_PER_M2 = 35.0 * 4
+SCENARIO_MAX_RAIN_DELTA_MM = 500.0
+SCENARIO_MAX_TEMP_DELTA_C = 20.0
+
+ScenarioVolume = confloat(ge=0, le=SCENARIO_MAX_VOLUME_L_PER_M2, allow_inf_nan=False)
+ScenarioRainDelta = confloat(ge=-SCENARIO_MAX_RAIN_DELTA_MM, le=SCENARIO_MAX_RAIN_DELTA_MM, allow_inf_nan=False)
+ScenarioTempDelta = confloat(ge=-SCENARIO_MAX_TEMP_DELTA_C, le=SCENARIO_MAX_TEMP_DELTA_C, allow_inf_nan=False)
+
+class IrrigationScenarioRequest(BaseModel):
+    volumes_l_per_m2: List[ScenarioVolume] = Field(..., min_length=1, max_length=200, description="Candidate irrigation volumes (L/m²)")
+    rain_deltas_mm: List[ScenarioRainDelta] = Field(default_factory=lambda: [0.0], min_length=1, max_length=50, description="Changes to the 48h forecast rain (mm)")
+    temp_deltas_c: List[ScenarioTempDelta] = Field(default_factory=lambda: [0.0], min_length=1, max_length=50, description="Changes to the 24h mean air temperature (°C)")
+
+class IrrigationScenarioBaseline(BaseModel):
+    soil_moisture: float
+    rain_next_48h_mm: float
+    avg_temp_24h: float
+
+class IrrigationScenario(BaseModel):
+    volume_l_per_m2: float
+    rain_delta_mm: float
+    temp_delta_c: float
+    moisture_24h: float
+    moisture_7d: float
+    status: str
+    peak_wfps: float
+    waterlogging_safe: bool
+    cost_hectare: float
+
+class IrrigationScenarioResponse(BaseModel):
+    baseline: IrrigationScenarioBaseline
+    count: int
+    scenarios: List[IrrigationScenario]
+
+class MoistureBand(BaseModel):
+    min: float
+    max: float
+
+class IrrigationScheduleDay(BaseModel):
+    day: int
+    date: str
+    irrigate: bool
+    volume_l_per_m2: float
+    moisture_start: float
+    moisture_end: float
+    rain_mm: float
+    et0_mm: Optional[float] = None
+    waterlogging_window: bool
+
+class IrrigationScheduleResponse(BaseModel):
+    horizon_days: int
+    band: MoistureBand
+    schedule: List[IrrigationScheduleDay]
+    total_water_l_per_m2: float
+    total_cost_hectare: float
+    days_in_band: int
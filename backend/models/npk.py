@@ -1,12 +1,20 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime
+from models.dashboard import PredictionSpread
 
 class NpkValue(BaseModel):
     N: float
     P: float
     K: float
 
+class NpkTrajectoryPoint(BaseModel):
+    day: int
+    date: str
+    N: float
+    P: float
+    K: float
+
 class Recommendation(BaseModel):
     action: str
     timing: str
@@ -21,6 +29,9 @@ class NpkPredictionResponse(BaseModel):
     current: NpkValue
     seven_days: NpkValue = Field(alias="7_days")
     fourteen_days: NpkValue = Field(alias="14_days")
+    trajectory: List[NpkTrajectoryPoint] = []
+    # {"7_days": {"N": spread, ...}, "14_days": {...}}; None without per-tree outputs
+    uncertainty: Optional[Dict[str, Dict[str, PredictionSpread]]] = None
     recommendation: Recommendation
 
 class FertilizationEvent(BaseModel):
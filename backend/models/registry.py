@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class ModelFamilyStatus(BaseModel):
+    family: str
+    active_version: Optional[str] = None
+    previous_version: Optional[str] = None
+    versions: List[str]
+    loaded_at: Optional[str] = None
+    load_seconds: Optional[float] = None
+    memory_bytes: Optional[int] = None
+    loading: Optional[str] = None
+    error: Optional[str] = None
+
+class ModelsResponse(BaseModel):
+    families: List[ModelFamilyStatus]
+
+class ActivateModelRequest(BaseModel):
+    version: str
+
+class ModelActionResponse(BaseModel):
+    status: str
+    family: str
+    version: str
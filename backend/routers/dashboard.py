@@ -1,9 +1,14 @@
-from fastapi import APIRouter
-from models.dashboard import StatusResponse, WaterloggingRiskResponse, SensorHistoryResponse
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from models.dashboard import StatusResponse, WaterloggingRiskResponse, SensorHistoryResponse, MultiSensorHistoryResponse, SensorStatsResponse, WaterloggingTimelineResponse
 from services.dashboard_service import dashboard_service
 from services.data_store import data_store
+from services.executor import inference_pool
+from services.precompute import precompute
 
 router = APIRouter(tags=["Dashboard"])
+precompute.register("waterlogging-risk", dashboard_service.get_waterlogging_risk, WaterloggingRiskResponse)
 
 @router.get("/status", response_model=StatusResponse)
 async def get_status():
@@ -11,28 +16,68 @@ async def get_status():
     return dashboard_service.get_status()
 
 @router.get("/sensor-history", response_model=SensorHistoryResponse)
-async def get_sensor_history(parameter: str, days: int = 7):
+async def get_sensor_history(
+    parameter: str,
+    days: int = 7,
+    resolution: Literal["raw", "hourly", "6h", "daily", "auto"] = "raw",
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample to at most this many points"),
+):
     """Returns historical sensor data for a specific parameter"""
-    data = data_store.get_history_for_parameter(parameter, days)
+    resolution = data_store.resolve_resolution(days, resolution, max_points)
+    data = data_store.get_history_for_parameter(parameter, days, resolution, max_points)
     
     if not data:
         return {
             "parameter": parameter,
             "days": days,
+            "resolution": resolution,
             "data": [],
             "count": 0,
             "min_value": 0.0,
             "max_value": 0.0
         }
     
-    values = [d["value"] for d in data]
+    # Exact window extremes from the range tables, whatever the resolution
+    stats = data_store.get_range_stats(parameter, datetime.now(timezone.utc) - timedelta(days=days))
+    if not stats["count"]:
+        stats = {"min": min(d.get("min", d["value"]) for d in data), "max": max(d.get("max", d["value"]) for d in data)}
     return {
         "parameter": parameter,
         "days": days,
+        "resolution": resolution,
         "data": data,
         "count": len(data),
-        "min_value": min(values),
-        "max_value": max(values)
+        "min_value": stats["min"],
+        "max_value": stats["max"]
+    }
+
+@router.get("/sensor-stats", response_model=SensorStatsResponse)
+async def get_sensor_stats(
+    parameter: str,
+    start: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive), ISO 8601"),
+    end: Optional[datetime] = Query(None, alias="to", description="Window end (exclusive), ISO 8601"),
+):
+    """Returns count/mean/std/min/max of a parameter over a time window in constant time"""
+    stats = data_store.get_range_stats(parameter, start, end)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"Unknown numeric parameter '{parameter}'")
+    return stats
+
+@router.get("/sensor-history/multi", response_model=MultiSensorHistoryResponse, response_model_exclude_none=True)
+async def get_multi_sensor_history(
+    parameters: str = Query(..., description="Comma-separated parameters, e.g. nitrogen,ph,soil_moisture"),
+    days: int = 7,
+    resolution: Literal["raw", "hourly", "6h", "daily", "auto"] = "raw",
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample each series to at most this many points"),
+):
+    """Returns several parameters over one window as column arrays"""
+    names = [p.strip() for p in parameters.split(",") if p.strip()]
+    resolution = data_store.resolve_resolution(days, resolution, max_points)
+    return {
+        "parameters": names,
+        "days": days,
+        "resolution": resolution,
+        "series": data_store.get_history_for_parameters(names, days, resolution, max_points),
     }
 
 # @router.get("/npk-predictions", ...) moved to routers/npk.py
@@ -40,4 +85,15 @@ async def get_sensor_history(parameter: str, days: int = 7):
 @router.get("/waterlogging-risk", response_model=WaterloggingRiskResponse)
 async def get_waterlogging_risk():
     """Returns waterlogging prediction and action plan"""
-    return dashboard_service.get_waterlogging_risk()
+    return precompute.response("waterlogging-risk") or await inference_pool.run(dashboard_service.get_waterlogging_risk)
+
+@router.get("/waterlogging-risk/timeline", response_model=WaterloggingTimelineResponse)
+async def get_waterlogging_timeline(
+    start: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive), ISO 8601"),
+    end: Optional[datetime] = Query(None, alias="to", description="Window end (exclusive), ISO 8601"),
+):
+    """Returns per-hour ML waterlogging risk over a past window (default: last 7 days of readings)"""
+    try:
+        return await inference_pool.run(dashboard_service.get_waterlogging_timeline, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -1,16 +1,22 @@
+from typing import Literal, Optional
 from fastapi import APIRouter, Query
 from models.history import HistoryResponse, AlertsResponse
 from services.history_service import history_service
+from services.executor import inference_pool
+from services.precompute import precompute
 
 router = APIRouter(tags=["History"])
+precompute.register("ph-predictions", history_service.get_ph_predictions)
 
-@router.get("/history", response_model=HistoryResponse)
+@router.get("/history", response_model=HistoryResponse, response_model_exclude_none=True)
 async def get_history(
     parameter: str = Query(..., description="Parameter to fetch (nitrogen, phosphorus, potassium, soil_moisture, pH)"),
-    days: int = Query(7, description="Number of days of history")
+    days: int = Query(7, description="Number of days of history"),
+    resolution: Literal["raw", "hourly", "6h", "daily", "auto"] = Query("raw", description="raw readings or hourly/6h/daily rollups; auto picks one that fits max_points"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample to at most this many points")
 ):
     """Returns historical data for charts"""
-    return history_service.get_history(parameter, days)
+    return await inference_pool.run(history_service.get_history, parameter, days, resolution, max_points)
 
 @router.get("/alerts", response_model=AlertsResponse)
 async def get_alerts():
@@ -22,7 +28,7 @@ async def get_alerts():
 @router.get("/ph-predictions")
 async def get_ph_predictions():
     """Returns pH predictions and correction recommendations"""
-    return history_service.get_ph_predictions()
+    return precompute.response("ph-predictions") or await inference_pool.run(history_service.get_ph_predictions)
 
 @router.get("/ph-history")
 async def get_ph_history():
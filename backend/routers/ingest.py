@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from models.ingest import IngestRequest, IngestResponse
+from services.data_store import data_store
+
+router = APIRouter(tags=["Ingestion"])
+
+@router.post("/ingest", response_model=IngestResponse)
+def ingest_readings(batch: IngestRequest):
+    """Appends a batch of soil and air readings to the sensor history"""
+    # Plain def: parsing and the store's write lock block, so this runs in the threadpool
+    return data_store.ingest(
+        [r.dict(exclude_none=True) for r in batch.soil],
+        [r.dict(exclude_none=True) for r in batch.air],
+    )
@@ -1,13 +1,33 @@
-from fastapi import APIRouter, Query
-from models.irrigation import IrrigationPredictionResponse, IrrigationHistoryResponse, IrrigationLogRequest
+from fastapi import APIRouter, HTTPException, Query
+from models.irrigation import IrrigationPredictionResponse, IrrigationHistoryResponse, IrrigationLogRequest, IrrigationScenarioRequest, IrrigationScenarioResponse, IrrigationScheduleResponse
 from services.irrigation_service import irrigation_service
+from services.executor import inference_pool
+from services.precompute import precompute
 
 router = APIRouter(tags=["Irrigation"])
+precompute.register("irrigation-predictions", irrigation_service.get_predictions, IrrigationPredictionResponse)
+precompute.register("irrigation-schedule", irrigation_service.get_schedule, IrrigationScheduleResponse)
 
 @router.get("/irrigation-predictions", response_model=IrrigationPredictionResponse)
 async def get_irrigation_predictions():
     """Returns moisture predictions and irrigation recommendations"""
-    return irrigation_service.get_predictions()
+    return precompute.response("irrigation-predictions") or await inference_pool.run(irrigation_service.get_predictions)
+
+@router.get("/irrigation/schedule", response_model=IrrigationScheduleResponse)
+async def get_irrigation_schedule():
+    """Returns the cheapest 7-day irrigation plan that keeps moisture in the optimal band"""
+    return precompute.response("irrigation-schedule") or await inference_pool.run(irrigation_service.get_schedule)
+
+@router.post("/irrigation/scenarios", response_model=IrrigationScenarioResponse)
+async def get_irrigation_scenarios(request: IrrigationScenarioRequest):
+    """Scores every volume x rain x temperature combination in one batched prediction"""
+    try:
+        return await inference_pool.run(
+            irrigation_service.get_scenarios,
+            request.volumes_l_per_m2, request.rain_deltas_mm, request.temp_deltas_c,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @router.get("/irrigation-history", response_model=IrrigationHistoryResponse)
 async def get_irrigation_history(days: int = Query(default=30, ge=1, le=365)):
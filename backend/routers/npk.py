@@ -1,13 +1,16 @@
 from fastapi import APIRouter
 from models.npk import NpkPredictionResponse, FertilizationHistoryResponse
 from services.npk_service import npk_service
+from services.executor import inference_pool
+from services.precompute import precompute
 
 router = APIRouter(tags=["NPK Management"])
+precompute.register("npk-predictions", npk_service.get_npk_predictions, NpkPredictionResponse)
 
 @router.get("/npk-predictions", response_model=NpkPredictionResponse, response_model_by_alias=True)
 async def get_npk_predictions():
     """Returns NPK forecast and fertilization recommendation"""
-    return npk_service.get_npk_predictions()
+    return precompute.response("npk-predictions") or await inference_pool.run(npk_service.get_npk_predictions)
 
 @router.get("/fertilization-history", response_model=FertilizationHistoryResponse)
 async def get_fertilization_history():
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from models.registry import ModelsResponse, ActivateModelRequest, ModelActionResponse
+from services.model_registry import model_registry
+
+router = APIRouter(tags=["Models"])
+
+@router.get("/models", response_model=ModelsResponse)
+async def get_models():
+    """Returns each model family's active version, load time and memory"""
+    return {"families": model_registry.status()}
+
+@router.post("/models/{family}/activate", response_model=ModelActionResponse, status_code=202)
+async def activate_model(family: str, request: ActivateModelRequest):
+    """Loads and validates a version in the background, then swaps it in"""
+    try:
+        started = model_registry.activate(family, request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    if not started:
+        raise HTTPException(status_code=409, detail=f"Model family '{family}' is already loading a version")
+    return {"status": "loading", "family": family, "version": request.version}
+
+@router.post("/models/{family}/rollback", response_model=ModelActionResponse)
+async def rollback_model(family: str):
+    """Swaps the previously active version back in"""
+    try:
+        version = model_registry.rollback(family)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if version is None:
+        raise HTTPException(status_code=409, detail=f"Model family '{family}' is already loading a version")
+    return {"status": "active", "family": family, "version": version}
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# BATCHING_ENABLED=0 scores every row on its own, in the caller's thread
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "1") != "0"
+# How long the first row of a batch waits for company, and the batch size that flushes at once
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", 3))
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", 64))
+# A worker thread waiting longer than this on its batch scores the row itself
+BATCH_TIMEOUT_S = float(os.environ.get("BATCH_TIMEOUT_S", 5))
+
+
+class MicroBatcher:
+    """Collects feature rows arriving within a few ms and scores them in one call.
+
+    `predict(matrix)` takes a 2-D array and returns one result per row.
+    Rows submitted within `window_ms` of the first pending row (or until
+    `max_rows` are pending) are stacked and scored together on the
+    batcher's own thread, and each caller gets its own row back.
+
+    The batcher lives on the server's event loop (see `bind`). Worker
+    threads call `predict_row`, which hands the row to the loop and waits;
+    callers on the loop thread itself, before a loop is bound, or in a
+    forked worker process (which inherits the binding but not the loop's
+    thread) score their row directly.
+    """
+
+    def __init__(self, name: str, predict: Callable[[np.ndarray], Sequence[Any]],
+                 window_ms: float = BATCH_WINDOW_MS, max_rows: int = BATCH_MAX_ROWS):
+        self.name = name
+        self.predict = predict
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # One thread, so batches never compete with the request pool that is waiting on them
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batch-{name}")
+        self._lock = threading.Lock()
+        self._metrics = {"batches": 0, "rows": 0, "direct_rows": 0, "timeouts": 0, "max_batch": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Bind to `loop`; call from the loop's own thread."""
+        self._loop = loop
+        self._loop_thread = threading.current_thread()
+        self._pid = os.getpid()
+
+    async def submit(self, row: np.ndarray) -> Any:
+        """Queue one row (on the bound loop) and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def predict_row(self, row: np.ndarray) -> Any:
+        """Blocking entry point for worker threads."""
+        row = np.asarray(row).ravel()
+        if not self._can_batch():
+            with self._lock:
+                self._metrics["direct_rows"] += 1
+            return self.predict(row[None, :])[0]
+        future = asyncio.run_coroutine_threadsafe(self.submit(row), self._loop)
+        try:
+            return future.result(timeout=BATCH_TIMEOUT_S)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            return self.predict(row[None, :])[0]
+
+    def _can_batch(self) -> bool:
+        loop, thread = self._loop, self._loop_thread
+        return (BATCHING_ENABLED and loop is not None and loop.is_running()
+                and os.getpid() == self._pid and thread is not None and thread.is_alive()
+                and not self._on_loop_thread())
+
+    @staticmethod
+    def _on_loop_thread() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            done = asyncio.get_running_loop().run_in_executor(self._executor, self._score, [row for row, _ in batch])
+            done.add_done_callback(lambda f: self._deliver(batch, f))
+
+    def _score(self, rows: List[np.ndarray]) -> Sequence[Any]:
+        results = self.predict(np.vstack(rows))
+        with self._lock:
+            self._metrics["batches"] += 1
+            self._metrics["rows"] += len(rows)
+            self._metrics["max_batch"] = max(self._metrics["max_batch"], len(rows))
+        return results
+
+    @staticmethod
+    def _deliver(batch: List[tuple], done: asyncio.Future):
+        error = done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+        m["name"] = self.name
+        m["window_ms"] = self.window * 1000
+        m["max_rows"] = self.max_rows
+        m["avg_batch"] = round(m["rows"] / m["batches"], 2) if m["batches"] else 0.0
+        return m
+
+
+# Every batcher, by name; main.py binds them to the server loop at startup
+batchers: Dict[str, MicroBatcher] = {}
+
+
+def register_batcher(name: str, predict: Callable[[np.ndarray], Sequence[Any]]) -> MicroBatcher:
+    batcher = MicroBatcher(name, predict)
+    batchers[name] = batcher
+    return batcher
+
+
+def bind_batchers(loop: asyncio.AbstractEventLoop):
+    for batcher in batchers.values():
+        batcher.bind(loop)
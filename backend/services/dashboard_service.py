@@ -1,103 +1,110 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from services.data_store import data_store
-from services.weather_service import weather_service
+from services.weather_service import forecast_now, weather_service
+from services.shared_store import load_artifact
+from services.tree_ensemble import compile_model, load_estimator, spread_summary
+from services.feature_plan import FeaturePlan, WeatherTrack
+from services.sensor_store import iso_from_epochs, to_epoch
+from services.snapshot import Snapshot, snapshots
+from services.batcher import register_batcher
+from services.model_registry import model_registry
 from models.dashboard import StatusResponse, WaterloggingRiskResponse
 import json
 import numpy as np
-import joblib
-import pandas as pd
 from pathlib import Path
-from functools import lru_cache
 
 ML_DIR = Path(__file__).parent.parent / "ML"
-ATM_LEAD = 4
-
-@lru_cache(maxsize=1)
-def _load_models():
-    # Waterlogging models
-    rf_wl  = joblib.load(ML_DIR / "rf_classifier.joblib")
-    xgb_wl = joblib.load(ML_DIR / "xgb_regressor.joblib")
-    with open(ML_DIR / "feature_list.json",  "r") as f: features = json.load(f)
-    with open(ML_DIR / "label_encoder.json", "r") as f: le_map   = json.load(f)
-    
-    # NPK/pH model (Multi-Output Regressor)
-    npk_model = joblib.load(ML_DIR / "NPK" / "cropiq_rf_model.pkl")
-    scaler_x = joblib.load(ML_DIR / "NPK" / "scaler_X.pkl")
-    scaler_y = joblib.load(ML_DIR / "NPK" / "scaler_y.pkl")
-    
+# Longest window the timeline endpoint scores in one request
+TIMELINE_MAX_HOURS = 24 * 366
+# Days in the NPK/pH trajectory, and the day served as the 7-day point forecast
+NPK_FORECAST_DAYS = 14
+NPK_POINT_DAY = 7
+
+def _load_waterlogging(directory: Path) -> dict:
+    with open(directory / "feature_list.json",  "r") as f: features = json.load(f)
+    with open(directory / "label_encoder.json", "r") as f: le_map   = json.load(f)
+    rf = load_estimator(directory / "rf_classifier.joblib")
+    xgb = load_estimator(directory / "xgb_regressor.joblib")
     return {
-        "waterlogging": (rf_wl, xgb_wl, features, le_map),
-        "npk_ph": (npk_model, scaler_x, scaler_y)
+        "rf": rf,
+        "xgb": xgb,
+        # Flat-array copies (the same objects when compiled models are served)
+        # that expose per-tree outputs for the ensemble spread
+        "rf_trees": compile_model(rf),
+        "xgb_trees": compile_model(xgb),
+        "features": features,
+        "le_map": le_map,
+        "plan": FeaturePlan(features),
     }
 
 
-def engineer_features_single(history_df: pd.DataFrame) -> dict:
-    df = history_df.copy()
-    
-    # 3a — Sort the DataFrame
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values('timestamp')
-    
-    # Pre-calculate WFPS if not present (assuming columns names might differ in history)
-    if 'wfps_pct' not in df.columns and 'soil_moisture' in df.columns:
-        df['wfps_pct'] = (df['soil_moisture'] / 50) * 100
-        
-    # Standardize column names for engineering - only if they aren't already correct
-    rename_map = {
-        'air_temp': 'temperature_c',
-        'humidity': 'humidity_pct',
-        'rain_mm': 'rain_mm'
-    }
-    # Avoid creating duplicates by only renaming if target doesn't exist
-    for old_col, new_col in rename_map.items():
-        if old_col in df.columns and new_col not in df.columns:
-            df = df.rename(columns={old_col: new_col})
-            
-    # Deduplicate again just in case
-    df = df.loc[:, ~df.columns.duplicated()]
-
-    # 3b — WFPS rolling statistics
-    for w in [3, 6, 12, 24, 48]:
-        df[f'wfps_mean_{w}h'] = df['wfps_pct'].rolling(window=w, min_periods=1).mean()
-        df[f'wfps_std_{w}h'] = df['wfps_pct'].rolling(window=w, min_periods=1).std().fillna(0)
-        
-    # 3c — WFPS rate of change
-    df['wfps_rate_1h'] = df['wfps_pct'].diff(periods=1).fillna(0)
-    df['wfps_rate_3h'] = df['wfps_pct'].diff(periods=3).fillna(0)
-    df['wfps_rate_6h'] = df['wfps_pct'].diff(periods=6).fillna(0)
-    
-    # 3d — Atmospheric rolling statistics with forecast lead
-    for col in ['humidity_pct', 'temperature_c', 'rain_mm']:
-        if col in df.columns:
-            for w in [3, 6, 12, 24, 48]:
-                df[f'{col}_mean_{w}h'] = df[col].shift(ATM_LEAD).rolling(window=w, min_periods=1).mean()
-                
-    # 3e — Additional derived columns
-    if 'humidity_pct' in df.columns:
-        df['humidity_rate_1h'] = df['humidity_pct'].diff(periods=1).fillna(0)
-    
-    if 'rain_mm' in df.columns:
-        df['rain_6h_total'] = df['rain_mm'].rolling(window=6, min_periods=1).sum()
-        df['rain_24h_total'] = df['rain_mm'].rolling(window=24, min_periods=1).sum()
-        df['rain_48h_forecast'] = df['rain_mm'].shift(ATM_LEAD).rolling(window=48, min_periods=1).sum()
-        
-    # 3f — Drainage lag column
-    above_70 = df['wfps_pct'] > 70
-    group_id = (~above_70).cumsum()
-    df['drainage_lag_h'] = above_70.groupby(group_id).cumsum().where(above_70, 0).fillna(0)
-    
-    # 3g — Cyclical time features
-    df['hour_sin'] = np.sin(2 * np.pi * df['timestamp'].dt.hour / 24)
-    df['hour_cos'] = np.cos(2 * np.pi * df['timestamp'].dt.hour / 24)
-    df['doy_sin'] = np.sin(2 * np.pi * df['timestamp'].dt.dayofyear / 365)
-    df['doy_cos'] = np.cos(2 * np.pi * df['timestamp'].dt.dayofyear / 365)
-    
-    # 3h — Return the last row
-    return df.iloc[-1].to_dict()
+def _validate_waterlogging(models: dict):
+    rf, xgb, features = models["rf"], models["xgb"], models["features"]
+    for model in (rf, xgb):
+        if model.n_features_in_ != len(features):
+            raise ValueError(f"{type(model).__name__} expects {model.n_features_in_} features, feature_list has {len(features)}")
+    row = np.zeros((1, len(features)), dtype=np.float32)
+    if rf.predict_proba(row).shape != (1, len(rf.classes_)) or not np.isfinite(xgb.predict(row)).all():
+        raise ValueError("Waterlogging models returned malformed predictions")
+
+
+def _load_npk_ph(directory: Path) -> tuple:
+    # Multi-output regressor, its input/output scalers, and its flat-array
+    # copy for per-tree outputs (None if the model is not a tree ensemble)
+    model = load_artifact(directory / "cropiq_rf_model.pkl")
+    try:
+        trees = compile_model(model)
+    except TypeError:
+        trees = None
+    return (
+        model,
+        load_artifact(directory / "scaler_X.pkl"),
+        load_artifact(directory / "scaler_y.pkl"),
+        trees,
+    )
+
+
+def _validate_npk_ph(models: tuple):
+    model, scaler_x, scaler_y, _ = models
+    y = scaler_y.inverse_transform(model.predict(scaler_x.transform(np.zeros((1, scaler_x.n_features_in_)))))
+    if y.shape != (1, 4) or not np.isfinite(y).all():
+        raise ValueError(f"NPK/pH model returned shape {y.shape}; expected (1, 4) finite values")
+
+
+model_registry.register("waterlogging", ML_DIR, _load_waterlogging, _validate_waterlogging)
+model_registry.register("npk_ph", ML_DIR / "NPK", _load_npk_ph, _validate_npk_ph)
+
+
+def _score_waterlogging(matrix: np.ndarray) -> list:
+    """(class probabilities, hours until waterlogging, spread) for each row.
+
+    One tree walk per model gives both the prediction and its spread: the
+    random forest's per-tree probabilities of the predicted class, and the
+    XGBoost prediction over its last boosting rounds (see
+    CompiledEnsemble.uncertainty).
+    """
+    models = model_registry.get("waterlogging")
+    risk = models["rf_trees"].uncertainty(matrix)
+    hours = models["xgb_trees"].uncertainty(matrix)
+    proba = risk.pop("mean")
+    hours_until = np.clip(hours.pop("mean"), 0, 72).astype(np.float64)
+    hours = {key: value if key == "spread" else np.clip(value, 0, 72) for key, value in hours.items()}
+    return [
+        (proba[i], hours_until[i], {
+            "risk_class_probability": {"mean": float(proba[i].max()), **{k: float(v[i]) for k, v in risk.items()}},
+            "hours_until_waterlogging": {"mean": float(hours_until[i]), **{k: float(v[i]) for k, v in hours.items()}},
+        })
+        for i in range(len(matrix))
+    ]
+
+
+# Concurrent single-row requests (e.g. one per field) share a batched predict
+waterlogging_batcher = register_batcher("waterlogging", _score_waterlogging)
 
 
 class DashboardService:
     def get_status(self) -> dict:
+        # Straight from the store: the status endpoint never waits on weather
         current = data_store.get_current_data()
 
         npk_status = {
@@ -130,25 +137,15 @@ class DashboardService:
         }
 
     def get_waterlogging_risk(self) -> dict:
-        current = data_store.get_current_data()
-        history_df = data_store.get_history_df(hours=72)
-        
-        print("=== WATERLOGGING DEBUG ===")
-        print("history_df rows:", len(history_df))
-        print("history_df columns:", list(history_df.columns))
-        if len(history_df) > 0:
-            print("wfps_pct sample:", history_df["wfps_pct"].tail(3).tolist())
-            print("wfps_pct mean:", round(history_df["wfps_pct"].mean(), 2))
-            
-        current_data = engineer_features_single(history_df)
-        
-        print("wfps_rate_1h:", current_data.get("wfps_rate_1h", "MISSING"))
-        print("wfps_mean_24h:", current_data.get("wfps_mean_24h", "MISSING"))
-        print("rain_48h_forecast:", current_data.get("rain_48h_forecast", "MISSING"))
-        print("=== END DEBUG ===")
+        """Waterlogging risk for the latest reading, computed once per snapshot."""
+        # Shallow copy so callers can't alter the shared result's top level
+        return dict(snapshots.get("waterlogging"))
+
+    def _compute_waterlogging_risk(self, snapshot: Snapshot) -> dict:
+        current = snapshot.get("current")
 
         # ── Real Weather Forecast ────────────────────────────────
-        forecast = weather_service.get_weather_forecast()
+        forecast = snapshot.get("weather")
         rainfall_forecast = round(forecast["rain_next_48h_mm"], 1)
         rain_next_6h = round(forecast["rain_next_6h_mm"], 1)
         rain_next_24h = round(forecast["rain_next_24h_mm"], 1)
@@ -166,16 +163,13 @@ class DashboardService:
         )
 
         # ── ML Inference ─────────────────────────────────────────
-        models = _load_models()
-        rf, xgb, features, le_map = models["waterlogging"]
-
-        # Use engineered current_data values where available, else 0.0
-        feature_values = [current_data.get(f, 0.0) for f in features]
-        feature_vector = np.array(feature_values, dtype=np.float32).reshape(1, -1)
+        models = model_registry.get("waterlogging")
+        rf = models["rf"]
+        feature_vector = snapshot.get("waterlogging_features")
 
-        ml_risk_class  = rf.predict(feature_vector)[0]
-        ml_risk_proba  = rf.predict_proba(feature_vector)[0]
-        ml_hours_until = float(np.clip(xgb.predict(feature_vector)[0], 0, 72))
+        ml_risk_proba, ml_hours_until, ml_uncertainty = waterlogging_batcher.predict_row(feature_vector[0])
+        ml_risk_class  = rf.classes_[ml_risk_proba.argmax()]
+        ml_hours_until = float(ml_hours_until)
         ml_confidence  = float(ml_risk_proba.max())
 
         class_names   = list(rf.classes_)
@@ -224,6 +218,10 @@ class DashboardService:
             "ml_confidence"             : round(ml_confidence, 4),
             "ml_risk_probabilities"     : ml_proba_dict,
             "ml_hours_until_waterlogging": round(ml_hours_until, 1),
+            "ml_uncertainty"            : {
+                target: {key: round(value, 4) for key, value in stats.items()}
+                for target, stats in ml_uncertainty.items()
+            },
             "ml_alert_active"           : ml_hours_until <= 24 and final_risk.lower() != "safe",
             "ml_source"                 : "rf_classifier + xgb_regressor",
             "hourly_forecast"           : [
@@ -232,57 +230,160 @@ class DashboardService:
             ]
         }
 
+    def get_waterlogging_timeline(self, start=None, end=None) -> dict:
+        """Per-hour ML waterlogging risk for stored readings in [start, end).
+
+        Features for every hour come from one vectorized pass over the
+        history, then each model runs once on the whole matrix. Defaults to
+        the 7 days ending at the latest reading.
+        """
+        sensors = data_store.sensors
+        if end is None and len(sensors):
+            end = int(sensors.timestamps[-1]) + 3600
+        if start is None and end is not None:
+            start = (end - timedelta(days=7)) if isinstance(end, datetime) else end - 7 * 24 * 3600
+        span = sensors.span(start, end)
+        if span.stop - span.start > TIMELINE_MAX_HOURS:
+            raise ValueError(f"Timeline covers {span.stop - span.start} hours; the limit is {TIMELINE_MAX_HOURS}")
+
+        models = model_registry.get("waterlogging")
+        rf, xgb, plan = models["rf"], models["xgb"], models["plan"]
+        class_names = list(rf.classes_)
+        result = {"classes": class_names, "count": span.stop - span.start, "points": []}
+        if span.stop == span.start:
+            return result
+
+        weather = WeatherTrack.from_forecast(weather_service.get_weather_forecast())
+        frame = data_store.feature_frame(span.start, span.stop)
+        matrix = plan.fill(frame, weather)
+
+        proba = rf.predict_proba(matrix)
+        hours_until = np.clip(xgb.predict(matrix), 0, 72)
+        best = proba.argmax(axis=1)
+
+        stamps = iso_from_epochs(frame.timestamps())
+        wfps = np.round(frame.values("wfps"), 1).tolist()
+        classes = [class_names[i] for i in best]
+        confidence = np.round(proba[np.arange(len(best)), best], 4).tolist()
+        proba = np.round(proba, 4).tolist()
+        hours_until = np.round(hours_until.astype(np.float64), 1).tolist()
+        result["points"] = [
+            {
+                "timestamp": stamps[i],
+                "wfps": wfps[i],
+                "risk_class": classes[i],
+                "confidence": confidence[i],
+                "probabilities": dict(zip(class_names, proba[i])),
+                "hours_until_waterlogging": hours_until[i],
+            }
+            for i in range(len(stamps))
+        ]
+        return result
 
     def get_npk_ph_forecast(self) -> dict:
+        """7-day NPK/pH forecast, computed once per snapshot."""
+        return dict(snapshots.get("npk_ph"))
+
+    def get_npk_ph_trajectory(self) -> dict:
+        """Daily NPK/pH forecast for days 1-14 as arrays, computed once per snapshot."""
+        return snapshots.get("npk_ph_trajectory")
+
+    def _compute_npk_ph_forecast(self, snapshot: Snapshot) -> dict:
+        """Day 7 of the trajectory, as a point forecast."""
+        trajectory = snapshot.get("npk_ph_trajectory")
+        day = NPK_POINT_DAY - 1
+        return {
+            "N": float(trajectory["N"][day]),
+            "P": float(trajectory["P"][day]),
+            "K": float(trajectory["K"][day]),
+            "pH": float(trajectory["pH"][day]),
+            "source": trajectory["source"]
+        }
+
+    def _compute_npk_ph_trajectory(self, snapshot: Snapshot) -> dict:
         """
-        Performs 7-day NPK/pH prediction using the Multi-Output Regressor.
+        Performs the daily NPK/pH forecast using the Multi-Output Regressor.
         Inputs (7): temp_soil, moisture, ec, humidity, temp_air, hour, temp_diff
         Outputs (4): N, P, K, pH
+
+        One row per forecast day, with that day's forecast mean air
+        temperature and humidity, so the whole trajectory costs one scale,
+        one predict and one inverse transform.
         """
-        current = data_store.get_current_data()
-        models = _load_models()
-        model, scaler_x, scaler_y = models["npk_ph"]
-        
-        # 1. Construct 7-element feature vector
-        # Integrate weather forecast into the model inputs
-        weather = weather_service.get_weather_forecast()
-        avg_temp_air = np.mean(weather["hourly_temp_c"][:24]) if weather["hourly_temp_c"] else current["air_temp"]
-        avg_humidity = np.mean(weather["hourly_humidity_pct"][:24]) if weather["hourly_humidity_pct"] else current["humidity"]
-        
-        temp_soil = current["soil_temp"]
-        moisture = current["soil_moisture"]
-        ec = current["ec"]
-        humidity = avg_humidity # Use forecasted average
-        temp_air = avg_temp_air # Use forecasted average
-        hour = datetime.now().hour
-        temp_diff = temp_soil - temp_air
-        
-        feature_vector = np.array([[
-            temp_soil, moisture, ec, humidity, temp_air, hour, temp_diff
-        ]])
-        
-        # 2. Scale -> Predict -> Inverse Scale
+        current = snapshot.get("current")
+        forecast = snapshot.get("weather")
+        # Forecast hours are wall-clock times in the forecast's timezone
+        now = forecast_now(forecast)
+        days = np.arange(1, NPK_FORECAST_DAYS + 1)
+
+        # 1. Construct the (days x 7) feature matrix
+        # Each day's forecast window is the 24 hours after the same time of day
+        weather = WeatherTrack.from_forecast(forecast)
+        day_starts = int(to_epoch(now.replace(minute=0, second=0, microsecond=0))) + (days - 1) * 24 * 3600
+        temp_air = weather.window_mean("temp", day_starts, 0, 24)
+        humidity = weather.window_mean("humidity", day_starts, 0, 24)
+        # Days past the forecast horizon fall back to the current reading
+        temp_air = np.where(np.isnan(temp_air), current["air_temp"], temp_air)
+        humidity = np.where(np.isnan(humidity), current["humidity"], humidity)
+
+        temp_soil = np.full(len(days), current["soil_temp"], dtype=np.float64)
+        feature_matrix = np.column_stack([
+            temp_soil,
+            np.full(len(days), current["soil_moisture"], dtype=np.float64),
+            np.full(len(days), current["ec"], dtype=np.float64),
+            humidity,
+            temp_air,
+            np.full(len(days), now.hour, dtype=np.float64),
+            temp_soil - temp_air,
+        ])
+
+        # 2. Scale -> Predict -> Inverse Scale, once for every day
+        # With per-tree outputs, one tree walk also gives each day's spread:
+        # every tree's (days x 4) answer goes through the inverse scaler
+        spread = None
         try:
-            X_scaled = scaler_x.transform(feature_vector)
-            y_scaled = model.predict(X_scaled)
-            y_final = scaler_y.inverse_transform(y_scaled)[0]
-            
-            # Map outputs: [N, P, K, pH]
-            return {
-                "N": float(y_final[0]),
-                "P": float(y_final[1]),
-                "K": float(y_final[2]),
-                "pH": float(y_final[3]),
-                "source": "cropiq_rf_model"
-            }
+            model, scaler_x, scaler_y, trees = model_registry.get("npk_ph")
+            scaled = scaler_x.transform(feature_matrix)
+            if trees is None:
+                y_final = scaler_y.inverse_transform(model.predict(scaled))
+            else:
+                outputs = trees.tree_outputs(scaled)
+                y_final = scaler_y.inverse_transform(outputs.mean(axis=1))
+                samples = scaler_y.inverse_transform(outputs.reshape(-1, outputs.shape[-1])).reshape(outputs.shape)
+                spread = spread_summary(samples)
+            source = "cropiq_rf_model"
         except Exception as e:
             print(f"ERROR in NPK/pH prediction: {e}")
-            return {
-                "N": current["nitrogen"],
-                "P": current["phosphorus"],
-                "K": current["potassium"],
-                "pH": current["pH"],
-                "source": "fallback_current"
-            }
+            y_final = np.tile([current["nitrogen"], current["phosphorus"], current["potassium"], current["pH"]], (len(days), 1))
+            source = "fallback_current"
+
+        # Map outputs: [N, P, K, pH]
+        return {
+            "days": days,
+            "dates": [(now + timedelta(days=int(d))).date().isoformat() for d in days],
+            "N": y_final[:, 0],
+            "P": y_final[:, 1],
+            "K": y_final[:, 2],
+            "pH": y_final[:, 3],
+            "rain_mm": weather.window_sum("rain", day_starts, 0, 24),
+            # p10/p50/p90/spread, each (days x [N, P, K, pH]); None without per-tree outputs
+            "spread": spread,
+            "source": source
+        }
+
+dashboard_service = DashboardService()
+
+
+@snapshots.node("waterlogging_features")
+def _waterlogging_features(snapshot: Snapshot) -> np.ndarray:
+    # Model-ordered float32 vector for the latest reading, straight from the
+    # online engine's window state and the time-aligned forecast. Copied out
+    # of the plan's per-thread buffer since the snapshot outlives this call.
+    plan = model_registry.get("waterlogging")["plan"]
+    weather = WeatherTrack.from_forecast(snapshot.get("weather"))
+    return data_store.features.fill(plan, weather).copy()
+
 
-dashboard_service = DashboardService()
\ No newline at end of file
+snapshots.node("waterlogging")(dashboard_service._compute_waterlogging_risk)
+snapshots.node("npk_ph")(dashboard_service._compute_npk_ph_forecast)
+snapshots.node("npk_ph_trajectory")(dashboard_service._compute_npk_ph_trajectory)
\ No newline at end of file
@@ -1,24 +1,97 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import random
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from services.weather_service import weather_service
+from services.sensor_store import SensorStore, TimeIndex, epochs_from_datetimes, iso_from_epochs
+from services.shared_store import SHARED_MODE, SharedSensorStore
+from services.rollups import ROLLUP_LEVELS, RollupPyramid, lttb
+from services.range_stats import RangeStats
+from services.feature_engine import FeatureEngine
+from services.feature_plan import LOOKBACK_ROWS, FeatureFrame, WeatherTrack
 
 SOIL_CSV = Path(__file__).parent.parent / "data" / "soil_node1_full-1-2.csv"
 AIR_CSV  = Path(__file__).parent.parent / "data" / "air_node2_full-1.csv"
 
+# Preprocessed history, rebuilt only when a source CSV changes
+SNAPSHOT_PATH = Path(__file__).parent.parent / "data" / ".cache" / "sensor_snapshot.npz"
+SNAPSHOT_FORMAT = 2
+
+# Rows where all of these (raw CSV names) are missing carry no reading
+KEY_SENSOR_COLUMNS = ['moisture_pct', 'soil_temp_c', 'wfps_pct', 'air_temp', 'humidity']
+
+# Marks which node kind reported each ingested hour; the history records it
+# in `data_source` as "ingest:soil", "ingest:air" or "ingest:air+soil"
+NODE_FLAGS = {"soil": "_soil_reported", "air": "_air_reported"}
+
+# Raw CSV / ingest column names -> history column names
+SENSOR_COLUMN_RENAMES = {
+    'hour': 'timestamp',
+    'moisture_pct': 'soil_moisture',
+    'soil_temp_c': 'soil_temp',
+    'air_temp_c': 'air_temp',
+    'humidity_pct': 'humidity',
+    'pH': 'pH',
+    'ec_mscm': 'ec',
+    'nitrogen_mgkg': 'nitrogen',
+    'phosphorus_mgkg': 'phosphorus',
+    'potassium_mgkg': 'potassium',
+    'wfps_pct': 'wfps'
+}
+
+# Chart parameter names accepted by the API -> history column names
+PARAMETER_ALIASES = {
+    "nitrogen": "nitrogen",
+    "phosphorus": "phosphorus",
+    "potassium": "potassium",
+    "soil_moisture": "soil_moisture",
+    "ph": "pH",
+    "ph_level": "pH",
+    "soil_temp": "soil_temp",
+    "air_temp": "air_temp",
+    "humidity": "humidity",
+    "wfps": "wfps"
+}
+
+# Point budget for resolution="auto" when the client sends no max_points
+AUTO_MAX_POINTS = 500
+
+# Values used when a column is missing or still empty after forward-filling
+SENSOR_DEFAULTS = {
+    'nitrogen': 180,
+    'phosphorus': 35,
+    'potassium': 220,
+    'ec': 1.2,
+    'pH': 6.5,
+    'soil_moisture': 35.0,
+    'soil_temp': 26.0,
+    'air_temp': 28.0,
+    'humidity': 75.0,
+    'wfps': 70.0
+}
+
 class DataStore:
     def __init__(self):
-        try:
-            self.historical_data = self._load_real_data()
-            print(f"Loaded {len(self.historical_data)} real sensor records")
-        except Exception as e:
-            print(f"WARNING: Could not load real data ({e}), falling back to mock data")
-            self.historical_data = self._generate_historical_data()
+        if SHARED_MODE:
+            # One process builds the history; every worker maps the same pages
+            self.sensors = SharedSensorStore.attach_or_build(self._shared_key(), self._load_sensors)
+        else:
+            self.sensors = self._load_sensors()
+        self.rollups = RollupPyramid(self.sensors)
+        self.range_stats = RangeStats(self.sensors)
+        self.features = FeatureEngine(self.sensors)
+        # Called with the ingest stats after new readings are appended
+        self.listeners = []
             
         self.alerts = self._generate_alerts()
         self.irrigation_history = self._generate_irrigation_history()
+        self.irrigation_index = TimeIndex(sorted(
+            datetime.fromisoformat(e["date"]).timestamp() for e in self.irrigation_history
+        ))
         self.ph_history = self._generate_ph_history()
 
     def _generate_historical_data(self):
@@ -69,6 +142,68 @@ class DataStore:
         
         return data
 
+    def _load_sensors(self) -> SensorStore:
+        try:
+            sensors = self._load_snapshot()
+            if sensors is None:
+                sensors = self._load_real_data()
+                self._save_snapshot(sensors)
+            print(f"Loaded {len(sensors)} real sensor records")
+            return sensors
+        except Exception as e:
+            print(f"WARNING: Could not load real data ({e}), falling back to mock data")
+            return SensorStore.from_records(self._generate_historical_data())
+
+    def _shared_key(self) -> str:
+        try:
+            sources = self._source_hashes()
+        except OSError:
+            sources = ["mock"]
+        return hashlib.sha256(json.dumps([SNAPSHOT_FORMAT, sources]).encode()).hexdigest()
+
+    @staticmethod
+    def _source_stats() -> list:
+        return [
+            {"name": p.name, "size": p.stat().st_size, "mtime_ns": p.stat().st_mtime_ns}
+            for p in (SOIL_CSV, AIR_CSV)
+        ]
+
+    @staticmethod
+    def _source_hashes() -> list:
+        return [hashlib.sha256(p.read_bytes()).hexdigest() for p in (SOIL_CSV, AIR_CSV)]
+
+    def _load_snapshot(self):
+        """Load the preprocessed history if it still matches the source CSVs"""
+        if not SNAPSHOT_PATH.exists():
+            return None
+        try:
+            store, meta = SensorStore.load(SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable sensor snapshot ({e})")
+            return None
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None
+
+        stats = self._source_stats()
+        if meta.get("sources") == stats:
+            return store
+
+        # Size or mtime moved (e.g. a fresh checkout): fall back to the content hash
+        if meta.get("sha256") != self._source_hashes():
+            return None
+        self._save_snapshot(store)
+        return store
+
+    def _save_snapshot(self, store: SensorStore):
+        try:
+            store.save(SNAPSHOT_PATH, meta={
+                "format": SNAPSHOT_FORMAT,
+                "sources": self._source_stats(),
+                "sha256": self._source_hashes(),
+            })
+        except Exception as e:
+            print(f"WARNING: Could not write sensor snapshot ({e})")
+
     def _load_real_data(self):
         """Load real sensor data from CSV files"""
         # 1. Read SOIL_CSV
@@ -81,81 +216,219 @@ class DataStore:
         air_df = air_df.rename(columns={'hour': 'timestamp'})
         air_df['timestamp'] = pd.to_datetime(air_df['timestamp'])
         
-        # 3. Rename air temperature column
-        # Possible names: air_temp_c, temperature, temp, air_temperature
-        air_rename_map = {}
-        for col in ['air_temp_c', 'temperature', 'temp', 'air_temperature']:
-            if col in air_df.columns:
-                air_rename_map[col] = 'air_temp'
-                break
-        
-        # Rename humidity if needed (using 'humidity' as target for internal dict)
-        if 'humidity_pct' in air_df.columns:
-            air_rename_map['humidity_pct'] = 'humidity'
-            
-        air_df = air_df.rename(columns=air_rename_map)
+        # 3. Rename air temperature / humidity columns
+        air_df = self._rename_air_columns(air_df)
         
         # 4. Merge DataFrames on timestamp
-        # Drop overlapping columns from air_df except timestamp to avoid _x/_y suffixes
-        cols_to_drop = [c for c in air_df.columns if c in soil_df.columns and c != 'timestamp']
-        air_df_clean = air_df.drop(columns=cols_to_drop)
-        
-        merged = pd.merge(soil_df, air_df_clean, on='timestamp', how='inner')
+        merged = self._merge_nodes(soil_df, air_df, how='inner')
         
         # 5. Sort and reset index
         merged = merged.sort_values('timestamp').reset_index(drop=True)
         
         # Step 1 — Update _load_real_data() to handle NaN rows
         # Drop rows where all key sensor values are NaN
-        key_cols = ['moisture_pct', 'soil_temp_c', 'wfps_pct', 'air_temp', 'humidity']
-        # Check which of these are actually in the dataframe before dropping
-        existing_keys = [c for c in key_cols if c in merged.columns]
-        if existing_keys:
-            merged = merged.dropna(subset=existing_keys, how='all')
+        merged = self._drop_empty_rows(merged)
 
         # Forward-fill remaining NaN values so charts have no gaps
         merged = merged.ffill().bfill()
 
         # Step 2 — Ensure all history columns are correctly named
-        merged = merged.rename(columns={
-            'hour': 'timestamp',
-            'moisture_pct': 'soil_moisture',
-            'soil_temp_c': 'soil_temp',
-            'air_temp_c': 'air_temp',
-            'humidity_pct': 'humidity',
-            'pH': 'pH',
-            'ec_mscm': 'ec',
-            'nitrogen_mgkg': 'nitrogen',
-            'phosphorus_mgkg': 'phosphorus',
-            'potassium_mgkg': 'potassium',
-            'wfps_pct': 'wfps'
-        })
+        merged = merged.rename(columns=SENSOR_COLUMN_RENAMES)
         
         # Add missing columns or fill NaNs with defaults (final safety pass)
-        defaults = {
-            'nitrogen': 180,
-            'phosphorus': 35,
-            'potassium': 220,
-            'ec': 1.2,
-            'pH': 6.5,
-            'soil_moisture': 35.0,
-            'soil_temp': 26.0,
-            'air_temp': 28.0,
-            'humidity': 75.0,
-            'wfps': 70.0
-        }
+        merged = self._apply_defaults(merged)
+                
+        # 7. Store as typed column arrays with an epoch-seconds timestamp array
+        return SensorStore.from_frame(merged)
+
+    @staticmethod
+    def _rename_air_columns(air_df: pd.DataFrame) -> pd.DataFrame:
+        # Possible names: air_temp_c, temperature, temp, air_temperature
+        air_rename_map = {}
+        for col in ['air_temp_c', 'temperature', 'temp', 'air_temperature']:
+            if col in air_df.columns:
+                air_rename_map[col] = 'air_temp'
+                break
         
-        for col, val in defaults.items():
+        # Rename humidity if needed (using 'humidity' as target for internal dict)
+        if 'humidity_pct' in air_df.columns:
+            air_rename_map['humidity_pct'] = 'humidity'
+            
+        return air_df.rename(columns=air_rename_map)
+
+    @staticmethod
+    def _merge_nodes(soil_df: pd.DataFrame, air_df: pd.DataFrame, how: str) -> pd.DataFrame:
+        # Drop overlapping columns from air_df except timestamp to avoid _x/_y suffixes
+        cols_to_drop = [c for c in air_df.columns if c in soil_df.columns and c != 'timestamp']
+        return pd.merge(soil_df, air_df.drop(columns=cols_to_drop), on='timestamp', how=how)
+
+    @staticmethod
+    def _drop_empty_rows(merged: pd.DataFrame) -> pd.DataFrame:
+        # Check which of the key columns are actually in the dataframe before dropping
+        existing_keys = [c for c in KEY_SENSOR_COLUMNS if c in merged.columns]
+        if existing_keys:
+            merged = merged.dropna(subset=existing_keys, how='all')
+        return merged
+
+    @staticmethod
+    def _apply_defaults(merged: pd.DataFrame) -> pd.DataFrame:
+        for col, val in SENSOR_DEFAULTS.items():
             if col not in merged.columns:
                 merged[col] = val
             else:
                 merged[col] = merged[col].fillna(val)
-                
-        # 7. Convert timestamp to ISO format strings
-        merged['timestamp'] = merged['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-        
-        # 8. Convert to records
-        return merged.to_dict(orient='records')
+        return merged
+
+    def ingest(self, soil_readings: List[dict], air_readings: List[dict]) -> dict:
+        """Append a batch of soil and air readings to the end of the history.
+
+        Timestamps are floored to the hour, since the history holds one row
+        per hour. Within a batch, readings are de-duplicated on (node_id,
+        hour), keeping the latest reading of each node within the hour.
+        Hours newer than the stored tail are appended. A node reporting late
+        for the latest stored hour has its columns merged into that row in
+        place. Any other older reading is a duplicate when its node's
+        columns are already stored for that hour (the stored reading is
+        kept), and out of order otherwise. The
+        load-time rules run on the new rows only: empty rows are dropped,
+        gaps are forward-filled from the last stored reading, then defaults
+        fill whatever is still missing.
+        """
+        with self.sensors.writer():
+            stats = {"accepted": 0, "merged": 0, "duplicates": 0, "out_of_order": 0, "empty": 0}
+            soil_df, soil_tail = self._new_readings(soil_readings, "soil", stats)
+            air_df, air_tail = self._new_readings(air_readings, "air", stats)
+
+            if len(soil_tail) or len(air_tail):
+                tail = self._merge_nodes(soil_tail, self._rename_air_columns(air_tail), how='outer')
+                self._merge_into_tail(self._node_flags(tail).rename(columns=SENSOR_COLUMN_RENAMES))
+                stats["merged"] = len(soil_tail) + len(air_tail)
+
+            merged = self._merge_nodes(soil_df, self._rename_air_columns(air_df), how='outer').sort_values('timestamp')
+            merged = self._node_flags(merged)
+            before = len(merged)
+            merged = self._drop_empty_rows(merged)
+            stats["empty"] = before - len(merged)
+
+            if len(merged):
+                merged['data_source'] = [
+                    self._ingest_source({kind for kind, flag in (("soil", soil), ("air", air)) if flag})
+                    for soil, air in zip(merged[NODE_FLAGS["soil"]], merged[NODE_FLAGS["air"]])
+                ]
+                merged = merged.drop(columns=list(NODE_FLAGS.values())).rename(columns=SENSOR_COLUMN_RENAMES)
+                self._append_tail(merged.reset_index(drop=True))
+                stats["accepted"] = len(merged)
+
+            latest = self.sensors.timestamps[-1:] if len(self.sensors) else []
+            result = {
+                **stats,
+                "total_records": len(self.sensors),
+                "latest_timestamp": iso_from_epochs(latest)[0] if len(latest) else None,
+            }
+
+        # Outside the write lock: listeners may read the new rows
+        if stats["accepted"] or stats["merged"]:
+            for listener in self.listeners:
+                listener(result)
+        return result
+
+    @staticmethod
+    def _node_flags(merged: pd.DataFrame) -> pd.DataFrame:
+        # The outer merge leaves NaN where a node kind did not report
+        for flag in NODE_FLAGS.values():
+            merged[flag] = merged[flag].fillna(False).astype(bool)
+        return merged
+
+    @staticmethod
+    def _ingest_source(kinds) -> str:
+        return "ingest:" + "+".join(sorted(kinds))
+
+    @staticmethod
+    def _reported_nodes(source: str) -> set:
+        """Node kinds whose columns a stored row really holds (CSV rows hold both)."""
+        if source.startswith("ingest:"):
+            return set(source[len("ingest:"):].split("+"))
+        return {"soil", "air"}
+
+    def _new_readings(self, readings: List[dict], kind: str, stats: dict) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Hourly readings of one node kind: (hours after the stored tail, late ones for the tail hour)"""
+        if not readings:
+            empty = pd.DataFrame({'timestamp': pd.Series(dtype=np.int64), NODE_FLAGS[kind]: pd.Series(dtype=bool)})
+            return empty, empty
+        df = pd.DataFrame(readings)
+        # The latest reading of a node within an hour wins
+        df['timestamp'] = epochs_from_datetimes(df['timestamp'])
+        df = df.sort_values('timestamp', kind='stable')
+        df['timestamp'] = df['timestamp'] // 3600 * 3600
+        df[NODE_FLAGS[kind]] = True
+
+        before = len(df)
+        df = df.drop_duplicates(subset=['node_id', 'timestamp'], keep='last')
+        stats["duplicates"] += before - len(df)
+
+        stored = self.sensors.timestamps
+        late = np.zeros(len(df), dtype=bool)
+        if len(stored):
+            epochs = df['timestamp'].to_numpy()
+            old = epochs <= stored[-1]
+            pos = np.minimum(np.searchsorted(stored, epochs[old]), len(stored) - 1)
+            found = stored[pos] == epochs[old]
+            sources = self.sensors.column('data_source')
+            present = np.array([
+                sources is None or kind in self._reported_nodes(str(sources[p])) for p in pos
+            ], dtype=bool)
+            duplicate = found & present
+            to_tail = found & ~present & (pos == len(stored) - 1)
+            stats["duplicates"] += int(np.count_nonzero(duplicate))
+            stats["out_of_order"] += int(np.count_nonzero(~duplicate & ~to_tail))
+            late[np.flatnonzero(old)[to_tail]] = True
+            keep = ~old
+        else:
+            keep = np.ones(len(df), dtype=bool)
+
+        # Several nodes of one kind reporting the same hour collapse to one row
+        def hourly(rows: pd.DataFrame) -> pd.DataFrame:
+            return rows.drop(columns=['node_id']).groupby('timestamp', as_index=False).last()
+        return hourly(df[keep]), hourly(df[late])
+
+    def _merge_into_tail(self, tail: pd.DataFrame):
+        """Write the late node's reported columns into the latest stored row"""
+        store = self.sensors
+        row = tail.iloc[0]
+        reported = {kind for kind, flag in NODE_FLAGS.items() if row[flag]}
+        values = {}
+        for name in store.parameters:
+            if name in ('data_source', *NODE_FLAGS.values()) or name not in row.index or pd.isna(row[name]):
+                continue
+            kind = store.column(name).dtype.kind
+            values[name] = str(row[name]) if kind == 'U' else bool(row[name]) if kind == 'b' else float(row[name])
+        if 'data_source' in store.parameters:
+            source = str(store.column('data_source')[-1])
+            values['data_source'] = self._ingest_source(self._reported_nodes(source) | reported)
+        store.update_tail(values)
+
+    def _append_tail(self, tail: pd.DataFrame):
+        """Forward-fill the new rows from the stored tail, apply defaults and append"""
+        store = self.sensors
+        if len(store):
+            seed = pd.DataFrame({name: [value] for name, value in store.row(-1).items() if name != 'timestamp'})
+            seed['timestamp'] = store.timestamps[-1]
+            frame = pd.concat([seed, tail], ignore_index=True).ffill().iloc[1:]
+        else:
+            frame = tail.ffill().bfill()
+        frame = self._apply_defaults(frame)
+
+        columns = {}
+        for name in store.parameters:
+            kind = store.column(name).dtype.kind
+            values = frame[name] if name in frame.columns else pd.Series([None] * len(frame))
+            if kind == 'U':
+                columns[name] = values.astype(str).to_numpy(dtype=str)
+            elif kind == 'b':
+                columns[name] = values.fillna(False).to_numpy(dtype=bool)
+            else:
+                columns[name] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+        store.append(frame['timestamp'].to_numpy(dtype=np.int64), columns)
     
     def _generate_alerts(self):
         """Generate active alerts"""
@@ -246,12 +519,25 @@ class DataStore:
         if "moisture_after" not in new_event:
              new_event["moisture_after"] = min(new_event["moisture_before"] + 20, 85.0)
 
-        self.irrigation_history.insert(0, new_event)
+        # irrigation_history is newest-first; the index is ascending
+        pos = self.irrigation_index.insert(datetime.fromisoformat(new_event["date"]))
+        self.irrigation_history.insert(len(self.irrigation_history) - pos, new_event)
         return new_event
+
+    def get_irrigation_events(self, days: int) -> list:
+        """Irrigation events from the last N days, newest first"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        span = self.irrigation_index.span(cutoff)
+        total = len(self.irrigation_history)
+        return self.irrigation_history[total - span.stop:total - span.start]
     
+    def data_tick(self) -> tuple:
+        """Changes whenever readings are appended (in any worker, in shared mode)"""
+        return (len(self.sensors), self.sensors.version)
+
     def get_current_data(self):
         """Get the most recent sensor reading"""
-        return self.historical_data[-1]
+        return self.sensors.row(-1)
 
     def get_management_features(self) -> dict:
         """Calculate features based on management history (fertilization, etc.)"""
@@ -269,107 +555,169 @@ class DataStore:
             "is_urea_used": True # Crucial for pH drift models
         }
 
-    def get_history(self, parameter: str, days: int):
+    def resolve_resolution(self, days: int, resolution: str = "raw", max_points: Optional[int] = None) -> str:
+        """Pick the finest source that fits the point budget when resolution is "auto".
+
+        Only binary searches are used, so a long window never scans raw rows.
+        """
+        if resolution != "auto":
+            return resolution
+        budget = max_points or AUTO_MAX_POINTS
+        start = datetime.now(timezone.utc) - timedelta(days=days)
+        span = self.sensors.span(start)
+        if span.stop - span.start <= budget:
+            return "raw"
+        for level in ROLLUP_LEVELS:
+            if self.rollups.count(level, start) <= budget:
+                return level
+        return level
+
+    def get_series(self, column: str, days: int, resolution: str = "raw", max_points: Optional[int] = None) -> Optional[dict]:
+        """Arrays for one column over the last N days at the given resolution.
+
+        "raw" slices the stored readings; "hourly", "6h" and "daily" read the
+        rollup buckets (mean as value, plus min/max). A series longer than
+        `max_points` is LTTB-downsampled to that many points.
+        """
+        start = datetime.now(timezone.utc) - timedelta(days=days)
+        resolution = self.resolve_resolution(days, resolution, max_points)
+        if resolution == "raw":
+            values = self.sensors.column(column)
+            if values is None:
+                return None
+            span = self.sensors.span(start)
+            series = {"timestamps": self.sensors.timestamps[span], "value": values[span]}
+            if values.dtype.kind == "f":
+                present = ~np.isnan(series["value"])
+                if not present.all():
+                    series = {key: arr[present] for key, arr in series.items()}
+        else:
+            series = self.rollups.query(resolution, column, start)
+            if series is None:
+                return None
+
+        if max_points and len(series["timestamps"]) > max_points and series["value"].dtype.kind == "f":
+            keep = lttb(series["timestamps"], series["value"], max_points)
+            series = {key: values[keep] for key, values in series.items()}
+        return series
+
+    @staticmethod
+    def _series_records(series: dict, decimals: Optional[int] = None) -> list:
+        stamps = iso_from_epochs(series["timestamps"])
+        fields = {
+            key: (np.round(values, decimals) if decimals is not None else values).tolist()
+            for key, values in series.items() if key != "timestamps"
+        }
+        return [
+            {"timestamp": stamp, **{key: values[i] for key, values in fields.items()}}
+            for i, stamp in enumerate(stamps)
+        ]
+
+    def get_history(self, parameter: str, days: int, resolution: str = "raw", max_points: Optional[int] = None):
         """Get historical data for a specific parameter (Used by Charting)"""
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        filtered = [d for d in self.historical_data if datetime.fromisoformat(d["timestamp"]) >= cutoff]
+        if resolution != "raw" or max_points:
+            series = self.get_series(parameter, days, resolution, max_points)
+            return self._series_records(series) if series is not None else []
+
+        span = self.sensors.span(datetime.now(timezone.utc) - timedelta(days=days))
         
-        return [{"timestamp": d["timestamp"], "value": d.get(parameter, 0)} for d in filtered]
+        values = self.sensors.column(parameter)
+        stamps = iso_from_epochs(self.sensors.timestamps[span])
+        values = values[span].tolist() if values is not None else [0] * len(stamps)
+        return [{"timestamp": t, "value": v} for t, v in zip(stamps, values)]
 
-    # Step 3 — Add get_history_for_parameter() method
-    def get_history_for_parameter(self, parameter: str, days: int = 7) -> list:
-        try:
-            df = pd.DataFrame(self.historical_data)
-            df['timestamp_dt'] = pd.to_datetime(df['timestamp'])
-            
-            cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-            df = df[df['timestamp_dt'] >= cutoff]
-            
-            param_map = {
-                "nitrogen": "nitrogen",
-                "phosphorus": "phosphorus",
-                "potassium": "potassium",
-                "soil_moisture": "soil_moisture",
-                "ph": "pH",
-                "ph_level": "pH",
-                "soil_temp": "soil_temp",
-                "air_temp": "air_temp",
-                "humidity": "humidity",
-                "wfps": "wfps"
+    def _chart_series(self, parameter: str, days: int, resolution: str, max_points: Optional[int]) -> Optional[dict]:
+        """Numeric series for charts: alias-resolved, NaNs dropped, rounded to 2 places"""
+        col_name = PARAMETER_ALIASES.get(parameter.lower(), parameter)
+        values = self.sensors.column(col_name)
+        if values is None or values.dtype.kind != "f":
+            return None
+        series = self.get_series(col_name, days, resolution, max_points)
+        return {
+            key: arr if key == "timestamps" else np.round(arr, 2)
+            for key, arr in series.items()
+        }
+
+    def get_history_for_parameter(self, parameter: str, days: int = 7, resolution: str = "raw", max_points: Optional[int] = None) -> list:
+        """Chart points for one parameter, sliced straight from the column arrays"""
+        series = self._chart_series(parameter, days, resolution, max_points)
+        return self._series_records(series) if series is not None else []
+
+    def get_history_for_parameters(self, parameters: List[str], days: int = 7, resolution: str = "raw", max_points: Optional[int] = None) -> dict:
+        """Column-oriented chart series for several parameters over one window"""
+        result = {}
+        for parameter in parameters:
+            series = self._chart_series(parameter, days, resolution, max_points)
+            if series is None:
+                result[parameter] = {"timestamps": [], "values": [], "count": 0}
+                continue
+            entry = {
+                "timestamps": iso_from_epochs(series["timestamps"]),
+                "values": series["value"].tolist(),
+                "count": len(series["timestamps"]),
             }
-            
-            col_name = param_map.get(parameter.lower(), parameter)
-            if col_name not in df.columns:
-                return []
-                
-            # Extract timestamp and mapped column, drop NaNs
-            result_df = df[['timestamp', col_name]].dropna(subset=[col_name])
-            
-            # Round values
-            result_df[col_name] = result_df[col_name].round(2)
-            
-            return [
-                {"timestamp": row['timestamp'], "value": row[col_name]} 
-                for _, row in result_df.iterrows()
-            ]
-        except Exception as e:
-            print(f"Error in get_history_for_parameter: {e}")
-            return []
+            if "min" in series:
+                entry["min"] = series["min"].tolist()
+                entry["max"] = series["max"].tolist()
+            result[parameter] = entry
+        return result
 
-    def get_history_df(self, hours: int = 72):
-        """Get historical sensor data as a formatted DataFrame for ML"""
-        # Slice last N hours by position to avoid timestamp filtering issues
-        raw = self.historical_data[-hours:]
-        
-        # Step 3 — Add a row count safety check
-        if not raw:
-            return pd.DataFrame(columns=['timestamp', 'wfps_pct', 'temperature_c', 'humidity_pct', 'rain_mm'])
-            
-        df = pd.DataFrame(raw)
-        
-        # Convert timestamp to datetime objects
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Compute wfps_pct: (soil_moisture / 50) * 100
-        df['wfps_pct'] = (df['soil_moisture'] / 50) * 100
-        
-        # required: timestamp, wfps_pct, temperature_c, humidity_pct, rain_mm
-        df = df.rename(columns={
-            'air_temp': 'temperature_c',
-            'humidity': 'humidity_pct'
+    def get_range_stats(self, parameter: str, start=None, end=None) -> Optional[dict]:
+        """Count/mean/std/min/max of a parameter over [start, end) without reading the rows.
+
+        Two binary searches find the row span; prefix sums and sparse tables
+        answer the rest in constant time. Returns None for unknown or
+        non-numeric parameters.
+        """
+        col_name = PARAMETER_ALIASES.get(parameter.lower(), parameter)
+        values = self.sensors.column(col_name)
+        if values is None or values.dtype.kind != "f":
+            return None
+        span = self.sensors.span(start, end)
+        stats = self.range_stats.query(col_name, span.start, span.stop)
+        result = {"parameter": parameter, "from": None, "to": None, "count": 0,
+                  "mean": None, "std": None, "min": None, "max": None, "latest": None}
+        if stats is None:
+            return result
+        stamps = iso_from_epochs(self.sensors.timestamps[[span.start, span.stop - 1]])
+        latest = values[span.stop - 1]
+        result.update({
+            "from": stamps[0],
+            "to": stamps[1],
+            "count": stats["count"],
+            "mean": round(stats["mean"], 2),
+            "std": None if stats["std"] is None else round(stats["std"], 2),
+            "min": round(stats["min"], 2),
+            "max": round(stats["max"], 2),
+            "latest": None if np.isnan(latest) else round(float(latest), 2),
         })
-        
-        # Deduplicate columns if any (e.g. if humidity_pct existed in both)
-        df = df.loc[:, ~df.columns.duplicated()]
-        
-        # Handle rain_mm (Inject real past rainfall from Open-Meteo)
-        forecast = weather_service.get_weather_forecast()
-        real_rain_list = forecast.get("hourly_rain_mm", [])
-        
-        if real_rain_list:
-            # Open-Meteo returns 72+ hours starting from 00:00 today.
-            # We want to match the most recent rain values to the most recent sensor rows.
-            num_rows = len(df)
-            # Use the first num_rows of the forecast (simplified matching)
-            # Alternatively, match the last num_rows if we assume the forecast includes current time.
-            rain_values = real_rain_list[:num_rows]
-            
-            if len(rain_values) < num_rows:
-                rain_values += [0.0] * (num_rows - len(rain_values))
-            
-            df['rain_mm'] = rain_values
-        else:
-            df['rain_mm'] = 0.0
-            
-        # Return only the required 5 columns
-        required_cols = ['timestamp', 'wfps_pct', 'temperature_c', 'humidity_pct', 'rain_mm']
-        return df[required_cols]
-
-    def get_all_history(self, hours: int):
-        """Get all historical sensor data for the last X hours (Deprecated - use get_history_df)"""
-        cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-        filtered = [d for d in self.historical_data if datetime.fromisoformat(d["timestamp"]) >= cutoff]
-        return filtered
+        return result
+
+    def feature_frame(self, start: int = 0, stop: Optional[int] = None, columns=("wfps", "soil_temp", "air_temp", "humidity")) -> FeatureFrame:
+        """Batch feature source whose targets are rows [start, stop), plus lookback rows"""
+        stop = len(self.sensors) if stop is None else stop
+        first = max(start - LOOKBACK_ROWS, 0)
+        return FeatureFrame(
+            self.sensors.timestamps[first:stop],
+            {name: self.sensors.column(name)[first:stop] for name in columns},
+            targets=max(stop - start, 0),
+        )
+
+    def get_history_df(self, hours: int = 72) -> pd.DataFrame:
+        """Last N hourly rows as timestamp, wfps_pct, temperature_c, humidity_pct, rain_mm"""
+        start = max(len(self.sensors) - hours, 0) if hours > 0 else 0
+        df = self.sensors.to_frame(start, parameters=['soil_moisture', 'air_temp', 'humidity'])
+        df['wfps_pct'] = (df['soil_moisture'] / 50) * 100
+        df = df.rename(columns={'air_temp': 'temperature_c', 'humidity': 'humidity_pct'})
+        # Open-Meteo rainfall for each row's hour, 0 where the forecast does not reach
+        weather = WeatherTrack.from_forecast(weather_service.get_weather_forecast())
+        df['rain_mm'] = np.nan_to_num(weather.at("rain", self.sensors.timestamps[start:]))
+        return df[['timestamp', 'wfps_pct', 'temperature_c', 'humidity_pct', 'rain_mm']]
+
+    def get_all_history(self, hours: int) -> list:
+        """Reading dicts for the last X hours (Deprecated - use get_history_df)"""
+        span = self.sensors.span(datetime.now(timezone.utc) - timedelta(hours=hours))
+        return self.sensors.records(span.start, span.stop)
 
 # Singleton instance
 data_store = DataStore()
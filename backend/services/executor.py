@@ -0,0 +1,119 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# INFERENCE_POOL_KIND=process runs inference in worker processes. Each one
+# loads its own copy of the history, so pair it with SENSOR_STORE_MODE=shared
+# to see readings ingested after start-up.
+INFERENCE_POOL_KIND = os.environ.get("INFERENCE_POOL_KIND", "thread").lower()
+INFERENCE_POOL_WORKERS = int(os.environ.get("INFERENCE_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+# Calls allowed in flight (running + waiting) before new ones are rejected
+INFERENCE_POOL_QUEUE = int(os.environ.get("INFERENCE_POOL_QUEUE", 32))
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool already has `max_pending` calls in flight."""
+
+    def __init__(self, pool: str):
+        super().__init__(f"Worker pool '{pool}' is saturated; retry shortly")
+        self.pool = pool
+
+
+def _timed(fn: Callable, args: tuple, kwargs: dict):
+    """Runs inside the worker; reports how long the call itself took."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class WorkerPool:
+    """Thread or process pool for blocking work, awaited from async routers.
+
+    At most `max_pending` calls may be running or queued at once; beyond
+    that `run` raises PoolSaturated at once instead of growing the backlog,
+    so cheap endpoints on the event loop stay responsive.
+    """
+
+    def __init__(self, name: str, kind: str = "thread", workers: int = 4, max_pending: int = 32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind '{kind}' (expected 'thread' or 'process')")
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._metrics = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+            "run_seconds": 0.0, "wait_seconds": 0.0, "max_run_seconds": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    @property
+    def executor(self) -> Executor:
+        # Created lazily so forked gunicorn workers each get their own pool
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    cls = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+                    kwargs = {"thread_name_prefix": self.name} if self.kind == "thread" else {}
+                    self._executor = cls(max_workers=self.workers, **kwargs)
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._metrics["rejected"] += 1
+                raise PoolSaturated(self.name)
+            self._pending += 1
+            self._metrics["submitted"] += 1
+        started = time.perf_counter()
+        try:
+            future = self.executor.submit(_timed, fn, args, kwargs)
+            result, run_seconds = await asyncio.wrap_future(future)
+        except Exception:
+            with self._lock:
+                self._metrics["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+        wait_seconds = max(time.perf_counter() - started - run_seconds, 0.0)
+        with self._lock:
+            m = self._metrics
+            m["completed"] += 1
+            m["run_seconds"] += run_seconds
+            m["wait_seconds"] += wait_seconds
+            m["max_run_seconds"] = max(m["max_run_seconds"], run_seconds)
+            m["max_wait_seconds"] = max(m["max_wait_seconds"], wait_seconds)
+        return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+            pending = self._pending
+        completed = max(m["completed"], 1)
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "submitted": m["submitted"],
+            "completed": m["completed"],
+            "failed": m["failed"],
+            "rejected": m["rejected"],
+            "avg_run_ms": round(m["run_seconds"] / completed * 1000, 3),
+            "avg_wait_ms": round(m["wait_seconds"] / completed * 1000, 3),
+            "max_run_ms": round(m["max_run_seconds"] * 1000, 3),
+            "max_wait_ms": round(m["max_wait_seconds"] * 1000, 3),
+        }
+
+
+inference_pool = WorkerPool("inference", INFERENCE_POOL_KIND, INFERENCE_POOL_WORKERS, INFERENCE_POOL_QUEUE)
+
+# Every pool, by name, for the metrics endpoint
+pools: Dict[str, WorkerPool] = {inference_pool.name: inference_pool}
@@ -0,0 +1,173 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+from services.sensor_store import SensorStore
+
+# Rows the waterlogging features look back over (the models' 72-hour history frame)
+HISTORY_HOURS = 72
+DRAINAGE_WFPS = 70
+NAN = float("nan")
+
+
+class RollingWindow:
+    """Running mean over the last `size` values, skipping NaNs like pandas."""
+
+    def __init__(self, size: int):
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.count = 0
+
+    def push(self, value: float):
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            if not math.isnan(old):
+                self.total -= old
+                self.count -= 1
+        self.values.append(value)
+        self._add(value, 1)
+
+    def replace_last(self, value: float):
+        """Swap the newest value for `value`, as if it had been pushed instead."""
+        self._add(self.values[-1], -1)
+        self.values[-1] = value
+        self._add(value, 1)
+
+    def _add(self, value: float, sign: int):
+        if not math.isnan(value):
+            self.total += sign * value
+            self.count += sign
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else NAN
+
+
+def _diff(recent: deque, periods: int) -> float:
+    """x[t] - x[t - periods] over the recent values (NaN when unavailable)."""
+    if len(recent) <= periods:
+        return NAN
+    return recent[-1] - recent[-1 - periods]
+
+
+class FeatureEngine:
+    """Live FeaturePlan source for the latest reading.
+
+    `values`, `diff`, `mean` and `run` answer for the latest row from
+    trackers registered on first use (which replays the warm-up window
+    once): the last few values of a column, ring buffers with running sums
+    for rolling means, and run lengths above a threshold. Each new hourly
+    row updates them in O(1); rows appended to the store are folded in on
+    the next read, and a last row filled in place replaces its own
+    contribution.
+    """
+
+    def __init__(self, store: SensorStore):
+        self.store = store
+        self.consumed = 0
+        self.tail_edits = 0
+        self._lock = threading.Lock()
+        # Tracker specs requested by feature plans: column -> history depth,
+        # (column, window) rolling means and (column, threshold) run lengths
+        self._depths: Dict[str, int] = {}
+        self._window_specs: Set[Tuple[str, int]] = set()
+        self._run_specs: Set[Tuple[str, float]] = set()
+        self._reset()
+
+    def _reset(self):
+        self.last = None
+        self.recent = {col: deque(maxlen=depth) for col, depth in self._depths.items()}
+        self.windows = {spec: RollingWindow(spec[1]) for spec in self._window_specs}
+        self.runs = {spec: 0 for spec in self._run_specs}
+        self._runs_before = dict(self.runs)
+
+    def _push(self, timestamp: int, row: Dict[str, float], replace: bool = False):
+        """Fold in a new row, or with `replace` swap the last folded row for `row`."""
+        for col, recent in self.recent.items():
+            if replace:
+                recent[-1] = row[col]
+            else:
+                recent.append(row[col])
+        for (col, _), window in self.windows.items():
+            if replace:
+                window.replace_last(row[col])
+            else:
+                window.push(row[col])
+        if not replace:
+            self._runs_before = dict(self.runs)
+        # The history frame is HISTORY_HOURS long, so run lengths are capped there
+        for col, threshold in self.runs:
+            above = row[col] > threshold
+            self.runs[col, threshold] = min(self._runs_before[col, threshold] + 1, HISTORY_HOURS) if above else 0
+        self.last = timestamp
+
+    def _sync(self):
+        size = len(self.store)
+        if self.store.tail_edits != self.tail_edits:
+            # The last folded row was filled in place (later rows are not folded yet)
+            self.tail_edits = self.store.tail_edits
+            if self.consumed:
+                last = self.consumed - 1
+                row = {col: values[0] for col, values in self._tracked(last, last + 1).items()}
+                self._push(int(self.store.timestamps[last]), row, replace=True)
+        if size == self.consumed:
+            return
+        if size - self.consumed > HISTORY_HOURS or self.consumed == 0:
+            # Warm up from the same last-72-rows frame the batch version sees
+            self._reset()
+            self.consumed = max(size - HISTORY_HOURS, 0)
+        timestamps = self.store.timestamps[self.consumed:size].tolist()
+        tracked = self._tracked(self.consumed, size)
+        for i, timestamp in enumerate(timestamps):
+            self._push(timestamp, {col: values[i] for col, values in tracked.items()})
+        self.consumed = size
+
+    def _tracked(self, start: int, stop: int) -> Dict[str, list]:
+        """Rows [start, stop) of every column a tracker reads."""
+        return {
+            col: self.store.column(col)[start:stop].tolist()
+            for col in {*self._depths, *(c for c, _ in self._window_specs), *(c for c, _ in self._run_specs)}
+        }
+
+    # ── FeaturePlan source interface (latest row only) ───────────
+    def fill(self, plan, weather=None, out=None):
+        """Fill `plan`'s float32 vector for the latest reading."""
+        with self._lock:
+            self._sync()
+            if self.last is None:
+                raise ValueError("No sensor readings to build features from")
+            return plan.fill(self, weather, out)
+
+    def _require(self, specs: set, spec) -> None:
+        if spec not in specs:
+            specs.add(spec)
+            self.consumed = 0
+            self._sync()
+
+    def _require_depth(self, col: str, depth: int) -> deque:
+        if self._depths.get(col, 0) < depth:
+            self._depths[col] = depth
+            self.consumed = 0
+            self._sync()
+        return self.recent[col]
+
+    def timestamps(self) -> np.ndarray:
+        return np.array([self.last], dtype=np.int64)
+
+    def values(self, col: str) -> np.ndarray:
+        recent = self._require_depth(col, 1)
+        return np.array([recent[-1]])
+
+    def diff(self, col: str, periods: int) -> np.ndarray:
+        recent = self._require_depth(col, periods + 1)
+        return np.array([_diff(recent, periods)])
+
+    def mean(self, col: str, window: int) -> np.ndarray:
+        self._require(self._window_specs, (col, window))
+        return np.array([self.windows[col, window].mean()])
+
+    def run(self, col: str, threshold: float) -> np.ndarray:
+        self._require(self._run_specs, (col, threshold))
+        return np.array([float(self.runs[col, threshold])])
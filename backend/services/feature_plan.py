@@ -0,0 +1,249 @@
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+from services.feature_engine import DRAINAGE_WFPS, HISTORY_HOURS
+from services.sensor_store import epochs_from_datetimes
+
+# Field capacity: above_fc in the training data is WFPS > 55%
+FIELD_CAPACITY_WFPS = 55
+# Rows of history a batch frame needs before its first target row
+LOOKBACK_ROWS = HISTORY_HOURS
+HOUR = 3600
+
+
+def vapour_pressure_deficit(air_temp_c: np.ndarray, humidity_pct: np.ndarray) -> np.ndarray:
+    """VPD in kPa from the Tetens saturation pressure (same formula as the CSV)."""
+    saturation = 0.6108 * np.exp(17.27 * air_temp_c / (air_temp_c + 237.3))
+    return saturation * (1 - humidity_pct / 100)
+
+
+class WeatherTrack:
+    """Hourly Open-Meteo series keyed by epoch hour, for time-aligned lookups.
+
+    Forecast times are local wall-clock hours, converted with the same
+    convention as the sensor timestamps so the two line up.
+    """
+
+    FIELDS = {
+        "rain": "hourly_rain_mm",
+        "et0": "hourly_et0_mm",
+        "temp": "hourly_temp_c",
+        "humidity": "hourly_humidity_pct",
+    }
+
+    def __init__(self, epochs: np.ndarray, series: Dict[str, np.ndarray]):
+        self.epochs = np.asarray(epochs, dtype=np.int64)
+        self.series = series
+        self._cumsums = {
+            name: np.concatenate(([0.0], np.cumsum(np.nan_to_num(values))))
+            for name, values in series.items()
+        }
+        self._counts = {
+            name: np.concatenate(([0], np.cumsum(~np.isnan(values))))
+            for name, values in series.items()
+        }
+
+    @classmethod
+    def from_forecast(cls, forecast: Optional[dict]) -> "WeatherTrack":
+        times = (forecast or {}).get("hourly_time") or []
+        epochs = epochs_from_datetimes(times) if times else np.empty(0, dtype=np.int64)
+        series = {}
+        for name, key in cls.FIELDS.items():
+            values = np.full(len(epochs), np.nan)
+            given = np.asarray(((forecast or {}).get(key) or [])[:len(epochs)], dtype=np.float64)
+            values[:len(given)] = given
+            series[name] = values
+        return cls(epochs, series)
+
+    def at(self, field: str, epochs: np.ndarray) -> np.ndarray:
+        """Value for the hour of each epoch (NaN where the track has no data)."""
+        pos = np.searchsorted(self.epochs, epochs)
+        hit = pos < len(self.epochs)
+        hit[hit] = self.epochs[pos[hit]] == epochs[hit]
+        out = np.full(len(epochs), np.nan)
+        out[hit] = self.series[field][pos[hit]]
+        return out
+
+    def window_sum(self, field: str, epochs: np.ndarray, start_h: int, end_h: int) -> np.ndarray:
+        """Sum over hours t with epoch + start_h < t <= epoch + end_h (missing hours count as 0)."""
+        cumsum = self._cumsums[field]
+        lo = np.searchsorted(self.epochs, epochs + start_h * HOUR, side="right")
+        hi = np.searchsorted(self.epochs, epochs + end_h * HOUR, side="right")
+        return cumsum[hi] - cumsum[lo]
+
+    def window_mean(self, field: str, epochs: np.ndarray, start_h: int, end_h: int) -> np.ndarray:
+        """Mean over the same hours as `window_sum`, NaN where the window has no data."""
+        lo = np.searchsorted(self.epochs, epochs + start_h * HOUR, side="right")
+        hi = np.searchsorted(self.epochs, epochs + end_h * HOUR, side="right")
+        count = self._counts[field][hi] - self._counts[field][lo]
+        total = self._cumsums[field][hi] - self._cumsums[field][lo]
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+class FeatureFrame:
+    """Batch feature source: history arrays whose last `targets` rows get vectors.
+
+    Rows before the targets are lookback only. With LOOKBACK_ROWS of history
+    every primitive matches what FeatureEngine returns for the same row.
+    """
+
+    def __init__(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray], targets: int):
+        self._timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.columns = columns
+        self.targets = targets
+        self.first = len(self._timestamps) - targets
+
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[self.first:]
+
+    def values(self, col: str) -> np.ndarray:
+        return np.asarray(self.columns[col][self.first:], dtype=np.float64)
+
+    def diff(self, col: str, periods: int) -> np.ndarray:
+        values = np.asarray(self.columns[col], dtype=np.float64)
+        shifted = np.full(len(values), np.nan)
+        shifted[periods:] = values[:max(len(values) - periods, 0)]
+        return values[self.first:] - shifted[self.first:]
+
+    def mean(self, col: str, window: int) -> np.ndarray:
+        # NaN-skipping rolling mean with min_periods=1, via prefix sums
+        values = np.asarray(self.columns[col], dtype=np.float64)
+        present = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(present)))
+        stop = np.arange(self.first, len(values)) + 1
+        start = np.maximum(stop - window, 0)
+        n = counts[stop] - counts[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, (sums[stop] - sums[start]) / n, np.nan)
+
+    def run(self, col: str, threshold: float) -> np.ndarray:
+        # Consecutive rows above threshold ending at each row, capped like the engine
+        above = np.asarray(self.columns[col], dtype=np.float64) > threshold
+        index = np.arange(len(above))
+        last_below = np.maximum.accumulate(np.where(above, -1, index))
+        return np.minimum(index - last_below, HISTORY_HOURS)[self.first:].astype(np.float64)
+
+
+def _zero_nan(values: np.ndarray) -> np.ndarray:
+    return np.nan_to_num(values, nan=0.0)
+
+
+def _cyclic(values: np.ndarray, period: int, fn) -> np.ndarray:
+    return fn(2 * np.pi * values / period)
+
+
+def _calendar(src) -> Dict[str, np.ndarray]:
+    stamps = src.timestamps().astype("datetime64[s]")
+    days = stamps.astype("datetime64[D]")
+    return {
+        "hour": (stamps - days).astype(np.int64) // HOUR,
+        # 1970-01-01 was a Thursday; Monday = 0 like pandas dayofweek
+        "dow": (days.astype(np.int64) + 3) % 7,
+        "month": days.astype("datetime64[M]").astype(np.int64) % 12 + 1,
+    }
+
+
+def _rain_24h(src, wx):
+    return wx.window_sum("rain", src.timestamps(), -24, 0)
+
+
+def _et0_24h(src, wx):
+    return wx.window_sum("et0", src.timestamps(), -24, 0)
+
+
+def _rainfall(src, wx):
+    return _zero_nan(wx.at("rain", src.timestamps()))
+
+
+def _fallback(values: np.ndarray, default: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(values), default, values)
+
+
+# Model feature name -> producer(source, weather) returning one value per target
+# row. Sources are a FeatureFrame (batch) or the live FeatureEngine.
+PRODUCERS: Dict[str, Callable] = {
+    "wfps_pct": lambda src, wx: src.values("wfps"),
+    "wfps_rate_1h": lambda src, wx: _zero_nan(src.diff("wfps", 1)),
+    "wfps_rate_3h": lambda src, wx: _zero_nan(src.diff("wfps", 3)),
+    "wfps_rate_6h": lambda src, wx: _zero_nan(src.diff("wfps", 6)),
+    # Change of the 1h rate: w[t] - 2 w[t-1] + w[t-2]
+    "wfps_accel": lambda src, wx: _zero_nan(2 * src.diff("wfps", 1) - src.diff("wfps", 2)),
+    "wfps_3h_mean": lambda src, wx: src.mean("wfps", 3),
+    "wfps_6h_mean": lambda src, wx: src.mean("wfps", 6),
+    "wfps_12h_mean": lambda src, wx: src.mean("wfps", 12),
+    "above_fc": lambda src, wx: (src.values("wfps") > FIELD_CAPACITY_WFPS).astype(np.float64),
+    "hours_above_fc": lambda src, wx: src.run("wfps", FIELD_CAPACITY_WFPS),
+    "soil_temp_c": lambda src, wx: src.values("soil_temp"),
+    "drainage_lag_h": lambda src, wx: src.run("wfps", DRAINAGE_WFPS),
+    "drainage_lag_norm": lambda src, wx: src.run("wfps", DRAINAGE_WFPS) / HISTORY_HOURS,
+    "air_temp_c": lambda src, wx: src.values("air_temp"),
+    "humidity_pct": lambda src, wx: src.values("humidity"),
+    "vpd_kpa": lambda src, wx: vapour_pressure_deficit(src.values("air_temp"), src.values("humidity")),
+    "humidity_rate_1h": lambda src, wx: _zero_nan(src.diff("humidity", 1)),
+    "humidity_rate_3h": lambda src, wx: _zero_nan(src.diff("humidity", 3)),
+    "air_temp_rate_1h": lambda src, wx: _zero_nan(src.diff("air_temp", 1)),
+    # Weather API readings for the row's hour, or the node's own sensor
+    "api_air_temp_c": lambda src, wx: _fallback(wx.at("temp", src.timestamps()), src.values("air_temp")),
+    "api_humidity_pct": lambda src, wx: _fallback(wx.at("humidity", src.timestamps()), src.values("humidity")),
+    "rainfall_mm": _rainfall,
+    "rain_6h_rolling": lambda src, wx: wx.window_sum("rain", src.timestamps(), -6, 0),
+    "rain_12h_rolling": lambda src, wx: wx.window_sum("rain", src.timestamps(), -12, 0),
+    "rain_24h_rolling": _rain_24h,
+    "rain_48h_rolling": lambda src, wx: wx.window_sum("rain", src.timestamps(), -48, 0),
+    "rain_48h_forecast": lambda src, wx: wx.window_sum("rain", src.timestamps(), 0, 48),
+    "rain_et0_balance": lambda src, wx: _rain_24h(src, wx) - _et0_24h(src, wx),
+    "et0_mm": lambda src, wx: _zero_nan(wx.at("et0", src.timestamps())),
+    "et0_24h_rolling": _et0_24h,
+    "rain_threshold_25mm": lambda src, wx: (_rain_24h(src, wx) >= 25).astype(np.float64),
+    "is_raining": lambda src, wx: (_rainfall(src, wx) > 0).astype(np.float64),
+    # No irrigation planner feeds the model yet
+    "planned_irrigation_lm2": lambda src, wx: np.zeros(len(src.timestamps())),
+    "hour_sin": lambda src, wx: _cyclic(_calendar(src)["hour"], 24, np.sin),
+    "hour_cos": lambda src, wx: _cyclic(_calendar(src)["hour"], 24, np.cos),
+    "dow_sin": lambda src, wx: _cyclic(_calendar(src)["dow"], 7, np.sin),
+    "dow_cos": lambda src, wx: _cyclic(_calendar(src)["dow"], 7, np.cos),
+    "month_sin": lambda src, wx: _cyclic(_calendar(src)["month"], 12, np.sin),
+    "month_cos": lambda src, wx: _cyclic(_calendar(src)["month"], 12, np.cos),
+}
+
+
+class FeaturePlan:
+    """Compiled mapping from a model's feature list to producers, in column order.
+
+    Compiling fails on any name without a producer, so a retrained model
+    with new features cannot silently receive zeros.
+    """
+
+    def __init__(self, names: List[str]):
+        missing = [name for name in names if name not in PRODUCERS]
+        if missing:
+            raise ValueError(f"No feature producer for: {', '.join(missing)}")
+        self.names = list(names)
+        self.producers = [PRODUCERS[name] for name in names]
+        self._buffers = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.producers)
+
+    def buffer(self, rows: int = 1) -> np.ndarray:
+        """This thread's preallocated float32 matrix, grown to at least `rows` rows."""
+        buffer = getattr(self._buffers, "matrix", None)
+        if buffer is None or len(buffer) < rows:
+            buffer = self._buffers.matrix = np.zeros((rows, len(self.producers)), dtype=np.float32)
+        return buffer
+
+    def fill(self, src, weather: Optional[WeatherTrack] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Write one float32 row per target, in model column order.
+
+        Rows go into `out`, or this thread's reusable buffer when not given,
+        and the filled C-contiguous view is returned.
+        """
+        rows = len(src.timestamps())
+        if out is None:
+            out = self.buffer(rows)
+        weather = weather if weather is not None else WeatherTrack.from_forecast(None)
+        for j, producer in enumerate(self.producers):
+            out[:rows, j] = producer(src, weather)
+        return out[:rows]
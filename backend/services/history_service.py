@@ -1,11 +1,12 @@
 from services.data_store import data_store
-from services.weather_service import weather_service
 from services.dashboard_service import dashboard_service
+from services.snapshot import snapshots
 
 class HistoryService:
-    def get_history(self, parameter: str, days: int) -> dict:
-        history = data_store.get_history(parameter, days)
-        return {"parameter": parameter, "days": days, "data": history}
+    def get_history(self, parameter: str, days: int, resolution: str = "raw", max_points: int = None) -> dict:
+        resolution = data_store.resolve_resolution(days, resolution, max_points)
+        history = data_store.get_history(parameter, days, resolution, max_points)
+        return {"parameter": parameter, "days": days, "resolution": resolution, "data": history}
 
     def get_alerts(self) -> dict:
         return {"alerts": data_store.alerts}
@@ -14,8 +15,8 @@ class HistoryService:
     # get_fertilization_history moved to services/npk_service.py
 
     def get_ph_predictions(self) -> dict:
-        current = data_store.get_current_data()
-        weather = weather_service.get_weather_forecast()
+        current = snapshots.get("current")
+        weather = snapshots.get("weather")
         mgmt = data_store.get_management_features()
         
         current_ph = current.get("pH", 6.5)
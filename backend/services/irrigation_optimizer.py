@@ -0,0 +1,80 @@
+from typing import Dict
+
+import numpy as np
+
+# Moisture grid for the value function (% VWC)
+MOISTURE_STEP = 0.5
+MOISTURE_STATES = np.arange(0.0, 100.0 + MOISTURE_STEP, MOISTURE_STEP)
+# Cost of one moisture point outside the target band for one day, in the
+# same currency as water (0.0055 per litre on a hectare, i.e. 55 per L/m²)
+BAND_PENALTY_PER_POINT = 200.0
+WATER_COST_PER_L_PER_M2 = 10000 * 0.0055
+# Waterlogging rule of the monitor: porosity 0.5, +1.2 WFPS per mm of rain in 48h
+WATERLOGGING_WFPS = 100.0
+
+
+def peak_wfps(moisture, rain_next_48h):
+    return (np.asarray(moisture) / 50) * 100 + np.asarray(rain_next_48h) * 1.2
+
+
+def optimize_schedule(
+    moisture: float,
+    rain_mm: np.ndarray,
+    loss_points: np.ndarray,
+    rain_next_48h: np.ndarray,
+    actions: np.ndarray,
+    band: tuple,
+    points_per_l: float,
+    blocked: np.ndarray = None,
+) -> Dict[str, np.ndarray]:
+    """Cheapest daily irrigation plan over the horizon by backward dynamic programming.
+
+    Day d starts at moisture m, applies `actions[a]` L/m², gains rain and
+    loses `loss_points[d]`, so m' = clip(m + (rain + a) * points_per_l -
+    loss, 0, 100). A day costs its water plus BAND_PENALTY_PER_POINT for
+    every point m' lies outside `band`. Irrigating is not allowed when it
+    would push the waterlogging rule over 100% WFPS given the next 48h of
+    rain, or on days flagged in `blocked`.
+
+    The value of each day is solved over MOISTURE_STATES for all states
+    and actions at once. The returned plan starts from the exact moisture
+    and picks each day's action by a one-step lookahead against the next
+    day's values, so it never follows a grid point's choice that the exact
+    moisture does not warrant.
+    """
+    days = len(rain_mm)
+    states = MOISTURE_STATES
+    actions = np.asarray(actions, dtype=np.float64)
+    blocked = np.zeros(days, dtype=bool) if blocked is None else np.asarray(blocked, dtype=bool)
+    low, high = band
+
+    def step(m, d):
+        # m: any shape; returns (next moisture, day cost) with a trailing action axis
+        wetted = m[..., None] + actions * points_per_l
+        after = np.clip(wetted + rain_mm[d] * points_per_l - loss_points[d], 0.0, 100.0)
+        stress = np.maximum(low - after, 0) + np.maximum(after - high, 0)
+        cost = actions * WATER_COST_PER_L_PER_M2 + stress * BAND_PENALTY_PER_POINT
+        forbidden = (actions > 0) & ((peak_wfps(wetted, rain_next_48h[d]) > WATERLOGGING_WFPS) | blocked[d])
+        return after, np.where(forbidden, np.inf, cost)
+
+    def nearest(m):
+        return np.clip(np.rint(m / MOISTURE_STEP).astype(np.int64), 0, len(states) - 1)
+
+    # value[d][i]: cheapest cost of days d.. starting from states[i]
+    value = np.zeros((days + 1, len(states)))
+    for d in range(days - 1, -1, -1):
+        after, cost = step(states, d)
+        value[d] = (cost + value[d + 1][nearest(after)]).min(axis=1)
+
+    start = np.empty(days)
+    end = np.empty(days)
+    volume = np.empty(days)
+    cost = np.empty(days)
+    m = float(moisture)
+    for d in range(days):
+        after, day_cost = step(np.array(m), d)
+        a = int((day_cost + value[d + 1][nearest(after)]).argmin())
+        start[d], end[d], volume[d] = m, after[a], actions[a]
+        cost[d] = actions[a] * WATER_COST_PER_L_PER_M2
+        m = float(after[a])
+    return {"moisture_start": start, "moisture_end": end, "volume_l_per_m2": volume, "water_cost": cost}
@@ -1,15 +1,22 @@
-from datetime import datetime, timedelta, timezone
-from functools import lru_cache
+from datetime import timedelta
 from pathlib import Path
 import numpy as np
-import joblib
 
 from services.data_store import data_store
-from services.weather_service import weather_service
+from services.tree_ensemble import compile_model, load_estimator
+from services.batcher import register_batcher
+from services.model_registry import model_registry
+from services.snapshot import snapshots
+from services.feature_plan import WeatherTrack
+from services.irrigation_optimizer import optimize_schedule, peak_wfps, WATERLOGGING_WFPS
+from services.sensor_store import to_epoch
+from services.weather_service import forecast_now
 from services.dashboard_service import dashboard_service
 
 ML_DIR = Path(__file__).parent.parent / "ML" / "Irrigation"
-MODEL_PATH = ML_DIR / "xgb_regressor.joblib"
+MODEL_FILE = "xgb_regressor.joblib"
+# Inputs: soil temp, pH, EC, N, P, K, 24h mean air temp, 24h mean humidity
+N_FEATURES = 8
 
 # Irrigation agronomy tuning defaults (kept centralized for safe updates).
 OPTIMAL_MOISTURE_MIN = 40.0
@@ -21,11 +28,36 @@ LITER_PER_M2_PER_MOISTURE_POINT = 0.65
 MIN_IRRIGATION_VOLUME_L_PER_M2 = 8.0
 MAX_IRRIGATION_VOLUME_L_PER_M2 = 35.0
 PREDICTION_BLEND_WEIGHT = 0.7
+# Largest what-if grid scored in one request
+MAX_SCENARIOS = 5000
+# Days planned by the schedule optimizer, and its volume step (L/m²)
+SCHEDULE_DAYS = 7
+SCHEDULE_VOLUME_STEP = 1.0
 
 
-@lru_cache(maxsize=1)
-def _load_irrigation_model():
-    return joblib.load(MODEL_PATH)
+def _load_irrigation_model(directory: Path) -> dict:
+    model = load_estimator(directory / MODEL_FILE)
+    # "trees" is the flat-array copy (the same object for compiled models)
+    # whose staged predictions give the spread
+    return {"model": model, "trees": compile_model(model)}
+
+
+def _validate_irrigation_model(models: dict):
+    prediction = models["model"].predict(np.zeros((1, N_FEATURES), dtype=np.float32))
+    if prediction.shape != (1,) or not np.isfinite(prediction).all():
+        raise ValueError(f"Irrigation model returned {prediction!r} for a single row")
+
+
+model_registry.register("irrigation", ML_DIR, _load_irrigation_model, _validate_irrigation_model)
+
+
+def _score_moisture(matrix: np.ndarray) -> list:
+    """Predicted moisture and its spread (mean, p10/p50/p90, spread) for each row, from one tree walk."""
+    stats = model_registry.get("irrigation")["trees"].uncertainty(matrix)
+    return [{key: float(value[i]) for key, value in stats.items()} for i in range(len(matrix))]
+
+
+irrigation_batcher = register_batcher("irrigation", _score_moisture)
 
 
 class IrrigationService:
@@ -60,9 +92,8 @@ class IrrigationService:
         bounded = float(np.clip(raw_volume, MIN_IRRIGATION_VOLUME_L_PER_M2, MAX_IRRIGATION_VOLUME_L_PER_M2))
         return round(bounded, 2)
 
-    def _predict_moisture_base(self, current: dict, weather: dict) -> float:
-        model = _load_irrigation_model()
-
+    @staticmethod
+    def _feature_row(current: dict, weather: dict) -> np.ndarray:
         avg_temp_24h = (
             float(np.mean(weather["hourly_temp_c"][:24]))
             if weather.get("hourly_temp_c")
@@ -74,8 +105,8 @@ class IrrigationService:
             else float(current["humidity"])
         )
 
-        feature_vector = np.array(
-            [[
+        return np.array(
+            [
                 float(current["soil_temp"]),
                 float(current["pH"]),
                 float(current["ec"]),
@@ -84,23 +115,108 @@ class IrrigationService:
                 float(current["potassium"]),
                 float(avg_temp_24h),
                 float(avg_humidity_24h),
-            ]],
+            ],
             dtype=np.float32
         )
 
+    def _predict_moisture_spread(self, current: dict, weather: dict) -> dict:
+        """24h ML moisture as mean, p10/p50/p90 and spread; only "mean" for the fallback trend."""
+        feature_vector = self._feature_row(current, weather)
+
         try:
-            predicted = float(model.predict(feature_vector)[0])
-            return self._clamp_moisture(predicted)
+            stats = irrigation_batcher.predict_row(feature_vector)
+            return {key: value if key == "spread" else self._clamp_moisture(value) for key, value in stats.items()}
         except Exception as e:
             print(f"WARNING: Irrigation ML prediction failed ({e}), using fallback trend.")
-            return self._clamp_moisture(float(current["soil_moisture"]) * 0.9)
+            return {"mean": self._clamp_moisture(float(current["soil_moisture"]) * 0.9)}
+
+    def _predict_moisture_base(self, current: dict, weather: dict) -> float:
+        return self._predict_moisture_spread(current, weather)["mean"]
+
+    def get_scenarios(self, volumes, rain_deltas=(0.0,), temp_deltas=(0.0,)) -> dict:
+        """Predicted moisture and waterlogging safety for every combination of
+        irrigation volume (L/m²), forecast rain change (mm/48h) and air
+        temperature change (°C).
+
+        The model sees the temperature change; irrigation and extra rain add
+        water at LITER_PER_M2_PER_MOISTURE_POINT, and rain also drives the
+        retention factor and the waterlogging rule, as in get_predictions.
+        The whole grid is one matrix and one predict call.
+        """
+        if len(volumes) * len(rain_deltas) * len(temp_deltas) > MAX_SCENARIOS:
+            raise ValueError(f"At most {MAX_SCENARIOS} scenarios per request")
+        current = snapshots.get("current")
+        weather = snapshots.get("weather")
+        current_moisture = float(current["soil_moisture"])
+        rain_48h = float(weather.get("rain_next_48h_mm", 0.0))
+
+        volume, rain_delta, temp_delta = (
+            grid.ravel() for grid in np.meshgrid(
+                np.asarray(volumes, dtype=np.float64),
+                np.asarray(rain_deltas, dtype=np.float64),
+                np.asarray(temp_deltas, dtype=np.float64),
+                indexing="ij",
+            )
+        )
+
+        base_row = self._feature_row(current, weather)
+        matrix = np.repeat(base_row[None, :], len(volume), axis=0)
+        matrix[:, 6] += temp_delta.astype(np.float32)
+        try:
+            predicted = np.clip(model_registry.get("irrigation")["model"].predict(matrix).astype(np.float64), 0.0, 100.0)
+        except Exception as e:
+            print(f"WARNING: Irrigation ML prediction failed ({e}), using fallback trend.")
+            predicted = np.full(len(volume), self._clamp_moisture(current_moisture * 0.9))
+
+        # Forecast rain can drop to zero but not below
+        scenario_rain = np.maximum(rain_48h + rain_delta, 0.0)
+        added_water = volume + (scenario_rain - rain_48h)
+        blended_24h = (PREDICTION_BLEND_WEIGHT * predicted) + ((1 - PREDICTION_BLEND_WEIGHT) * current_moisture)
+        moisture_24h = np.clip(blended_24h + added_water / LITER_PER_M2_PER_MOISTURE_POINT, 0.0, 100.0)
+        retention_boost = np.clip(scenario_rain / 120.0, 0.0, 0.35)
+        moisture_7d = np.clip(moisture_24h * (0.780 + (retention_boost * 0.50)), 0.0, 100.0)
+
+        # Same rule as the waterlogging monitor (porosity 0.5, +1.2 WFPS per mm of rain)
+        wetted = current_moisture + volume / LITER_PER_M2_PER_MOISTURE_POINT
+        peak_wfps = np.minimum((wetted / 50) * 100 + scenario_rain * 1.2, 200)
+        waterlogging_safe = peak_wfps <= 100
+        cost = np.round(volume * 10000 * 0.0055, 2)
+
+        columns = zip(
+            volume.tolist(), rain_delta.tolist(), temp_delta.tolist(),
+            np.round(moisture_24h, 1).tolist(), np.round(moisture_7d, 1).tolist(),
+            np.round(peak_wfps, 1).tolist(), waterlogging_safe.tolist(), cost.tolist(),
+        )
+        return {
+            "baseline": {
+                "soil_moisture": round(current_moisture, 1),
+                "rain_next_48h_mm": round(rain_48h, 1),
+                "avg_temp_24h": round(float(base_row[6]), 1),
+            },
+            "count": len(volume),
+            "scenarios": [
+                {
+                    "volume_l_per_m2": v,
+                    "rain_delta_mm": r,
+                    "temp_delta_c": t,
+                    "moisture_24h": m24,
+                    "moisture_7d": m7,
+                    "status": self._status_from_moisture(m24),
+                    "peak_wfps": wfps,
+                    "waterlogging_safe": safe,
+                    "cost_hectare": c,
+                }
+                for v, r, t, m24, m7, wfps, safe, c in columns
+            ],
+        }
 
     def get_predictions(self) -> dict:
-        current = data_store.get_current_data()
-        weather = weather_service.get_weather_forecast()
+        current = snapshots.get("current")
+        weather = snapshots.get("weather")
         waterlogging = dashboard_service.get_waterlogging_risk()
 
-        base_24h_prediction = self._predict_moisture_base(current, weather)
+        base_spread = self._predict_moisture_spread(current, weather)
+        base_24h_prediction = base_spread["mean"]
         current_moisture = float(current["soil_moisture"])
         rain_48h = float(weather.get("rain_next_48h_mm", 0.0))
 
@@ -143,7 +259,20 @@ class IrrigationService:
             rain_next_6h=rain_next_6h,
         )
 
-        confidence_band = float(np.clip(1.2 + (rain_48h * 0.03), 1.2, 4.0))
+        # The 24h value weights the model by PREDICTION_BLEND_WEIGHT, and so
+        # its 10-90% range; the rain heuristic remains for the fallback trend
+        uncertainty = None
+        if "spread" in base_spread:
+            def blend(value):
+                return self._clamp_moisture(PREDICTION_BLEND_WEIGHT * value + (1 - PREDICTION_BLEND_WEIGHT) * current_moisture)
+            uncertainty = {
+                "mean": predictions["24h"],
+                **{key: round(blend(base_spread[key]), 1) for key in ("p10", "p50", "p90")},
+                "spread": round(PREDICTION_BLEND_WEIGHT * base_spread["spread"], 2),
+            }
+            confidence_band = max((uncertainty["p90"] - uncertainty["p10"]) / 2, 0.1)
+        else:
+            confidence_band = float(np.clip(1.2 + (rain_48h * 0.03), 1.2, 4.0))
         trend = "decreasing" if predictions["7d"] < predictions["24h"] else "stable"
 
         coordination_message = (
@@ -167,6 +296,7 @@ class IrrigationService:
             "predictions": predictions,
             "trend": trend,
             "confidence": f"±{confidence_band:.1f}%",
+            "uncertainty": uncertainty,
             "recommendation": {
                 "action": action,
                 "timing": timing if action == "irrigate" else "N/A",
@@ -184,13 +314,70 @@ class IrrigationService:
             }
         }
 
+    def get_schedule(self) -> dict:
+        """Cheapest 7-day irrigation plan that keeps moisture in the optimal band.
+
+        Each day's rain and ET0 come from the hourly forecast (the ML 24h
+        trend stands in for ET0 when the forecast has none). Irrigation is
+        0 or MIN..MAX_IRRIGATION_VOLUME_L_PER_M2, never on a day it would
+        trigger the waterlogging rule, nor today if the monitor already
+        reports HIGH/CRITICAL risk.
+        """
+        current = snapshots.get("current")
+        weather = snapshots.get("weather")
+        waterlogging = dashboard_service.get_waterlogging_risk()
+        current_moisture = float(current["soil_moisture"])
+        points_per_l = 1 / LITER_PER_M2_PER_MOISTURE_POINT
+
+        # Forecast hours are wall-clock times in the forecast's timezone
+        now = forecast_now(weather)
+        days = np.arange(SCHEDULE_DAYS)
+        day_starts = int(to_epoch(now.replace(minute=0, second=0, microsecond=0))) + days * 24 * 3600
+        track = WeatherTrack.from_forecast(weather)
+        rain = track.window_sum("rain", day_starts, 0, 24)
+        rain_48h = track.window_sum("rain", day_starts, 0, 48)
+        et0 = track.window_mean("et0", day_starts, 0, 24) * 24
+
+        base_24h = self._predict_moisture_base(current, weather)
+        blended_24h = (PREDICTION_BLEND_WEIGHT * base_24h) + ((1 - PREDICTION_BLEND_WEIGHT) * current_moisture)
+        model_loss = max(current_moisture - blended_24h, 0.0)
+        loss = np.where(np.isnan(et0), model_loss, et0 * points_per_l)
+
+        blocked = np.zeros(SCHEDULE_DAYS, dtype=bool)
+        blocked[0] = waterlogging.get("risk_level", "LOW").upper() in {"HIGH", "CRITICAL"}
+        actions = np.concatenate(([0.0], np.arange(MIN_IRRIGATION_VOLUME_L_PER_M2, MAX_IRRIGATION_VOLUME_L_PER_M2 + SCHEDULE_VOLUME_STEP / 2, SCHEDULE_VOLUME_STEP)))
+
+        plan = optimize_schedule(
+            current_moisture, rain, loss, rain_48h, actions,
+            (OPTIMAL_MOISTURE_MIN, OPTIMAL_MOISTURE_MAX), points_per_l, blocked,
+        )
+        window = blocked | (peak_wfps(plan["moisture_start"], rain_48h) > WATERLOGGING_WFPS)
+        in_band = (plan["moisture_end"] >= OPTIMAL_MOISTURE_MIN) & (plan["moisture_end"] <= OPTIMAL_MOISTURE_MAX)
+
+        return {
+            "horizon_days": SCHEDULE_DAYS,
+            "band": {"min": OPTIMAL_MOISTURE_MIN, "max": OPTIMAL_MOISTURE_MAX},
+            "schedule": [
+                {
+                    "day": int(d) + 1,
+                    "date": (now + timedelta(days=int(d))).date().isoformat(),
+                    "irrigate": bool(plan["volume_l_per_m2"][d] > 0),
+                    "volume_l_per_m2": round(float(plan["volume_l_per_m2"][d]), 2),
+                    "moisture_start": round(float(plan["moisture_start"][d]), 1),
+                    "moisture_end": round(float(plan["moisture_end"][d]), 1),
+                    "rain_mm": round(float(rain[d]), 1),
+                    "et0_mm": None if np.isnan(et0[d]) else round(float(et0[d]), 2),
+                    "waterlogging_window": bool(window[d]),
+                }
+                for d in days
+            ],
+            "total_water_l_per_m2": round(float(plan["volume_l_per_m2"].sum()), 2),
+            "total_cost_hectare": round(float(plan["water_cost"].sum()), 2),
+            "days_in_band": int(in_band.sum()),
+        }
+
     def get_history(self, days: int = 30) -> dict:
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        events = [
-            e for e in data_store.irrigation_history
-            if datetime.fromisoformat(e["date"]) >= cutoff
-        ]
-        return {"events": events}
+        return {"events": data_store.get_irrigation_events(days)}
 
     def log_event(self, data: dict) -> dict:
         return data_store.log_irrigation(data)
@@ -0,0 +1,256 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from services.snapshot import snapshots
+
+ML_DIR = Path(__file__).parent.parent / "ML"
+# Retrained models go in ML/versions/<family>/<version>/ with the same file
+# names as the family's original directory, which is served as "baseline"
+VERSIONS_DIR = ML_DIR / "versions"
+BASELINE = "baseline"
+# Seconds between checks of the ACTIVE pointer, so every worker follows an
+# activation made through any one of them; also the retry delay after a failed load
+MODEL_CHECK_INTERVAL = float(os.environ.get("MODEL_CHECK_INTERVAL", 10))
+
+
+class ModelUnavailable(Exception):
+    """A model family has no loadable version."""
+
+
+def footprint(obj, seen=None) -> int:
+    """Approximate bytes held by a loaded model: its arrays, strings and native boosters."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(footprint(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(footprint(v, seen) for v in obj)
+    if hasattr(obj, "get_booster"):  # XGBoost keeps its trees in native memory
+        return len(obj.get_booster().save_raw())
+    if hasattr(obj, "__dict__"):
+        return footprint(vars(obj), seen)
+    state = getattr(obj, "__getstate__", lambda: None)()  # e.g. scikit-learn's Cython trees
+    return footprint(state, seen) if isinstance(state, dict) else sys.getsizeof(obj)
+
+
+class LoadedModel:
+    def __init__(self, version: str, model: Any, load_seconds: float):
+        self.version = version
+        self.model = model
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc)
+        self.memory_bytes = footprint(model)
+
+
+class ModelFamily:
+    def __init__(self, name: str, baseline_dir: Path, load: Callable[[Path], Any],
+                 validate: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.baseline_dir = baseline_dir
+        self.load = load
+        self.validate = validate
+        self.active: Optional[LoadedModel] = None
+        self.previous: Optional[LoadedModel] = None
+        self.loading: Optional[str] = None
+        self.error: Optional[str] = None
+        self.checked_at = 0.0
+        self.failed_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def pointer(self) -> Path:
+        return VERSIONS_DIR / self.name / "ACTIVE"
+
+
+class ModelRegistry:
+    """Versioned model families, each loaded lazily and swapped atomically.
+
+    A family is loaded on first use, from the version named in
+    ML/versions/<family>/ACTIVE (or its original directory, "baseline"),
+    so one family failing to load does not affect the others. `activate`
+    loads and validates another version on a background thread and only
+    then swaps it in, keeping the old one for `rollback`. Swaps start a new
+    snapshot, so every derived prediction is recomputed with the new model.
+    """
+
+    def __init__(self):
+        self.families: Dict[str, ModelFamily] = {}
+        # Called with the family name after every swap
+        self.listeners: List[Callable[[str], None]] = []
+
+    def register(self, name: str, baseline_dir: Path, load: Callable[[Path], Any],
+                 validate: Optional[Callable[[Any], None]] = None):
+        """Register `load(directory) -> model`; `validate(model)` raises to reject a version."""
+        self.families[name] = ModelFamily(name, baseline_dir, load, validate)
+
+    def _family(self, name: str) -> ModelFamily:
+        try:
+            return self.families[name]
+        except KeyError:
+            raise KeyError(f"Unknown model family '{name}'")
+
+    def versions(self, name: str) -> List[str]:
+        root = VERSIONS_DIR / self._family(name).name
+        found = sorted(p.name for p in root.iterdir() if p.is_dir()) if root.is_dir() else []
+        return [BASELINE] + [v for v in found if v != BASELINE]
+
+    def version_dir(self, name: str, version: str) -> Path:
+        """Directory of a listed version; anything else (e.g. "../x") is unknown."""
+        family = self._family(name)
+        if version == BASELINE:
+            return family.baseline_dir
+        separators = {"/", "\\", os.sep, os.altsep} - {None}
+        if any(sep in version for sep in separators) or version not in self.versions(name):
+            raise KeyError(f"Model family '{name}' has no version '{version}'")
+        return VERSIONS_DIR / family.name / version
+
+    def _pointed_version(self, family: ModelFamily) -> str:
+        try:
+            return family.pointer.read_text().strip() or BASELINE
+        except FileNotFoundError:
+            return BASELINE
+
+    def _write_pointer(self, family: ModelFamily, version: str):
+        family.pointer.parent.mkdir(parents=True, exist_ok=True)
+        tmp = family.pointer.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(version)
+        os.replace(tmp, family.pointer)
+
+    def _load_version(self, family: ModelFamily, version: str) -> LoadedModel:
+        started = time.perf_counter()
+        model = family.load(self.version_dir(family.name, version))
+        if family.validate is not None:
+            family.validate(model)
+        return LoadedModel(version, model, time.perf_counter() - started)
+
+    def _swap(self, family: ModelFamily, loaded: LoadedModel):
+        family.previous, family.active = family.active, loaded
+        family.error = None
+        snapshots.invalidate()
+        for listener in self.listeners:
+            listener(family.name)
+        print(f"Model family {family.name} now serving version {loaded.version} "
+              f"(loaded in {loaded.load_seconds:.2f}s)")
+
+    def get(self, name: str) -> Any:
+        """The active model of a family, loading it on first use."""
+        family = self._family(name)
+        now = time.monotonic()
+        if now - family.checked_at >= MODEL_CHECK_INTERVAL:
+            family.checked_at = now
+            self._follow_pointer(family)
+        active = family.active
+        if active is not None:
+            return active.model
+        with family.lock:
+            if family.active is None:
+                if family.failed_at is not None and now - family.failed_at < MODEL_CHECK_INTERVAL:
+                    raise ModelUnavailable(f"Model family '{name}' failed to load: {family.error}")
+                version = self._pointed_version(family)
+                try:
+                    family.active = self._load_version(family, version)
+                    family.error = family.failed_at = None
+                except Exception as e:
+                    family.error = f"{type(e).__name__}: {e}"
+                    family.failed_at = now
+                    raise ModelUnavailable(f"Model family '{name}' ({version}) failed to load: {family.error}") from e
+            return family.active.model
+
+    def _follow_pointer(self, family: ModelFamily):
+        # Another worker activated or rolled back a version: load it here too
+        if family.active is None or family.loading is not None:
+            return
+        version = self._pointed_version(family)
+        if version != family.active.version:
+            self._start_load(family, version, write_pointer=False)
+
+    def _start_load(self, family: ModelFamily, version: str, write_pointer: bool) -> bool:
+        with family.lock:
+            if family.loading is not None:
+                return False
+            family.loading = version
+        threading.Thread(target=self._background_load, args=(family, version, write_pointer),
+                         name=f"model-load-{family.name}", daemon=True).start()
+        return True
+
+    def _background_load(self, family: ModelFamily, version: str, write_pointer: bool):
+        try:
+            if family.previous is not None and family.previous.version == version:
+                loaded = family.previous
+            else:
+                loaded = self._load_version(family, version)
+            with family.lock:
+                if write_pointer:
+                    self._write_pointer(family, version)
+                self._swap(family, loaded)
+        except Exception as e:
+            family.error = f"{version}: {type(e).__name__}: {e}"
+            print(f"WARNING: Model family {family.name} version {version} rejected: {family.error}")
+        finally:
+            family.loading = None
+
+    def activate(self, name: str, version: str) -> bool:
+        """Load and validate `version` in the background, then swap it in.
+
+        Returns False when the family is already loading a version.
+        """
+        family = self._family(name)
+        self.version_dir(name, version)  # unknown versions fail here, not in the thread
+        return self._start_load(family, version, write_pointer=True)
+
+    def rollback(self, name: str) -> Optional[str]:
+        """Swap the previously active version back in; returns its name.
+
+        Returns None when the family is loading a version, which would
+        otherwise swap itself in over the rollback.
+        """
+        family = self._family(name)
+        with family.lock:
+            if family.loading is not None:
+                return None
+            if family.previous is None:
+                raise ValueError(f"Model family '{name}' has no previous version to roll back to")
+            self._write_pointer(family, family.previous.version)
+            self._swap(family, family.previous)
+            return family.active.version
+
+    def preload(self):
+        """Load every family now instead of on first use; failures are logged, not raised."""
+        for name in self.families:
+            try:
+                self.get(name)
+            except ModelUnavailable as e:
+                print(f"WARNING: {e}")
+
+    def status(self) -> List[dict]:
+        result = []
+        for name, family in self.families.items():
+            active, previous = family.active, family.previous
+            result.append({
+                "family": name,
+                "active_version": active.version if active else None,
+                "previous_version": previous.version if previous else None,
+                "versions": self.versions(name),
+                "loaded_at": active.loaded_at.isoformat() if active else None,
+                "load_seconds": round(active.load_seconds, 3) if active else None,
+                "memory_bytes": active.memory_bytes if active else None,
+                "loading": family.loading,
+                "error": family.error,
+            })
+        return result
+
+
+model_registry = ModelRegistry()
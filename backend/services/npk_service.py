@@ -1,35 +1,50 @@
 from datetime import datetime, timedelta, timezone
-from services.data_store import data_store
-from services.weather_service import weather_service
 from services.dashboard_service import dashboard_service
+from services.snapshot import snapshots
 import numpy as np
 
 class NpkService:
     def get_npk_predictions(self) -> dict:
-        current = data_store.get_current_data()
-        weather = weather_service.get_weather_forecast()
+        current = snapshots.get("current")
         
         # ── Real ML Inference ─────────────────────────────────────
-        # Bridge the gap by calling the Multi-Output Regressor
-        ml_forecast = dashboard_service.get_npk_ph_forecast()
+        # One batched Multi-Output Regressor call gives every day 1-14
+        trajectory = dashboard_service.get_npk_ph_trajectory()
         
         # ── Weather Integration (Leaching) ────────────────────────
         # The ML model doesn't have 'rain' as an input, so we adjust the output
-        leaching_multiplier = 1.0
-        if weather["rain_next_48h_mm"] > 25:
-            leaching_multiplier = 0.85 # 15% reduction due to predicted leaching
-        elif weather["rain_next_48h_mm"] > 10:
-            leaching_multiplier = 0.95
-            
-        n_7d = ml_forecast["N"] * leaching_multiplier
-        p_7d = ml_forecast["P"] # P doesn't leach easily
-        k_7d = ml_forecast["K"] * leaching_multiplier
+        # by the forecast rain accumulated up to each day
+        rain_to_date = np.cumsum(trajectory["rain_mm"])
+        leaching = np.where(rain_to_date > 25, 0.85, np.where(rain_to_date > 10, 0.95, 1.0))
         
-        # 14-day is estimated by extending the 7-day trend from ML
-        # (This keeps the 14-day projection consistent with the ML logic)
-        n_14d = max(current["nitrogen"] + (n_7d - current["nitrogen"]) * 2, 0)
-        p_14d = max(current["phosphorus"] + (p_7d - current["phosphorus"]) * 2, 0)
-        k_14d = max(current["potassium"] + (k_7d - current["potassium"]) * 2, 0)
+        n_daily = np.maximum(trajectory["N"] * leaching, 0)
+        p_daily = np.maximum(trajectory["P"], 0) # P doesn't leach easily
+        k_daily = np.maximum(trajectory["K"] * leaching, 0)
+        
+        day_7, day_14 = 6, 13
+        leaching_multiplier = float(leaching[day_7])
+        n_7d, p_7d, k_7d = float(n_daily[day_7]), float(p_daily[day_7]), float(k_daily[day_7])
+        n_14d, p_14d, k_14d = float(n_daily[day_14]), float(p_daily[day_14]), float(k_daily[day_14])
+        
+        # Spread of the tree ensemble, with the same leaching adjustment
+        uncertainty = None
+        spread = trajectory.get("spread")
+        if spread is not None:
+            factors = np.column_stack([leaching, np.ones_like(leaching), leaching])
+            quantiles = {key: spread[key][:, :3] * factors for key in ("p10", "p50", "p90")}
+            quantiles = {key: np.maximum(value, 0) for key, value in quantiles.items()}
+            quantiles["spread"] = spread["spread"][:, :3] * factors
+            means = np.column_stack([n_daily, p_daily, k_daily])
+            uncertainty = {
+                label: {
+                    nutrient: {
+                        "mean": round(float(means[day, i]), 2),
+                        **{key: round(float(value[day, i]), 2) for key, value in quantiles.items()},
+                    }
+                    for i, nutrient in enumerate(("N", "P", "K"))
+                }
+                for label, day in (("7_days", day_7), ("14_days", day_14))
+            }
         
         # 2. Smart Recommendation Logic (Unchanged from dynamic implementation)
         
@@ -62,6 +77,14 @@ class NpkService:
             "current": {"N": current["nitrogen"], "P": current["phosphorus"], "K": current["potassium"]},
             "7_days": {"N": n_7d, "P": p_7d, "K": k_7d},
             "14_days": {"N": n_14d, "P": p_14d, "K": k_14d},
+            "trajectory": [
+                {"day": int(day), "date": date, "N": n, "P": p, "K": k}
+                for day, date, n, p, k in zip(
+                    trajectory["days"], trajectory["dates"],
+                    n_daily.tolist(), p_daily.tolist(), k_daily.tolist()
+                )
+            ],
+            "uncertainty": uncertainty,
             "recommendation": recommendation,
             "environmental_factors": {
                 "leaching_risk": "high" if leaching_multiplier < 0.9 else "medium" if leaching_multiplier < 0.98 else "low"
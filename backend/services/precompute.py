@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from services.data_store import data_store
+from services.model_registry import model_registry
+from services.snapshot import snapshots
+from services.weather_service import weather_service
+
+# PRECOMPUTE_ENABLED=0 turns the scheduler off (every request computes)
+PRECOMPUTE_ENABLED = os.environ.get("PRECOMPUTE_ENABLED", "1") != "0"
+# Seconds between checks for a new weather hour or a reading ingested by another worker
+PRECOMPUTE_INTERVAL = float(os.environ.get("PRECOMPUTE_INTERVAL", 5))
+
+
+def serialize(data: Any, response_model: Optional[Type[BaseModel]] = None) -> bytes:
+    """JSON bytes identical to what FastAPI renders for `data` under `response_model`."""
+    if response_model is not None:
+        data = response_model(**data)
+    content = jsonable_encoder(data, by_alias=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class PrecomputeScheduler:
+    """Recomputes registered responses in the background and keeps them serialized.
+
+    A daemon thread refreshes every job when the snapshot key changes (a new
+    reading, in this worker or another one, a new weather hour or a model
+    swap). Ingest and swaps wake it immediately; otherwise it polls every
+    PRECOMPUTE_INTERVAL seconds. Routers return the stored bytes, so a
+    request never waits on model inference once the cache is warm.
+    """
+
+    def __init__(self, interval: float = PRECOMPUTE_INTERVAL):
+        self.interval = interval
+        self.jobs: Dict[str, Tuple[Callable[[], Any], Optional[Type[BaseModel]]]] = {}
+        self.results: Dict[str, Tuple[tuple, bytes]] = {}
+        self.refreshed_key = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, compute: Callable[[], Any], response_model: Optional[Type[BaseModel]] = None):
+        self.jobs[name] = (compute, response_model)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Latest serialized result for `name` (possibly one tick old), or None."""
+        result = self.results.get(name)
+        return None if result is None else result[1]
+
+    def response(self, name: str) -> Optional[Response]:
+        """The precomputed result as a ready JSON response, or None when not warm."""
+        content = self.get(name)
+        return None if content is None else Response(content=content, media_type="application/json")
+
+    def notify(self, *args):
+        self._wake.set()
+
+    def refresh(self):
+        """Recompute every job for the current snapshot; failures keep the old bytes."""
+        key = snapshots.current().key
+        for name, (compute, response_model) in self.jobs.items():
+            try:
+                self.results[name] = (key, serialize(compute(), response_model))
+            except Exception as e:
+                print(f"WARNING: Precompute of {name} failed: {e}")
+        self.refreshed_key = key
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            # Off the event loop, so this may wait on the new hour's forecast
+            weather_service.cache_hour()
+            if snapshots.current().key != self.refreshed_key:
+                started = time.perf_counter()
+                self.refresh()
+                print(f"Precomputed {len(self.jobs)} responses in {time.perf_counter() - started:.2f}s")
+
+    def start(self):
+        """Warm every job once, then keep them fresh from a daemon thread."""
+        if self._thread is not None:
+            return
+        self.refresh()
+        data_store.listeners.append(self.notify)
+        model_registry.listeners.append(self.notify)
+        self._thread = threading.Thread(target=self._run, name="precompute", daemon=True)
+        self._thread.start()
+
+
+precompute = PrecomputeScheduler()
@@ -0,0 +1,41 @@
+import threading
+from typing import Any, Callable, Hashable
+
+
+class VersionedCache:
+    """Holds the latest result of a computation keyed by the versions of its inputs.
+
+    A lookup with the current key is a single tuple comparison. When any
+    input version moves (new reading, new weather hour, new model) the key
+    changes and the next caller recomputes; concurrent callers for the same
+    new key wait for that one computation instead of repeating it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._entry = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        entry = self._entry
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            value = compute()
+            self._entry = (key, value)
+            self.misses += 1
+            return value
+
+    def invalidate(self):
+        self._entry = None
+
+    def stats(self) -> dict:
+        return {"name": self.name, "hits": self.hits, "misses": self.misses,
+                "key": None if self._entry is None else repr(self._entry[0])}
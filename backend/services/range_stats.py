@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+from services.sensor_store import SensorStore
+
+
+class _Growable:
+    """Append-only float64 buffer with amortized O(1) growth."""
+
+    def __init__(self, fill: float = 0.0):
+        self.data = np.full(64, fill, dtype=np.float64)
+        self.size = 0
+        self.fill = fill
+
+    def reserve(self, required: int):
+        if required > len(self.data):
+            resized = np.full(max(required, 2 * len(self.data)), self.fill, dtype=np.float64)
+            resized[:self.size] = self.data[:self.size]
+            self.data = resized
+
+    def extend(self, values: np.ndarray):
+        self.reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class ParameterStats:
+    """Prefix sums and min/max sparse tables over one parameter column.
+
+    Prefix sums of values, of their squares and of non-NaN counts give any
+    range's mean and sample standard deviation in O(1). Level k of each sparse table holds the min (or max) of the 2**k
+    rows starting at each position, so a range is covered by two
+    overlapping power-of-two blocks. Appending rows extends every level in
+    O(log n) amortized time per row.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.prefix_sum = _Growable()
+        self.prefix_sq = _Growable()
+        self.prefix_count = _Growable()
+        for prefix in (self.prefix_sum, self.prefix_sq, self.prefix_count):
+            prefix.extend(np.zeros(1))
+        self.mins = []
+        self.maxs = []
+
+    def extend(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        self.prefix_sum.extend(self.prefix_sum.view()[-1] + np.cumsum(filled))
+        self.prefix_sq.extend(self.prefix_sq.view()[-1] + np.cumsum(filled * filled))
+        self.prefix_count.extend(self.prefix_count.view()[-1] + np.cumsum(present))
+
+        self.rows += len(values)
+        for tables, op, blank in ((self.mins, np.fmin, np.inf), (self.maxs, np.fmax, -np.inf)):
+            level_values = np.where(present, values, blank)
+            if not tables:
+                tables.append(_Growable(blank))
+            tables[0].extend(level_values)
+            k = 1
+            while (1 << k) <= self.rows:
+                if len(tables) == k:
+                    tables.append(_Growable(blank))
+                half = 1 << (k - 1)
+                # Entries whose 2**k window now ends inside the table
+                lo, hi = tables[k].size, self.rows - (1 << k) + 1
+                below = tables[k - 1].view()
+                tables[k].extend(op(below[lo:hi], below[lo + half:hi + half]))
+                k += 1
+
+    def truncate(self, rows: int):
+        """Forget every row from `rows` on, so they can be extended again."""
+        rows = min(rows, self.rows)
+        self.rows = rows
+        self.prefix_sum.size = self.prefix_sq.size = self.prefix_count.size = rows + 1
+        for tables in (self.mins, self.maxs):
+            for k, table in enumerate(tables):
+                table.size = max(rows - (1 << k) + 1, 0)
+
+    def query(self, start: int, stop: int) -> Optional[dict]:
+        """Count/mean/std/min/max of rows [start, stop), ignoring NaNs (std needs two values)."""
+        if stop <= start:
+            return None
+        count = int(self.prefix_count.data[stop] - self.prefix_count.data[start])
+        if count == 0:
+            return None
+        k = int(stop - start).bit_length() - 1
+        right = stop - (1 << k)
+        total = self.prefix_sum.data[stop] - self.prefix_sum.data[start]
+        squares = self.prefix_sq.data[stop] - self.prefix_sq.data[start]
+        std = None
+        if count > 1:
+            std = float(np.sqrt(max((squares - total * total / count) / (count - 1), 0.0)))
+        return {
+            "count": count,
+            "mean": float(total / count),
+            "std": std,
+            "min": float(min(self.mins[k].data[start], self.mins[k].data[right])),
+            "max": float(max(self.maxs[k].data[start], self.maxs[k].data[right])),
+        }
+
+
+class RangeStats:
+    """Constant-time range statistics for SensorStore parameters.
+
+    Tables are built on the first query for a parameter (they take
+    O(n log n) memory, so only charted parameters pay for them). After
+    that they catch up with rows appended since the last query, and
+    re-fold the last row when it was filled in place.
+    """
+
+    def __init__(self, store: SensorStore):
+        self.store = store
+        self.parameters: Dict[str, ParameterStats] = {}
+        self.tail_edits = 0
+        self._lock = threading.Lock()
+
+    def query(self, parameter: str, start: int, stop: int) -> Optional[dict]:
+        values = self.store.column(parameter)
+        if values is None or values.dtype.kind != "f":
+            return None
+        with self._lock:
+            if self.store.tail_edits != self.tail_edits:
+                self.tail_edits = self.store.tail_edits
+                for folded in self.parameters.values():
+                    folded.truncate(folded.rows - 1)
+            stats = self.parameters.get(parameter)
+            if stats is None:
+                stats = self.parameters[parameter] = ParameterStats()
+            if stats.rows < len(values):
+                stats.extend(values[stats.rows:])
+            return stats.query(start, min(stop, stats.rows))
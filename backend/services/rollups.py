@@ -0,0 +1,203 @@
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+from services.sensor_store import SensorStore, TimeBound, to_epoch
+
+# Rollup levels kept by the pyramid, finest first (bucket width in seconds)
+ROLLUP_LEVELS = {
+    "hourly": 3600,
+    "6h": 6 * 3600,
+    "daily": 24 * 3600,
+}
+
+
+class RollupLevel:
+    """Fixed-width time buckets holding count/sum/min/max per parameter."""
+
+    def __init__(self, seconds: int, parameters: List[str]):
+        self.seconds = seconds
+        self.size = 0
+        self.starts = np.empty(64, dtype=np.int64)
+        self.stats = {
+            name: {
+                "count": np.zeros(64, dtype=np.int64),
+                "sum": np.zeros(64, dtype=np.float64),
+                "min": np.zeros(64, dtype=np.float64),
+                "max": np.zeros(64, dtype=np.float64),
+            }
+            for name in parameters
+        }
+
+    def _reserve(self, required: int):
+        if required <= len(self.starts):
+            return
+        capacity = max(required, 2 * len(self.starts))
+
+        def grown(buffer):
+            resized = np.zeros(capacity, dtype=buffer.dtype)
+            resized[:self.size] = buffer[:self.size]
+            return resized
+
+        self.starts = grown(self.starts)
+        for stats in self.stats.values():
+            for key in stats:
+                stats[key] = grown(stats[key])
+
+    def fold(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]):
+        """Fold new (time-ordered) rows into the buckets, extending the open last bucket."""
+        buckets = timestamps - timestamps % self.seconds
+        starts, first = np.unique(buckets, return_index=True)
+        counts = np.diff(np.append(first, len(buckets)))
+
+        # The first new bucket may continue the last stored one
+        merge = self.size > 0 and starts[0] == self.starts[self.size - 1]
+        offset = self.size - 1 if merge else self.size
+        self._reserve(offset + len(starts))
+        self.starts[offset:offset + len(starts)] = starts
+
+        for name, stats in self.stats.items():
+            values = columns[name]
+            new = {
+                "count": counts,
+                "sum": np.add.reduceat(values, first),
+                "min": np.minimum.reduceat(values, first),
+                "max": np.maximum.reduceat(values, first),
+            }
+            if merge:
+                last = self.size - 1
+                new["count"] = new["count"].copy()
+                new["count"][0] += stats["count"][last]
+                new["sum"][0] += stats["sum"][last]
+                new["min"][0] = min(new["min"][0], stats["min"][last])
+                new["max"][0] = max(new["max"][0], stats["max"][last])
+            for key, array in new.items():
+                stats[key][offset:offset + len(starts)] = array
+        self.size = offset + len(starts)
+
+    def refold_last(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]):
+        """Rebuild the last bucket from its rows (e.g. after one was edited)."""
+        self.size -= 1
+        self.fold(timestamps, columns)
+
+    def span(self, start: Optional[float], end: Optional[float]) -> slice:
+        starts = self.starts[:self.size]
+        lo = 0 if start is None else int(np.searchsorted(starts, start - start % self.seconds, side="left"))
+        hi = self.size if end is None else int(np.searchsorted(starts, end, side="left"))
+        return slice(lo, max(lo, hi))
+
+
+class RollupPyramid:
+    """Hourly, 6-hourly and daily min/mean/max rollups over a SensorStore.
+
+    The pyramid remembers how many store rows it has folded and catches up
+    on the next access, so readings appended by ingestion (in this worker or,
+    in shared mode, any worker) are folded in incrementally. When the last
+    row is filled in place, only the buckets holding it are rebuilt.
+    """
+
+    def __init__(self, store: SensorStore, levels: Dict[str, int] = ROLLUP_LEVELS):
+        self.store = store
+        self.level_seconds = dict(levels)
+        self.levels: Dict[str, RollupLevel] = {}
+        self.consumed = 0
+        self.tail_edits = 0
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        size = len(self.store)
+        if self.store.tail_edits != self.tail_edits:
+            self.tail_edits = self.store.tail_edits
+            if self.levels and self.consumed:
+                self._refold_last()
+        if size == self.consumed:
+            return
+        if not self.levels:
+            parameters = [
+                name for name in self.store.parameters
+                if self.store.column(name).dtype.kind == "f"
+            ]
+            self.levels = {
+                name: RollupLevel(seconds, parameters)
+                for name, seconds in self.level_seconds.items()
+            }
+        timestamps = self.store.timestamps[self.consumed:size]
+        parameters = next(iter(self.levels.values())).stats
+        columns = {name: self.store.column(name)[self.consumed:size] for name in parameters}
+        for level in self.levels.values():
+            level.fold(timestamps, columns)
+        self.consumed = size
+
+    def _refold_last(self):
+        # The edited row is the last one folded (later rows are not folded yet)
+        timestamps = self.store.timestamps[:self.consumed]
+        parameters = next(iter(self.levels.values())).stats
+        for level in self.levels.values():
+            first = int(np.searchsorted(timestamps, level.starts[level.size - 1]))
+            level.refold_last(
+                timestamps[first:],
+                {name: self.store.column(name)[first:self.consumed] for name in parameters},
+            )
+
+    def count(self, level: str, start: TimeBound = None, end: TimeBound = None) -> int:
+        """Number of buckets a window covers at `level` (binary search only)."""
+        with self._lock:
+            self._sync()
+            span = self.levels[level].span(to_epoch(start), to_epoch(end))
+            return span.stop - span.start
+
+    def query(self, level: str, parameter: str, start: TimeBound = None, end: TimeBound = None) -> Optional[dict]:
+        """Bucket starts with mean/min/max of `parameter` for buckets overlapping [start, end)."""
+        with self._lock:
+            self._sync()
+            rollup = self.levels[level]
+            stats = rollup.stats.get(parameter)
+            if stats is None:
+                return None
+            span = rollup.span(to_epoch(start), to_epoch(end))
+            counts = stats["count"][span]
+            return {
+                "timestamps": rollup.starts[span].copy(),
+                "value": stats["sum"][span] / np.maximum(counts, 1),
+                "min": stats["min"][span].copy(),
+                "max": stats["max"][span].copy(),
+            }
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices to keep.
+
+    Keeps the first and last points and, from each of `threshold - 2` equal
+    buckets, the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves peaks and dips.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Averages of every bucket at once; the last "next bucket" is the final point
+    csx = np.concatenate(([0.0], np.cumsum(x)))
+    csy = np.concatenate(([0.0], np.cumsum(y)))
+    next_lo = np.append(edges[1:-1], n - 1)
+    next_hi = np.append(edges[2:], n)
+    sizes = next_hi - next_lo
+    avg_x = (csx[next_hi] - csx[next_lo]) / sizes
+    avg_y = (csy[next_hi] - csy[next_lo]) / sizes
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
@@ -0,0 +1,264 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Union
+
+TimeBound = Union[datetime, int, float, None]
+
+
+def epochs_from_datetimes(values) -> np.ndarray:
+    """Convert datetimes to int64 epoch seconds of their wall-clock time.
+
+    Timestamps have always been rendered as ``%Y-%m-%dT%H:%M:%S+00:00`` from
+    the local wall clock, so the epoch is taken from the same wall clock to
+    keep every API response identical. A batch may mix offsets, or naive
+    and aware values, so each value's wall clock is taken on its own.
+    """
+    try:
+        ts = pd.to_datetime(pd.Series(values))
+    except (TypeError, ValueError):
+        ts = pd.Series([pd.Timestamp(value).tz_localize(None) for value in values], dtype="datetime64[ns]")
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    return ts.to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def iso_from_epochs(epochs: np.ndarray) -> List[str]:
+    """Render epoch seconds in the ISO format used by every endpoint."""
+    stamps = np.datetime_as_string(np.asarray(epochs, dtype=np.int64).astype("datetime64[s]"), unit="s")
+    return np.char.add(stamps, "+00:00").tolist()
+
+
+def to_epoch(value: TimeBound) -> Optional[float]:
+    """Normalize a datetime or epoch-seconds bound (None stays open-ended).
+
+    Naive datetimes are read as UTC, matching the "+00:00" the API renders.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class TimeIndex:
+    """Sorted epoch-second index answering `[start, end)` range lookups by binary search."""
+
+    def __init__(self, epochs: np.ndarray):
+        self.epochs = np.asarray(epochs)
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def span(self, start: TimeBound = None, end: TimeBound = None) -> slice:
+        """Return the positional slice of entries with start <= t < end."""
+        start, end = to_epoch(start), to_epoch(end)
+        lo = 0 if start is None else int(np.searchsorted(self.epochs, start, side="left"))
+        hi = len(self.epochs) if end is None else int(np.searchsorted(self.epochs, end, side="left"))
+        return slice(lo, max(lo, hi))
+
+    def insert(self, epoch: TimeBound) -> int:
+        """Insert a timestamp keeping the index sorted; returns its position."""
+        epoch = to_epoch(epoch)
+        pos = int(np.searchsorted(self.epochs, epoch, side="right"))
+        self.epochs = np.insert(self.epochs, pos, epoch)
+        return pos
+
+
+class SensorStore:
+    """Columnar store of hourly sensor readings.
+
+    Holds one typed NumPy array per parameter (nitrogen, soil_moisture,
+    wfps, pH, ...) plus an int64 array of epoch-second timestamps, all
+    aligned by row and sorted by time.
+
+    Rows are appended, except that `update_tail` may fill in the last row
+    (a node reporting late for the latest hour); it bumps `tail_edits` so
+    that incremental readers re-fold that one row. Arrays are
+    over-allocated so appends are amortized O(1); new rows are written
+    before the size is bumped, so a reader never sees a partially written
+    row. Writers must be serialized by the caller.
+    """
+
+    def __init__(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]):
+        self._timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self._columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        self._size = len(self._timestamps)
+        self.version = 0
+        self.tail_edits = 0
+        self._write_lock = threading.Lock()
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._size]
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        size = self._size
+        return {name: values[:size] for name, values in self._columns.items()}
+
+    @property
+    def index(self) -> TimeIndex:
+        return TimeIndex(self.timestamps)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SensorStore":
+        """Build the store from a merged sensor DataFrame with a datetime `timestamp` column."""
+        df = df.sort_values("timestamp")
+        columns = {}
+        for name in df.columns:
+            if name == "timestamp":
+                continue
+            series = df[name]
+            if pd.api.types.is_bool_dtype(series):
+                columns[name] = series.to_numpy(dtype=bool)
+            elif pd.api.types.is_numeric_dtype(series):
+                columns[name] = series.to_numpy(dtype=np.float64)
+            else:
+                columns[name] = series.astype(str).to_numpy(dtype=str)
+        return cls(epochs_from_datetimes(df["timestamp"]), columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "SensorStore":
+        """Build the store from a list of reading dicts with ISO timestamps."""
+        return cls.from_frame(pd.DataFrame(list(records)))
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def parameters(self) -> List[str]:
+        return list(self._columns)
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        """Return the array for a parameter, or None if it is not recorded."""
+        values = self._columns.get(name)
+        return None if values is None else values[:self._size]
+
+    @contextmanager
+    def writer(self):
+        """Serialize writers; hold this across read-check-append sequences."""
+        with self._write_lock:
+            yield self
+
+    def append(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]) -> int:
+        """Append rows newer than the current tail; `columns` must cover every parameter."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        count = len(timestamps)
+        if not count:
+            return 0
+        size = self._size
+        if (size and timestamps[0] <= self._timestamps[size - 1]) or np.any(np.diff(timestamps) <= 0):
+            raise ValueError("Appended readings must be strictly newer than the stored tail")
+        if size + count > len(self._timestamps):
+            self._grow(size + count)
+
+        for name, buffer in list(self._columns.items()):
+            values = np.asarray(columns[name])
+            if values.dtype.kind == "U" and values.dtype.itemsize > buffer.dtype.itemsize:
+                buffer = self._widen(name, values.dtype)
+            buffer[size:size + count] = values
+        self._timestamps[size:size + count] = timestamps
+        self._size = size + count
+        self.version += 1
+        return count
+
+    def update_tail(self, values: Dict[str, object]):
+        """Overwrite some parameters of the last row in place."""
+        index = self._size - 1
+        if index < 0:
+            raise IndexError("sensor store is empty")
+        # Widen first, so a column that cannot hold its text leaves the row untouched
+        for name, value in values.items():
+            buffer = self._columns[name]
+            if buffer.dtype.kind == "U" and len(str(value)) > buffer.dtype.itemsize // 4:
+                self._widen(name, np.dtype(f"<U{len(str(value))}"))
+        for name, value in values.items():
+            self._columns[name][index] = value
+        self.tail_edits += 1
+        self.version += 1
+
+    def _widen(self, name: str, dtype: np.dtype) -> np.ndarray:
+        self._columns[name] = self._columns[name].astype(dtype)
+        return self._columns[name]
+
+    def _grow(self, required: int):
+        capacity = max(required, 2 * len(self._timestamps), 64)
+
+        def grown(buffer):
+            resized = np.empty(capacity, dtype=buffer.dtype)
+            resized[:self._size] = buffer[:self._size]
+            return resized
+
+        columns = {name: grown(buffer) for name, buffer in self._columns.items()}
+        self._timestamps = grown(self._timestamps)
+        self._columns = columns
+
+    def span(self, start: TimeBound = None, end: TimeBound = None) -> slice:
+        """Row slice covering readings with start <= timestamp < end."""
+        return self.index.span(start, end)
+
+    def row(self, index: int = -1) -> dict:
+        """Materialize a single reading as a plain dict (timestamp as ISO string)."""
+        size = self._size
+        index = index + size if index < 0 else index
+        if not 0 <= index < size:
+            raise IndexError("sensor row out of range")
+        record = {"timestamp": iso_from_epochs(self._timestamps[[index]])[0]}
+        for name, values in self._columns.items():
+            record[name] = values[index].item()
+        return record
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        """Materialize rows [start, stop) as reading dicts."""
+        stop = self._size if stop is None else stop
+        stamps = iso_from_epochs(self._timestamps[start:stop])
+        values = {name: arr[start:stop].tolist() for name, arr in self._columns.items()}
+        return [
+            {"timestamp": stamp, **{name: col[i] for name, col in values.items()}}
+            for i, stamp in enumerate(stamps)
+        ]
+
+    def to_frame(self, start: int = 0, stop: Optional[int] = None, parameters: Optional[List[str]] = None) -> pd.DataFrame:
+        """Return rows [start, stop) as a DataFrame with a UTC datetime `timestamp` column."""
+        stop = self._size if stop is None else stop
+        names = parameters if parameters is not None else self.parameters
+        data = {"timestamp": pd.to_datetime(self._timestamps[start:stop], unit="s", utc=True)}
+        for name in names:
+            if name in self._columns:
+                data[name] = self._columns[name][start:stop]
+        return pd.DataFrame(data)
+
+    def save(self, path: Path, meta: Optional[dict] = None):
+        """Write the store to an uncompressed .npz snapshot, atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = self._size
+        arrays = {f"col:{name}": values[:size] for name, values in self._columns.items()}
+        arrays["timestamps"] = self._timestamps[:size]
+        arrays["meta"] = np.array(json.dumps(meta or {}))
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: Path):
+        """Read a snapshot written by `save`; returns (store, meta)."""
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            columns = {key[4:]: npz[key] for key in npz.files if key.startswith("col:")}
+            return cls(npz["timestamps"], columns), meta
@@ -0,0 +1,165 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import joblib
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+from services.sensor_store import SensorStore
+
+# SENSOR_STORE_MODE=shared maps the sensor history from files that every
+# gunicorn worker opens, so one copy serves all workers and ingested rows
+# are visible everywhere. The default ("local") keeps a private copy.
+SHARED_MODE = os.environ.get("SENSOR_STORE_MODE", "local").lower() == "shared"
+SHARED_DIR = Path(os.environ.get(
+    "SENSOR_SHARED_DIR",
+    "/dev/shm/smart-soil" if Path("/dev/shm").is_dir()
+    else Path(__file__).parent.parent / "data" / ".cache" / "shared",
+))
+# Rows preallocated for the shared history (5 years of hourly readings)
+SHARED_CAPACITY = int(os.environ.get("SENSOR_SHARED_CAPACITY", 24 * 365 * 5))
+# Fixed width for text columns, which cannot be widened once mapped
+SHARED_STRING_WIDTH = 32
+
+
+def load_artifact(path: Path):
+    """joblib.load a model, memory-mapping its NumPy arrays in shared mode.
+
+    Mapped arrays are backed by the page cache, so workers loading the same
+    file share those pages instead of each holding a private copy.
+    """
+    return joblib.load(path, mmap_mode="r" if SHARED_MODE else None)
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive advisory lock shared by every process using `path`."""
+    with open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class SharedSensorStore(SensorStore):
+    """SensorStore whose arrays are memory-mapped files shared across processes.
+
+    A generation directory holds one fixed-capacity file per column plus a
+    small state file with the row count, version and tail edit count.
+    Appends take a file lock, write the rows, then bump the shared row
+    count, so every process sees the new rows on its next read.
+    """
+
+    def __init__(self, directory: Path, header: dict):
+        self._directory = directory
+        self._lock_path = directory / ".lock"
+        generation = directory / header["generation"]
+        capacity = header["capacity"]
+        self._state = np.memmap(generation / "state.bin", dtype=np.int64, mode="r+", shape=(3,))
+        self._timestamps = np.memmap(generation / "timestamps.bin", dtype=np.int64, mode="r+", shape=(capacity,))
+        self._columns = {
+            name: np.memmap(generation / f"col{i}.bin", dtype=np.dtype(dtype), mode="r+", shape=(capacity,))
+            for i, (name, dtype) in enumerate(header["columns"])
+        }
+        self._write_lock = threading.Lock()
+
+    @property
+    def _size(self) -> int:
+        return int(self._state[0])
+
+    @_size.setter
+    def _size(self, value: int):
+        self._state[0] = value
+
+    @property
+    def version(self) -> int:
+        return int(self._state[1])
+
+    @version.setter
+    def version(self, value: int):
+        self._state[1] = value
+
+    @property
+    def tail_edits(self) -> int:
+        return int(self._state[2])
+
+    @tail_edits.setter
+    def tail_edits(self, value: int):
+        self._state[2] = value
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock, file_lock(self._lock_path):
+            yield self
+
+    def _widen(self, name: str, dtype: np.dtype) -> np.ndarray:
+        # Mapped columns cannot be reallocated, and truncating would corrupt the text
+        raise ValueError(
+            f"Text for '{name}' needs {dtype.itemsize // 4} characters; "
+            f"the shared column holds {self._columns[name].dtype.itemsize // 4}"
+        )
+
+    def _grow(self, required: int):
+        raise RuntimeError(
+            f"Shared sensor store is full ({len(self._timestamps)} rows); "
+            "raise SENSOR_SHARED_CAPACITY and restart"
+        )
+
+    @classmethod
+    def attach_or_build(cls, key: str, build: Callable[[], SensorStore],
+                        directory: Path = SHARED_DIR, capacity: int = SHARED_CAPACITY) -> "SharedSensorStore":
+        """Attach to the shared history for `key`, building it if this process is first."""
+        directory.mkdir(parents=True, exist_ok=True)
+        with file_lock(directory / ".lock"):
+            header_path = directory / "header.json"
+            header = json.loads(header_path.read_text()) if header_path.exists() else None
+            if (
+                header is None
+                or header.get("key") != key
+                or not (directory / header["generation"] / "state.bin").exists()
+            ):
+                header = cls._write_generation(directory, key, build(), capacity)
+            return cls(directory, header)
+
+    @staticmethod
+    def _write_generation(directory: Path, key: str, store: SensorStore, capacity: int) -> dict:
+        size = len(store)
+        capacity = max(capacity, size)
+        name = f"gen-{key[:12]}-{os.getpid()}-{int(time.time())}"
+        generation = directory / name
+        generation.mkdir()
+
+        columns = []
+        for i, (column, values) in enumerate(store.columns.items()):
+            dtype = values.dtype
+            if dtype.kind == "U":
+                dtype = np.dtype(f"<U{max(dtype.itemsize // 4, SHARED_STRING_WIDTH)}")
+            mapped = np.memmap(generation / f"col{i}.bin", dtype=dtype, mode="w+", shape=(capacity,))
+            mapped[:size] = values
+            mapped.flush()
+            columns.append([column, dtype.str])
+
+        timestamps = np.memmap(generation / "timestamps.bin", dtype=np.int64, mode="w+", shape=(capacity,))
+        timestamps[:size] = store.timestamps
+        timestamps.flush()
+        state = np.memmap(generation / "state.bin", dtype=np.int64, mode="w+", shape=(3,))
+        state[:] = [size, 0, 0]
+        state.flush()
+
+        header = {"key": key, "generation": name, "capacity": capacity, "columns": columns}
+        tmp = directory / "header.json.tmp"
+        tmp.write_text(json.dumps(header))
+        os.replace(tmp, directory / "header.json")
+
+        # Processes still mapping an old generation keep their pages after unlink
+        for old in directory.glob("gen-*"):
+            if old.name != name:
+                shutil.rmtree(old, ignore_errors=True)
+        print(f"Built shared sensor store generation {name} ({size}/{capacity} rows)")
+        return header
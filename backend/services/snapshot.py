@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Callable, Dict
+
+from services.data_store import data_store
+from services.prediction_cache import VersionedCache
+from services.weather_service import weather_service
+
+
+class Snapshot:
+    """Derived values for one (data tick, weather hour), each computed at most once.
+
+    Values are produced on first `get` by the node registered under that
+    name; a node may `get` the values it depends on. Returned values are
+    shared by every caller and must be treated as read-only.
+    """
+
+    def __init__(self, key: tuple, nodes: Dict[str, Callable[["Snapshot"], Any]]):
+        self.key = key
+        self._nodes = nodes
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = self._nodes[name](self)
+            return self._values[name]
+
+
+class SnapshotGraph:
+    """Registry of derived-value nodes plus the snapshot for the current tick.
+
+    The key is the sensor store's data tick and the weather hour being
+    served, so an ingest or a new forecast hour starts a fresh snapshot and
+    everything downstream is recomputed lazily. Building the key never
+    fetches weather, so any endpoint may call `current` from the event
+    loop. Anything else that changes the inputs (such as swapping models)
+    calls `invalidate`.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Callable[[Snapshot], Any]] = {}
+        self._cache = VersionedCache("snapshot")
+        self._generation = 0
+
+    def node(self, name: str):
+        """Decorator registering `fn(snapshot)` as the producer of `name`."""
+        def register(fn):
+            self.nodes[name] = fn
+            return fn
+        return register
+
+    def current(self) -> Snapshot:
+        key = (data_store.data_tick(), weather_service.served_hour(), self._generation)
+        return self._cache.get_or_compute(key, lambda: Snapshot(key, self.nodes))
+
+    def get(self, name: str) -> Any:
+        return self.current().get(name)
+
+    def invalidate(self):
+        self._generation += 1
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+snapshots = SnapshotGraph()
+
+
+@snapshots.node("current")
+def _current_reading(snapshot: Snapshot) -> dict:
+    return data_store.get_current_data()
+
+
+@snapshots.node("weather")
+def _weather_summary(snapshot: Snapshot) -> dict:
+    return weather_service.get_weather_forecast()
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from services.shared_store import load_artifact
+
+# Compiled models sit next to their source as <name>.npz
+COMPILED_SUFFIX = ".npz"
+# COMPILED_MODELS=0 always serves the original joblib models
+USE_COMPILED = os.environ.get("COMPILED_MODELS", "1") != "0"
+# Percentiles reported by `uncertainty`, and the share of boosting rounds
+# whose staged predictions measure a boosted model's spread
+UNCERTAINTY_QUANTILES = (10, 50, 90)
+STAGED_TAIL = 0.5
+
+
+def spread_summary(samples: np.ndarray, axis: int = 1) -> dict:
+    """p10/p50/p90 (UNCERTAINTY_QUANTILES) and standard deviation ("spread") along `axis`."""
+    p10, p50, p90 = np.percentile(samples, UNCERTAINTY_QUANTILES, axis=axis)
+    return {"p10": p10, "p50": p50, "p90": p90, "spread": samples.std(axis=axis)}
+
+
+def _float32_below(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each float64 threshold, so `x <= t` holds exactly for float32 x."""
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+class CompiledEnsemble:
+    """A tree ensemble flattened into node arrays and evaluated for all trees at once.
+
+    Every tree's nodes live in one set of arrays; `roots` holds each tree's
+    first node. A row descends as `node = children[2 * node + (x[feature] >
+    threshold)]`. Leaves point back at themselves with an infinite
+    threshold, so every tree can take `depth` steps in lockstep with no
+    per-tree branching. NaN features follow `nan_right`, the learned
+    default direction.
+
+    `kind` is "proba" (random forest classifier: mean of leaf class
+    fractions), "mean" (random forest regressor: mean of leaf values per
+    target) or "sum" (gradient boosting: base score plus the sum of leaf
+    weights).
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "nan_right", "roots", "value")
+
+    def __init__(self, kind: str, feature, threshold, children, nan_right, roots, value,
+                 depth: int, n_features: int, base_score: float = 0.0, classes=None, source: str = None):
+        self.kind = kind
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.children = np.asarray(children, dtype=np.intp)
+        self.nan_right = np.asarray(nan_right, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.value = np.asarray(value)
+        self.depth = int(depth)
+        self.n_features_in_ = int(n_features)
+        self.base_score = float(base_score)
+        self.classes_ = None if classes is None else np.asarray(classes)
+        # sha256 of the model file this was compiled from
+        self.source = source
+        # The walk runs on slots (2 * node): the per-node arrays are repeated
+        # so a slot indexes them directly and `slot + go_right` is the child
+        # entry, saving two array ops per level
+        self._feature = np.repeat(self.feature, 2)
+        self._threshold = np.repeat(self.threshold, 2)
+        self._nan_right = np.repeat(self.nan_right, 2)
+        self._next = 2 * self.children
+        self._roots = 2 * self.roots
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def leaves(self, X) -> np.ndarray:
+        """(rows, trees) index of the leaf each row reaches in each tree."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        feature, threshold, step = self._feature, self._threshold, self._next
+        if np.isnan(X).any():
+            rows = np.arange(len(X))[:, None]
+            slot = np.broadcast_to(self._roots, (len(X), self.n_trees))
+            for _ in range(self.depth):
+                x = X[rows, feature[slot]]
+                slot = step[slot + np.where(np.isnan(x), self._nan_right[slot], x > threshold[slot])]
+        elif len(X) == 1:
+            # Single row: take from the row itself instead of broadcasting row ids
+            x0 = X[0]
+            slot = self._roots
+            for _ in range(self.depth):
+                slot = step.take(slot + (x0.take(feature.take(slot)) > threshold.take(slot)))
+            slot = slot[None, :]
+        else:
+            rows = np.arange(len(X))[:, None]
+            slot = np.broadcast_to(self._roots, (len(X), self.n_trees))
+            for _ in range(self.depth):
+                slot = step[slot + (X[rows, feature[slot]] > threshold[slot])]
+        return slot >> 1
+
+    def tree_outputs(self, X) -> np.ndarray:
+        """Per-tree leaf values: (rows, trees) for "sum", (rows, trees, classes) for
+        "proba" and (rows, trees, targets) for "mean"."""
+        return self.value[self.leaves(X)]
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self.kind != "proba":
+            raise AttributeError("predict_proba needs a classifier ensemble")
+        return self.tree_outputs(X).sum(axis=1) / self.n_trees
+
+    def _staged(self, outputs: np.ndarray) -> np.ndarray:
+        # XGBoost adds the trees one by one onto the base score in float32;
+        # a cumulative sum keeps that order, so results match it bit for bit
+        terms = np.empty((len(outputs), self.n_trees + 1), dtype=np.float32)
+        terms[:, 0] = self.base_score
+        terms[:, 1:] = outputs
+        return np.cumsum(terms, axis=1)
+
+    def predict(self, X) -> np.ndarray:
+        if self.kind == "proba":
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        if self.kind == "mean":
+            return self.tree_outputs(X).sum(axis=1) / self.n_trees
+        return self._staged(self.tree_outputs(X))[:, -1]
+
+    def uncertainty(self, X) -> dict:
+        """Prediction plus its spread across the ensemble, from one tree walk.
+
+        - "proba": `mean` is predict_proba; the quantiles and `spread`
+          (standard deviation) are over the trees' probabilities for each
+          row's predicted class.
+        - "mean": `mean` is predict; quantiles and spread over the trees'
+          outputs, per target.
+        - "sum": `mean` is predict; quantiles and spread over the staged
+          predictions of the last STAGED_TAIL of boosting rounds, i.e. how
+          much the answer still moves as the final trees are added.
+
+        See spread_summary for the other keys.
+        """
+        outputs = self.tree_outputs(X)
+        if self.kind == "proba":
+            mean = outputs.sum(axis=1) / self.n_trees
+            samples = outputs[np.arange(len(outputs)), :, mean.argmax(axis=1)]
+        elif self.kind == "mean":
+            mean = outputs.sum(axis=1) / self.n_trees
+            samples = outputs
+        else:
+            staged = self._staged(outputs)
+            mean = staged[:, -1]
+            tail = max(int(np.ceil(self.n_trees * STAGED_TAIL)), 1)
+            samples = staged[:, -tail:].astype(np.float64)
+        return {"mean": mean, **spread_summary(samples)}
+
+    def save(self, path: Path):
+        meta = {
+            "kind": self.kind, "depth": self.depth, "n_features": self.n_features_in_,
+            "base_score": self.base_score,
+            "classes": None if self.classes_ is None else self.classes_.tolist(),
+            "source": self.source,
+        }
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays["feature"] = arrays["feature"].astype(np.int32)
+        arrays["children"] = arrays["children"].astype(np.int32)
+        arrays["roots"] = arrays["roots"].astype(np.int32)
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledEnsemble":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in cls.ARRAYS}
+        return cls(meta["kind"], **arrays, depth=meta["depth"], n_features=meta["n_features"],
+                   base_score=meta["base_score"], classes=meta["classes"], source=meta["source"])
+
+
+class _Builder:
+    """Appends trees into the flat arrays, leaves made self-looping."""
+
+    def __init__(self):
+        self.feature: List[np.ndarray] = []
+        self.threshold: List[np.ndarray] = []
+        self.children: List[np.ndarray] = []
+        self.nan_right: List[np.ndarray] = []
+        self.value: List[np.ndarray] = []
+        self.roots: List[int] = []
+        self.size = 0
+        self.depth = 0
+
+    def add(self, feature, threshold, left, right, nan_right, value, depth):
+        n = len(feature)
+        ids = np.arange(n)
+        leaf = left < 0
+        offset = self.size
+        self.feature.append(np.where(leaf, 0, feature))
+        self.threshold.append(np.where(leaf, np.float32(np.inf), threshold).astype(np.float32))
+        self.children.append(np.stack([np.where(leaf, ids, left), np.where(leaf, ids, right)], axis=1).ravel() + offset)
+        self.nan_right.append(np.where(leaf, False, nan_right))
+        self.value.append(value)
+        self.roots.append(offset)
+        self.size += n
+        self.depth = max(self.depth, depth)
+
+    def build(self, kind, n_features, base_score=0.0, classes=None) -> CompiledEnsemble:
+        return CompiledEnsemble(
+            kind, np.concatenate(self.feature), np.concatenate(self.threshold),
+            np.concatenate(self.children), np.concatenate(self.nan_right), np.array(self.roots),
+            np.concatenate(self.value), self.depth, n_features, base_score, classes,
+        )
+
+
+def compile_forest(model) -> CompiledEnsemble:
+    """Flatten a fitted scikit-learn random forest (`x <= threshold` goes left).
+
+    Classifiers keep class fractions per leaf; regressors keep one value
+    per target.
+    """
+    classifier = hasattr(model, "classes_")
+    builder = _Builder()
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        if classifier:
+            value = tree.value[:, 0, :].astype(np.float64)
+            # Older releases store class counts, newer ones fractions; normalise either way
+            value = value / value.sum(axis=1, keepdims=True)
+        else:
+            value = tree.value[:, :, 0].astype(np.float64)
+        missing_left = getattr(tree, "missing_go_to_left", np.ones(tree.node_count, dtype=np.uint8))
+        builder.add(tree.feature, _float32_below(tree.threshold), tree.children_left,
+                    tree.children_right, np.asarray(missing_left) == 0, value, tree.max_depth)
+    if classifier:
+        return builder.build("proba", model.n_features_in_, classes=model.classes_)
+    return builder.build("mean", model.n_features_in_)
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):  # XGBoost numbers children after their parent
+        if left[node] >= 0:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def compile_xgboost(model) -> CompiledEnsemble:
+    """Flatten a fitted XGBRegressor (gbtree, one target; `x < condition` goes left)."""
+    learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+    booster = learner["gradient_booster"]
+    if booster["name"] != "gbtree" or int(learner["learner_model_param"]["num_target"]) != 1:
+        raise ValueError("Only single-target gbtree models can be compiled")
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    builder = _Builder()
+    for tree in booster["model"]["trees"]:
+        left = np.array(tree["left_children"], dtype=np.int64)
+        right = np.array(tree["right_children"], dtype=np.int64)
+        condition = np.array(tree["split_conditions"], dtype=np.float32)
+        # Right when x >= c, i.e. x > the next float32 below c; leaves carry their weight in c
+        threshold = np.nextafter(condition, np.float32(-np.inf))
+        nan_right = np.array(tree["default_left"], dtype=np.int64) == 0
+        builder.add(np.array(tree["split_indices"], dtype=np.int64), threshold, left, right,
+                    nan_right, np.where(left < 0, condition, 0).astype(np.float32), _tree_depth(left, right))
+    n_features = int(learner["learner_model_param"]["num_feature"])
+    return builder.build("sum", n_features, base_score)
+
+
+def compile_model(model) -> CompiledEnsemble:
+    if isinstance(model, CompiledEnsemble):
+        return model
+    if hasattr(model, "get_booster"):
+        return compile_xgboost(model)
+    if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+        return compile_forest(model)
+    raise TypeError(f"Cannot compile {type(model).__name__}")
+
+
+def compiled_path(path: Path) -> Path:
+    return Path(path).with_suffix(COMPILED_SUFFIX)
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def compile_file(path: Path) -> CompiledEnsemble:
+    """Compile the model at `path` and write it next to the source."""
+    compiled = compile_model(load_artifact(path))
+    compiled.source = file_digest(path)
+    compiled.save(compiled_path(path))
+    return compiled
+
+
+def load_estimator(path: Path):
+    """The compiled ensemble next to `path` when it matches the source, else the joblib model.
+
+    A compiled file whose recorded digest differs from the source is
+    ignored, so a retrained model is never shadowed by a stale export.
+    COMPILED_MODELS=0 always loads the original.
+    """
+    path = Path(path)
+    compiled = compiled_path(path)
+    if USE_COMPILED and compiled.exists():
+        ensemble = CompiledEnsemble.load(compiled)
+        if ensemble.source == file_digest(path):
+            return ensemble
+        print(f"WARNING: {compiled.name} is stale for {path.name}; loading the original model")
+    return load_artifact(path)
+
@@ -1,74 +1,380 @@
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+from zoneinfo import ZoneInfo
+
 import httpx
-from datetime import datetime
-from functools import lru_cache
 
-OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+# OPEN_METEO_URL points the client at another server, e.g. a local stub in tests
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
 LAT = 7.4333
 LON = 80.5667
+# Hourly times come back as wall-clock hours in this timezone
+FORECAST_TIMEZONE = "Asia/Colombo"
+# Covers the 14-day NPK trajectory
+FORECAST_DAYS = 14
+FETCH_TIMEOUT = 10.0
+# Seconds before a failed fetch is retried; failures are never cached for the hour
+WEATHER_RETRY_SECONDS = float(os.environ.get("WEATHER_RETRY_SECONDS", 60))
+# Forecasts shared by every worker and kept across restarts, one JSON file
+# per location and hour; files older than WEATHER_CACHE_HOURS are pruned
+WEATHER_CACHE_DIR = Path(os.environ.get(
+    "WEATHER_CACHE_DIR", Path(__file__).parent.parent / "data" / ".cache" / "weather",
+))
+WEATHER_CACHE_HOURS = int(os.environ.get("WEATHER_CACHE_HOURS", 24 * 7))
+# The prefetcher fetches the next hour's forecast this many seconds before the boundary
+WEATHER_PREFETCH_ENABLED = os.environ.get("WEATHER_PREFETCH_ENABLED", "1") != "0"
+WEATHER_PREFETCH_LEAD = float(os.environ.get("WEATHER_PREFETCH_LEAD", 120))
+HOUR_FORMAT = "%Y-%m-%d-%H"
+
+# Every WeatherService, so a forked worker can drop its parent's loop state
+_services = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for service in list(_services):
+        service._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _empty_forecast() -> dict:
+    return {
+        "hourly_time": [],
+        "hourly_rain_mm": [0.0] * 72,
+        "hourly_temp_c": [],
+        "hourly_humidity_pct": [],
+        "hourly_et0_mm": [],
+        "rain_next_6h_mm": 0.0,
+        "rain_next_24h_mm": 0.0,
+        "rain_next_48h_mm": 0.0,
+        "peak_rain_hour": "Unknown"
+    }
+
+
+def forecast_now(forecast: Optional[dict] = None) -> datetime:
+    """The current wall-clock time in the forecast's timezone, naive like its hourly times."""
+    now = datetime.now(timezone.utc)
+    offset = (forecast or {}).get("utc_offset_seconds")
+    local = now + timedelta(seconds=offset) if offset is not None else now.astimezone(ZoneInfo(FORECAST_TIMEZONE))
+    return local.replace(tzinfo=None)
+
+
+def summarize_forecast(data: dict) -> dict:
+    """Hourly arrays and rain summaries from an Open-Meteo response.
+
+    Like a fresh response, the arrays start at 00:00 today (in the
+    forecast's timezone), so days before that are dropped from an older
+    cached forecast.
+    """
+    hourly = data["hourly"]
+    times = hourly.get("time", [])
+    offset = timedelta(seconds=data.get("utc_offset_seconds", 0))
+    today = (datetime.now(timezone.utc) + offset).date().isoformat()
+    start = next((i for i, t in enumerate(times) if t[:10] >= today), len(times)) if times else 0
+    times = times[start:]
+    precip = hourly.get("precipitation", [])[start:]
+    temps = hourly.get("temperature_2m", [])[start:]
+    humids = hourly.get("relativehumidity_2m", [])[start:]
+    et0 = hourly.get("et0_fao_evapotranspiration", [])[start:]
+    # Calculate summaries
+
+    rain_6h = sum(precip[:6]) if len(precip) >= 6 else sum(precip)
+    rain_24h = sum(precip[:24]) if len(precip) >= 24 else sum(precip)
+    rain_48h = sum(precip[:48]) if len(precip) >= 48 else sum(precip)
+
+    # Find peak rain hour in next 48h
+    peak_val = 0.0
+    peak_hour = "Unknown"
+    for i in range(min(48, len(precip))):
+        if precip[i] > peak_val:
+            peak_val = precip[i]
+            peak_hour = times[i]
+
+    return {
+        "hourly_time": times,
+        "hourly_rain_mm": precip,
+        "hourly_temp_c": temps,
+        "hourly_humidity_pct": humids,
+        "hourly_et0_mm": et0,
+        "rain_next_6h_mm": rain_6h,
+        "rain_next_24h_mm": rain_24h,
+        "rain_next_48h_mm": rain_48h,
+        "peak_rain_hour": peak_hour,
+        "utc_offset_seconds": data.get("utc_offset_seconds"),
+    }
+
 
 class WeatherService:
-    @lru_cache(maxsize=1)
-    def _get_cached_forecast(self, timestamp_hour):
-        """Cache results for the current hour to avoid redundant API calls."""
+    """Open-Meteo forecast behind a stale-while-revalidate cache.
+
+    Fetches run on a background event loop through one pooled
+    `httpx.AsyncClient`. Each fetched forecast is written atomically to
+    `cache_dir`, one file per location and hour, and every worker reads the
+    current hour's file before fetching itself. A prefetcher writes the
+    next hour's file just before the boundary, so at rollover workers
+    switch without a request.
+
+    Until the new hour's forecast is in, callers keep getting the last good
+    one while a single refresh runs; concurrent callers share it. A cold
+    start serves the newest cached forecast, and only waits for a fetch
+    when the cache is empty. A failed fetch keeps the old forecast and is
+    retried after WEATHER_RETRY_SECONDS. `url` and `transport` let tests
+    use a stub server.
+    """
+
+    def __init__(self, url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 timeout: float = FETCH_TIMEOUT, cache_dir: Optional[Path] = None,
+                 latitude: float = LAT, longitude: float = LON):
+        self.url = url or OPEN_METEO_URL
+        self.transport = transport
+        self.timeout = timeout
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cache_dir = Path(cache_dir or WEATHER_CACHE_DIR) / f"{latitude:.4f}_{longitude:.4f}"
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh: Optional[Future] = None
+        self._prefetch: Optional[Future] = None
+        self._hour: Optional[str] = None
+        self._forecast: Optional[dict] = None
+        self._failed_at: Optional[float] = None
+        self._metrics = {"fetches": 0, "failures": 0, "stale_served": 0, "cache_reads": 0, "prefetches": 0}
+        _services.add(self)
+
+    def _after_fork(self):
+        # The child has none of the parent's threads: its loop never runs, its
+        # futures never finish and its lock may be held forever
+        self._lock = threading.Lock()
+        self._loop = self._client = self._refresh = self._prefetch = None
+
+    def _io_loop(self) -> asyncio.AbstractEventLoop:
+        # One loop thread per process; a forked worker starts its own
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="weather-io", daemon=True).start()
+            self._loop = loop
+        return self._loop
+
+    async def fetch(self) -> dict:
+        """One Open-Meteo request; raises on HTTP errors or a response without hourly data."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self.transport, timeout=self.timeout,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            )
+        params = {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "hourly": "precipitation,temperature_2m,relativehumidity_2m,et0_fao_evapotranspiration",
+            "forecast_days": FORECAST_DAYS,
+            "timezone": FORECAST_TIMEZONE
+        }
+        response = await self._client.get(self.url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if "hourly" not in data:
+            raise ValueError("Weather API response has no hourly data")
+        return data
+
+    # ── Disk cache ───────────────────────────────────────────────
+    def _path(self, hour: str) -> Path:
+        return self.cache_dir / f"{hour}.json"
+
+    def cached_hours(self) -> list:
+        """Hours with a cached forecast for this location, oldest first."""
+        if not self.cache_dir.is_dir():
+            return []
+        return sorted(p.stem for p in self.cache_dir.glob("*.json"))
+
+    def _write_cache(self, hour: str, data: dict):
+        """Write one hour's response atomically, then prune files past WEATHER_CACHE_HOURS."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".json.tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({
+                    "hourly": data["hourly"],
+                    "utc_offset_seconds": data.get("utc_offset_seconds", 0),
+                    "fetched_at": datetime.now(timezone.utc).isoformat(),
+                }, f)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self._path(hour))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        cutoff = (datetime.now() - timedelta(hours=WEATHER_CACHE_HOURS)).strftime(HOUR_FORMAT)
+        for old in self.cached_hours():
+            if old < cutoff:
+                self._path(old).unlink(missing_ok=True)
+
+    def _read_cache(self, hour: str) -> Optional[dict]:
+        try:
+            with open(self._path(hour)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._metrics["cache_reads"] += 1
+        return data
+
+    def _adopt(self, hour: str, data: dict):
+        forecast = summarize_forecast(data)
+        with self._lock:
+            self._hour, self._forecast, self._failed_at = hour, forecast, None
+
+    def _adopt_cached(self, clock: str) -> bool:
+        """Serve the current hour's file if any worker wrote it; on a cold start, the newest file."""
+        data = self._read_cache(clock) if self._path(clock).exists() else None
+        if data is not None:
+            self._adopt(clock, data)
+            return True
+        if self._forecast is None:
+            for hour in reversed(self.cached_hours()):
+                data = self._read_cache(hour)
+                if data is not None:
+                    self._adopt(hour, data)
+                    break
+        return False
+
+    # ── Fetching ─────────────────────────────────────────────────
+    async def _fetch_hour(self, hour: str) -> Optional[dict]:
+        self._metrics["fetches"] += 1
         try:
-            params = {
-                "latitude": LAT,
-                "longitude": LON,
-                "hourly": "precipitation,temperature_2m,relativehumidity_2m",
-                "forecast_days": 3,
-                "timezone": "Asia/Colombo"
-            }
-            response = httpx.get(OPEN_METEO_URL, params=params, timeout=10.0)
-            response.raise_for_status()
-            return response.json()
+            data = await self.fetch()
         except Exception as e:
+            self._metrics["failures"] += 1
+            self._failed_at = time.monotonic()
             print(f"WARNING: Weather API fetch failed: {e}")
             return None
+        try:
+            self._write_cache(hour, data)
+        except OSError as e:
+            print(f"WARNING: Could not cache weather forecast: {e}")
+        return data
+
+    async def _refresh_hour(self, hour: str):
+        # Another worker may have written this hour while the refresh was queued
+        data = self._read_cache(hour) or await self._fetch_hour(hour)
+        if data is not None:
+            self._adopt(hour, data)
+
+    def refresh(self) -> Future:
+        """Start fetching the current hour's forecast, or join the fetch already running."""
+        with self._lock:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.run_coroutine_threadsafe(self._refresh_hour(self._clock_hour()), self._io_loop())
+            return self._refresh
+
+    @staticmethod
+    def _clock_hour() -> str:
+        return datetime.now().strftime(HOUR_FORMAT)
+
+    def _served(self):
+        """(hour, forecast) to serve now, starting a refresh when the hour has rolled over."""
+        clock = self._clock_hour()
+        if self._hour == clock or self._adopt_cached(clock):
+            return self._hour, self._forecast
+        if self._failed_at is None or time.monotonic() - self._failed_at >= WEATHER_RETRY_SECONDS:
+            pending = self.refresh()
+            if self._forecast is None:
+                try:
+                    pending.result(timeout=self.timeout + 1)
+                except FutureTimeout:
+                    pass
+                return self._hour, self._forecast
+        if self._forecast is not None:
+            self._metrics["stale_served"] += 1
+        return self._hour, self._forecast
+
+    def cache_hour(self) -> str:
+        """Key of the forecast currently served; changes when a new hour's forecast arrives."""
+        return self._served()[0] or "none"
+
+    def served_hour(self) -> str:
+        """Like `cache_hour`, but never fetches or waits.
+
+        It only picks up the current hour's file when the prefetcher or
+        another worker has written it; otherwise the hour already served
+        stays, until a `cache_hour` or forecast call refreshes it.
+        """
+        if self._hour != self._clock_hour():
+            self._adopt_cached(self._clock_hour())
+        return self._hour or "none"
 
     def get_weather_forecast(self):
-        # Use current hour as cache key
-        current_hour = datetime.now().strftime("%Y-%m-%d-%H")
-        data = self._get_cached_forecast(current_hour)
-
-        if not data or "hourly" not in data:
-            return {
-                "hourly_time": [],
-                "hourly_rain_mm": [0.0] * 72,
-                "hourly_temp_c": [],
-                "hourly_humidity_pct": [],
-                "rain_next_6h_mm": 0.0,
-                "rain_next_24h_mm": 0.0,
-                "rain_next_48h_mm": 0.0,
-                "peak_rain_hour": "Unknown"
-            }
-
-        hourly = data["hourly"]
-        times = hourly.get("time", [])
-        precip = hourly.get("precipitation", [])
-        temps = hourly.get("temperature_2m", [])
-        humids = hourly.get("relativehumidity_2m", [])
-        # Calculate summaries
-
-        rain_6h = sum(precip[:6]) if len(precip) >= 6 else sum(precip)
-        rain_24h = sum(precip[:24]) if len(precip) >= 24 else sum(precip)
-        rain_48h = sum(precip[:48]) if len(precip) >= 48 else sum(precip)
-
-        # Find peak rain hour in next 48h
-        peak_val = 0.0
-        peak_hour = "Unknown"
-        for i in range(min(48, len(precip))):
-            if precip[i] > peak_val:
-                peak_val = precip[i]
-                peak_hour = times[i]
+        forecast = self._served()[1]
+        # Shallow copy so callers can't alter the cached summary's top level
+        return dict(forecast) if forecast is not None else _empty_forecast()
+
+    # ── Prefetch ─────────────────────────────────────────────────
+    async def prefetch(self, hour: str) -> bool:
+        """Write `hour`'s forecast to the cache unless it is there already.
 
+        One worker fetches; the others find the lock held and skip.
+        """
+        if self._path(hour).exists():
+            return True
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / ".prefetch.lock", "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            try:
+                if self._path(hour).exists():
+                    return True
+                self._metrics["prefetches"] += 1
+                return await self._fetch_hour(hour) is not None
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    async def _prefetch_loop(self, lead: float):
+        while True:
+            now = datetime.now()
+            boundary = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            await asyncio.sleep(max((boundary - now).total_seconds() - lead, 0))
+            hour = boundary.strftime(HOUR_FORMAT)
+            # Failures retry until the boundary passes; the refresh takes over from there
+            while not await self.prefetch(hour) and datetime.now() < boundary:
+                await asyncio.sleep(min(WEATHER_RETRY_SECONDS, lead / 4))
+            await asyncio.sleep(max((boundary - datetime.now()).total_seconds(), 0) + 1)
+
+    def start_prefetch(self, lead: float = WEATHER_PREFETCH_LEAD):
+        """Prefetch each hour's forecast `lead` seconds before the hour starts."""
+        loop = self._io_loop()
+        if self._prefetch is None:
+            self._prefetch = asyncio.run_coroutine_threadsafe(self._prefetch_loop(lead), loop)
+
+    def metrics(self) -> dict:
         return {
-            "hourly_time": times,
-            "hourly_rain_mm": precip,
-            "hourly_temp_c": temps,
-            "hourly_humidity_pct": humids,
-            "rain_next_6h_mm": rain_6h,
-            "rain_next_24h_mm": rain_24h,
-            "rain_next_48h_mm": rain_48h,
-            "peak_rain_hour": peak_hour
+            **self._metrics,
+            "hour": self._hour,
+            "refreshing": self._refresh is not None and not self._refresh.done(),
+            "cached_hours": len(self.cached_hours()),
         }
+
+    def close(self):
+        """Stop the prefetcher, close the connection pool and stop the loop thread."""
+        loop, client = self._loop, self._client
+        if loop is None:
+            return
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = self._client = self._prefetch = None
+
+
 weather_service = WeatherService()
@@ -0,0 +1,147 @@
+"""Parity checks: compiled tree models against the joblib originals.
+
+Run after `python backend/compile_models.py`:
+
+    python test_compiled_models.py
+"""
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.shared_store import load_artifact
+from services.tree_ensemble import CompiledEnsemble, compiled_path, file_digest
+
+ML_DIR = BACKEND_DIR / "ML"
+RF_PATH = ML_DIR / "rf_classifier.joblib"
+XGB_PATHS = [ML_DIR / "xgb_regressor.joblib", ML_DIR / "Irrigation" / "xgb_regressor.joblib"]
+
+
+def _pair(path):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        original = load_artifact(path)
+    return original, CompiledEnsemble.load(compiled_path(path))
+
+
+def _inputs(n_features, rows=500, seed=0):
+    return np.random.default_rng(seed).normal(0, 50, (rows, n_features)).astype(np.float32)
+
+
+def _on_thresholds(compiled, rows=200, seed=1):
+    # Every feature set to a threshold the model really splits on, where a
+    # <= vs < or float32 rounding mistake would send rows the wrong way
+    rng = np.random.default_rng(seed)
+    splits = compiled.threshold[np.isfinite(compiled.threshold)]
+    X = rng.choice(splits, (rows, compiled.n_features_in_)).astype(np.float32)
+    return np.vstack([X, np.nextafter(X, np.float32(np.inf))])
+
+
+def _history_matrix():
+    import json
+    from services.data_store import data_store
+    from services.feature_plan import FeaturePlan, WeatherTrack
+
+    names = json.loads((ML_DIR / "feature_list.json").read_text())
+    return FeaturePlan(names).fill(data_store.feature_frame(), WeatherTrack.from_forecast(None)).copy()
+
+
+def test_compiled_files_match_sources():
+    for path in [RF_PATH] + XGB_PATHS:
+        assert CompiledEnsemble.load(compiled_path(path)).source == file_digest(path), f"{compiled_path(path)} is stale"
+
+
+def test_random_forest_probabilities():
+    rf, compiled = _pair(RF_PATH)
+    for X in (_inputs(39), _on_thresholds(compiled), _history_matrix()):
+        assert np.abs(rf.predict_proba(X) - compiled.predict_proba(X)).max() < 1e-12
+        assert (rf.predict(X) == compiled.predict(X)).all()
+    assert list(compiled.classes_) == list(rf.classes_)
+
+
+def test_xgboost_regressors():
+    for path in XGB_PATHS:
+        xgb, compiled = _pair(path)
+        for X in (_inputs(compiled.n_features_in_), _on_thresholds(compiled)):
+            assert (xgb.predict(X) == compiled.predict(X)).all(), path
+    xgb, compiled = _pair(XGB_PATHS[0])
+    X = _history_matrix()
+    assert (xgb.predict(X) == compiled.predict(X)).all()
+
+
+def test_single_rows():
+    for path in [RF_PATH] + XGB_PATHS:
+        original, compiled = _pair(path)
+        X = _inputs(compiled.n_features_in_, rows=20, seed=2)
+        predict = "predict_proba" if compiled.kind == "proba" else "predict"
+        for row in X:
+            expected = getattr(original, predict)(row[None, :])
+            assert np.allclose(getattr(compiled, predict)(row[None, :]), expected, rtol=0, atol=1e-12)
+
+
+def test_missing_values():
+    for path in [RF_PATH] + XGB_PATHS:
+        original, compiled = _pair(path)
+        X = _inputs(compiled.n_features_in_, rows=200, seed=3)
+        X[np.random.default_rng(4).random(X.shape) < 0.2] = np.nan
+        predict = "predict_proba" if compiled.kind == "proba" else "predict"
+        assert np.allclose(getattr(compiled, predict)(X), getattr(original, predict)(X), rtol=0, atol=1e-12), path
+
+
+def test_uncertainty():
+    for path in [RF_PATH] + XGB_PATHS:
+        original, compiled = _pair(path)
+        X = _inputs(compiled.n_features_in_, rows=100, seed=5)
+        stats = compiled.uncertainty(X)
+        predict = "predict_proba" if compiled.kind == "proba" else "predict"
+        assert np.allclose(stats["mean"], getattr(original, predict)(X), rtol=0, atol=1e-12), path
+        assert (stats["p10"] <= stats["p50"]).all() and (stats["p50"] <= stats["p90"]).all(), path
+        assert (stats["spread"] >= 0).all(), path
+
+
+def test_forest_regressor():
+    from sklearn.ensemble import RandomForestRegressor
+    from services.tree_ensemble import compile_model
+
+    rng = np.random.default_rng(6)
+    X, y = rng.normal(size=(300, 7)), rng.normal(size=(300, 4))
+    forest = RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+    compiled = compile_model(forest)
+    X_test = _inputs(7, rows=100, seed=7) / 50
+    assert np.abs(compiled.predict(X_test) - forest.predict(X_test)).max() < 1e-12
+    outputs = np.stack([tree.predict(X_test) for tree in forest.estimators_], axis=1)
+    assert np.allclose(compiled.uncertainty(X_test)["p90"], np.percentile(outputs, 90, axis=1), rtol=0, atol=1e-12)
+
+
+def main():
+    print("🌲 Compiled model parity")
+    print("=" * 60)
+    tests = [
+        test_compiled_files_match_sources,
+        test_random_forest_probabilities,
+        test_xgboost_regressors,
+        test_single_rows,
+        test_missing_values,
+        test_uncertainty,
+        test_forest_regressor,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
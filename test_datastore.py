@@ -1,5 +1,6 @@
 import sys
-sys.path.insert(0, 'd:\\PEnDrive Data\\IOT Project\\backend')
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
 
 from services.data_store import data_store
 
@@ -8,7 +9,7 @@ print("Current data loaded by data_store:")
 for key, value in sorted(current.items()):
     print(f"  {key}: {value}")
 
-print(f"\nTotal historical records: {len(data_store.historical_data)}")
+print(f"\nTotal historical records: {len(data_store.sensors)}")
 print("\nLast 5 records:")
-for record in data_store.historical_data[-5:]:
+for record in data_store.sensors.records(len(data_store.sensors) - 5):
     print(f"  {record.get('timestamp')}: moisture={record.get('soil_moisture')}, wfps={record.get('wfps')}")
@@ -0,0 +1,108 @@
+"""Live FeatureEngine against the batch FeatureFrame on the same history.
+
+    python test_feature_parity.py
+"""
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+warnings.simplefilter("ignore")
+
+from services.data_store import data_store
+from services.feature_engine import FeatureEngine
+from services.feature_plan import LOOKBACK_ROWS, PRODUCERS, FeatureFrame, FeaturePlan, WeatherTrack
+from services.sensor_store import SensorStore
+
+COLUMNS = ("wfps", "soil_temp", "air_temp", "humidity")
+PLAN = FeaturePlan(list(PRODUCERS))
+
+
+def _history(rows=400):
+    """The last `rows` CSV readings, with a few gaps punched in."""
+    store = data_store.sensors
+    rows = min(rows, len(store))
+    timestamps = store.timestamps[-rows:].copy()
+    columns = {name: store.column(name)[-rows:].astype(np.float64) for name in COLUMNS}
+    rng = np.random.default_rng(3)
+    for values in columns.values():
+        values[rng.random(rows) < 0.05] = np.nan
+    return timestamps, columns
+
+
+def _weather(timestamps):
+    """A forecast covering all but the first day of the history, with missing hours."""
+    rng = np.random.default_rng(5)
+    hours = np.arange(timestamps[24], timestamps[-1] + 49 * 3600, 3600)
+    times = np.datetime_as_string(hours.astype("datetime64[s]"), unit="m").tolist()
+
+    def series(values):
+        return [None if rng.random() < 0.03 else round(float(v), 2) for v in values]
+
+    return WeatherTrack.from_forecast({
+        "hourly_time": times,
+        "hourly_rain_mm": series(np.where(rng.random(len(hours)) < 0.2, rng.gamma(1.5, 4.0, len(hours)), 0.0)),
+        "hourly_et0_mm": series(rng.uniform(0, 0.6, len(hours))),
+        "hourly_temp_c": series(rng.uniform(24, 34, len(hours))),
+        "hourly_humidity_pct": series(rng.uniform(60, 98, len(hours))),
+    })
+
+
+def test_engine_matches_frame_row_by_row():
+    timestamps, columns = _history()
+    weather = _weather(timestamps)
+    start = LOOKBACK_ROWS + 10
+    # Row k of the batch is the latest-row vector once the store holds start + k rows
+    batch = PLAN.fill(FeatureFrame(timestamps, columns, targets=len(timestamps) - start + 1), weather).copy()
+
+    store = SensorStore(timestamps[:start], {name: values[:start] for name, values in columns.items()})
+    engine = FeatureEngine(store)
+    for k, expected in enumerate(batch):
+        if k:
+            row = start + k - 1
+            store.append(timestamps[row:row + 1], {name: values[row:row + 1] for name, values in columns.items()})
+        live = engine.fill(PLAN, weather)[0]
+        assert np.allclose(live, expected, equal_nan=True), \
+            [name for name, a, b in zip(PLAN.names, live, expected) if not np.allclose(a, b, equal_nan=True)]
+
+
+def test_engine_catches_up_after_a_gap():
+    timestamps, columns = _history()
+    weather = _weather(timestamps)
+    store = SensorStore(timestamps[:100], {name: values[:100] for name, values in columns.items()})
+    engine = FeatureEngine(store)
+    engine.fill(PLAN, weather)
+    # More rows than the warm-up window arrive at once, then a few more
+    for stop in (300, 305):
+        done = len(store)
+        store.append(timestamps[done:stop], {name: values[done:stop] for name, values in columns.items()})
+        live = engine.fill(PLAN, weather)
+        batch = PLAN.fill(FeatureFrame(timestamps[:stop], {n: v[:stop] for n, v in columns.items()}, targets=1), weather)
+        assert np.allclose(live, batch, equal_nan=True)
+
+
+def main():
+    print("🧮 Feature parity (live vs batch)")
+    print("=" * 60)
+    tests = [
+        test_engine_matches_frame_row_by_row,
+        test_engine_catches_up_after_a_gap,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Ingest semantics against a fresh copy of the CSV history.
+
+    python test_ingest.py
+"""
+import sys
+import warnings
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+warnings.simplefilter("ignore")
+
+import numpy as np
+
+from services.data_store import DataStore
+from services.feature_engine import FeatureEngine
+from services.feature_plan import FeaturePlan, WeatherTrack
+from services.range_stats import RangeStats
+from services.rollups import RollupPyramid
+
+
+def _at(store, hours, minutes=0):
+    """ISO time `hours` (plus `minutes`) after the latest stored reading."""
+    epoch = int(store.sensors.timestamps[-1]) + hours * 3600 + minutes * 60
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def test_readings_are_bucketed_to_the_hour():
+    store = DataStore()
+    rows = len(store.sensors)
+    soil = [{"node_id": "s1", "timestamp": _at(store, 1, m), "moisture_pct": 20.0 + m / 5} for m in (10, 0, 5)]
+    result = store.ingest(soil, [])
+    assert result["accepted"] == 1 and result["duplicates"] == 2
+    assert len(store.sensors) == rows + 1
+    assert store.sensors.row(-1)["soil_moisture"] == 22.0  # latest reading of the hour
+
+
+def test_late_node_is_merged_into_the_tail_row():
+    store = DataStore()
+    rows = len(store.sensors)
+    store.ingest([{"node_id": "s1", "timestamp": _at(store, 1), "moisture_pct": 20.0}], [])
+    assert store.sensors.row(-1)["data_source"] == "ingest:soil"
+    before = store.get_range_stats("air_temp")["count"]
+
+    result = store.ingest([], [{"node_id": "a1", "timestamp": _at(store, 0, 20), "air_temp_c": 31.5}])
+    assert result["merged"] == 1 and result["accepted"] == 0 and result["duplicates"] == 0
+    row = store.sensors.row(-1)
+    assert row["air_temp"] == 31.5 and row["soil_moisture"] == 20.0
+    assert row["data_source"] == "ingest:air+soil"
+    assert len(store.sensors) == rows + 1
+    # Consumers see the edit instead of the forward-filled value
+    assert store.get_range_stats("air_temp")["count"] == before
+    assert store.get_range_stats("air_temp", start=int(store.sensors.timestamps[-1]))["mean"] == 31.5
+
+
+def test_tail_merge_refolds_only_the_last_row():
+    store = DataStore()
+    plan = FeaturePlan(["wfps_pct", "wfps_rate_1h", "wfps_12h_mean", "humidity_pct",
+                        "humidity_rate_1h", "air_temp_c", "drainage_lag_h"])
+    weather = WeatherTrack.from_forecast(None)
+    store.ingest([{"node_id": "s1", "timestamp": _at(store, 1), "moisture_pct": 45.0}], [])
+    # Warm every incremental reader before the merge
+    store.get_series("humidity", 400, "daily")
+    store.get_range_stats("humidity")
+    store.features.fill(plan, weather)
+    levels, stats = store.rollups.levels, store.range_stats.parameters["humidity"]
+
+    store.ingest([], [{"node_id": "a1", "timestamp": _at(store, 0, 40), "air_temp_c": 35.0, "humidity_pct": 99.0}])
+    assert store.sensors.tail_edits == 1
+    daily = store.get_series("humidity", 400, "daily")
+    assert store.rollups.levels is levels and store.range_stats.parameters["humidity"] is stats
+    live = store.features.fill(plan, weather).copy()
+
+    # Same answers as readers built from scratch
+    fresh = RollupPyramid(store.sensors).query("daily", "humidity")
+    for key in ("value", "min", "max"):
+        assert np.allclose(daily[key][-3:], fresh[key][-3:])
+    rows = len(store.sensors)
+    assert store.range_stats.query("humidity", 0, rows) == RangeStats(store.sensors).query("humidity", 0, rows)
+    assert np.allclose(live, FeatureEngine(store.sensors).fill(plan, weather), equal_nan=True)
+
+
+def test_duplicates_need_the_node_to_be_present():
+    store = DataStore()
+    store.ingest([], [{"node_id": "a1", "timestamp": _at(store, 1), "air_temp_c": 30.0}])
+    result = store.ingest([], [{"node_id": "a1", "timestamp": _at(store, 0, 30), "air_temp_c": 99.0}])
+    assert result["duplicates"] == 1 and result["merged"] == 0
+    assert store.sensors.row(-1)["air_temp"] == 30.0
+    # An older hour with both nodes from the CSV is a duplicate; no older hour is edited
+    result = store.ingest([{"node_id": "s1", "timestamp": _at(store, -5), "moisture_pct": 1.0}], [])
+    assert result["duplicates"] == 1
+
+
+def test_mixed_offsets_use_each_wall_clock():
+    store = DataStore()
+    tail = datetime.fromtimestamp(int(store.sensors.timestamps[-1]), tz=timezone.utc).replace(tzinfo=None)
+    colombo = timezone(timedelta(hours=5, minutes=30))
+    soil = [
+        {"node_id": "s1", "timestamp": (tail + timedelta(hours=1)).replace(tzinfo=colombo), "moisture_pct": 20.0},
+        {"node_id": "s2", "timestamp": (tail + timedelta(hours=2)).replace(tzinfo=timezone.utc), "moisture_pct": 21.0},
+    ]
+    air = [{"node_id": "a1", "timestamp": tail + timedelta(hours=3), "air_temp_c": 30.0}]
+    result = store.ingest(soil, air)
+    assert result["accepted"] == 3
+    assert [row["timestamp"] for row in store.sensors.records(len(store.sensors) - 3)] == [
+        f"{tail + timedelta(hours=h):%Y-%m-%dT%H:%M:%S}+00:00" for h in (1, 2, 3)
+    ]
+
+
+def main():
+    print("📥 Sensor ingest")
+    print("=" * 60)
+    tests = [
+        test_readings_are_bucketed_to_the_hour,
+        test_late_node_is_merged_into_the_tail_row,
+        test_tail_merge_refolds_only_the_last_row,
+        test_duplicates_need_the_node_to_be_present,
+        test_mixed_offsets_use_each_wall_clock,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
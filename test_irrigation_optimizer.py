@@ -0,0 +1,95 @@
+"""Irrigation schedule optimizer against brute force on a small grid.
+
+    python test_irrigation_optimizer.py
+"""
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from services.irrigation_optimizer import (
+    BAND_PENALTY_PER_POINT, WATER_COST_PER_L_PER_M2, WATERLOGGING_WFPS, optimize_schedule, peak_wfps,
+)
+
+BAND = (20.0, 30.0)
+ACTIONS = np.array([0.0, 4.0, 8.0, 12.0])
+# Every moisture the plan can reach lies on the 0.5-point grid, so the DP is exact
+POINTS_PER_L = 0.5
+
+
+def _brute_force(moisture, rain, loss, rain_48h, blocked):
+    best = np.inf
+    for plan in itertools.product(range(len(ACTIONS)), repeat=len(rain)):
+        m, total = moisture, 0.0
+        for d, a in enumerate(plan):
+            wetted = m + ACTIONS[a] * POINTS_PER_L
+            if ACTIONS[a] > 0 and (blocked[d] or peak_wfps(wetted, rain_48h[d]) > WATERLOGGING_WFPS):
+                total = np.inf
+                break
+            m = min(max(wetted + rain[d] * POINTS_PER_L - loss[d], 0.0), 100.0)
+            stress = max(BAND[0] - m, 0) + max(m - BAND[1], 0)
+            total += ACTIONS[a] * WATER_COST_PER_L_PER_M2 + stress * BAND_PENALTY_PER_POINT
+        best = min(best, total)
+    return best
+
+
+def _plan_cost(plan):
+    end = plan["moisture_end"]
+    stress = np.maximum(BAND[0] - end, 0) + np.maximum(end - BAND[1], 0)
+    return float(plan["water_cost"].sum() + (stress * BAND_PENALTY_PER_POINT).sum())
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        days = 4
+        moisture = float(rng.integers(20, 70)) / 2
+        rain = rng.choice([0.0, 0.0, 2.0, 10.0], size=days)
+        loss = rng.integers(4, 16, size=days) / 2
+        rain_48h = rain + np.roll(rain, -1)
+        blocked = rng.random(days) < 0.2
+        plan = optimize_schedule(moisture, rain, loss, rain_48h, ACTIONS, BAND, POINTS_PER_L, blocked)
+        assert abs(_plan_cost(plan) - _brute_force(moisture, rain, loss, rain_48h, blocked)) < 1e-6
+
+
+def test_forbidden_days_are_honoured():
+    days = 7
+    rain = np.zeros(days)
+    loss = np.full(days, 3.0)
+    rain_48h = np.array([0.0, 0.0, 40.0, 0.0, 0.0, 0.0, 0.0])
+    blocked = np.array([True, False, False, False, True, False, False])
+    # A dry soil off the grid wants water every day
+    plan = optimize_schedule(12.3, rain, loss, rain_48h, ACTIONS, BAND, POINTS_PER_L, blocked)
+    volume = plan["volume_l_per_m2"]
+    assert volume[0] == 0 and volume[4] == 0
+    wetted = plan["moisture_start"] + volume * POINTS_PER_L
+    assert not np.any((volume > 0) & (peak_wfps(wetted, rain_48h) > WATERLOGGING_WFPS))
+    assert volume[1] > 0
+
+
+def main():
+    print("💧 Irrigation schedule optimizer")
+    print("=" * 60)
+    tests = [
+        test_matches_brute_force,
+        test_forbidden_days_are_honoured,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Range statistics against NumPy on random [start, end) ranges.
+
+    python test_range_stats.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from services.range_stats import RangeStats
+from services.sensor_store import SensorStore
+
+HOUR = 3600
+
+
+def _store(rows, rng):
+    values = rng.normal(60.0, 15.0, rows)
+    values[rng.random(rows) < 0.1] = np.nan
+    return SensorStore(np.arange(rows, dtype=np.int64) * HOUR, {"humidity": values})
+
+
+def _append(store, rows, rng):
+    start = int(store.timestamps[-1]) + HOUR
+    store.append(np.arange(rows, dtype=np.int64) * HOUR + start, {"humidity": rng.normal(60.0, 15.0, rows)})
+
+
+def _check(stats, values, start, stop):
+    got = stats.query("humidity", start, stop)
+    window = values[start:stop]
+    present = window[~np.isnan(window)]
+    if not len(present):
+        assert got is None, (start, stop, got)
+        return
+    assert got["count"] == len(present)
+    assert np.isclose(got["mean"], present.mean())
+    assert got["min"] == present.min() and got["max"] == present.max()
+    if len(present) > 1:
+        assert np.isclose(got["std"], present.std(ddof=1))
+    else:
+        assert got["std"] is None
+
+
+def test_random_ranges_match_numpy():
+    rng = np.random.default_rng(11)
+    store = _store(1000, rng)
+    stats = RangeStats(store)
+    values = store.column("humidity")
+    for _ in range(500):
+        start, stop = sorted(rng.integers(0, len(values) + 1, size=2))
+        _check(stats, values, int(start), int(stop))
+
+
+def test_empty_and_single_row_ranges():
+    rng = np.random.default_rng(12)
+    store = _store(300, rng)
+    stats = RangeStats(store)
+    values = store.column("humidity")
+    for start in (0, 1, 150, 299):
+        _check(stats, values, start, start)
+        _check(stats, values, start, start + 1)
+    assert stats.query("humidity", 200, 100) is None
+    # A range made only of missing readings
+    gap = int(np.flatnonzero(np.isnan(values))[0])
+    assert stats.query("humidity", gap, gap + 1) is None
+
+
+def test_just_appended_rows():
+    rng = np.random.default_rng(13)
+    store = _store(100, rng)
+    stats = RangeStats(store)
+    _check(stats, store.column("humidity"), 0, 100)
+    for rows in (1, 1, 7, 64, 200):
+        before = len(store)
+        _append(store, rows, rng)
+        values = store.column("humidity")
+        _check(stats, values, before, len(store))
+        _check(stats, values, len(store) - 1, len(store))
+        _check(stats, values, 0, len(store))
+        for _ in range(20):
+            start = int(rng.integers(0, len(store)))
+            _check(stats, values, start, int(rng.integers(start, len(store) + 1)))
+
+
+def test_tail_update_is_refolded():
+    rng = np.random.default_rng(14)
+    store = _store(100, rng)
+    stats = RangeStats(store)
+    _check(stats, store.column("humidity"), 0, 100)
+    store.update_tail({"humidity": 250.0})
+    values = store.column("humidity")
+    _check(stats, values, 0, 100)
+    _check(stats, values, 99, 100)
+    _check(stats, values, 64, 100)
+
+
+def main():
+    print("📏 Range statistics")
+    print("=" * 60)
+    tests = [
+        test_random_ranges_match_numpy,
+        test_empty_and_single_row_ranges,
+        test_just_appended_rows,
+        test_tail_update_is_refolded,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
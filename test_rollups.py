@@ -0,0 +1,133 @@
+"""Rollup buckets and LTTB downsampling.
+
+    python test_rollups.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from services.rollups import ROLLUP_LEVELS, RollupPyramid, lttb
+from services.sensor_store import SensorStore
+
+HOUR = 3600
+
+
+def _history(rows, rng):
+    """Hourly readings with random gaps, starting mid-day so buckets straddle chunks."""
+    timestamps = 1_700_000_000 - 1_700_000_000 % HOUR + 7 * HOUR + np.cumsum(rng.choice([1, 1, 1, 2, 5], rows)) * HOUR
+    return timestamps.astype(np.int64), rng.normal(25.0, 4.0, rows)
+
+
+def _expected(timestamps, values, seconds):
+    buckets = timestamps - timestamps % seconds
+    starts = np.unique(buckets)
+    groups = [values[buckets == start] for start in starts]
+    return {
+        "timestamps": starts,
+        "value": np.array([g.mean() for g in groups]),
+        "min": np.array([g.min() for g in groups]),
+        "max": np.array([g.max() for g in groups]),
+    }
+
+
+def _assert_matches(pyramid, timestamps, values):
+    for level, seconds in ROLLUP_LEVELS.items():
+        got = pyramid.query(level, "air_temp")
+        expected = _expected(timestamps, values, seconds)
+        assert np.array_equal(got["timestamps"], expected["timestamps"]), level
+        for key in ("value", "min", "max"):
+            assert np.allclose(got[key], expected[key]), (level, key)
+
+
+def test_chunked_folds_merge_into_the_open_bucket():
+    rng = np.random.default_rng(21)
+    timestamps, values = _history(600, rng)
+    store = SensorStore(timestamps[:5], {"air_temp": values[:5]})
+    pyramid = RollupPyramid(store)
+    _assert_matches(pyramid, timestamps[:5], values[:5])
+    # Chunks of 1..40 rows mostly end inside a 6h or daily bucket
+    done = 5
+    while done < len(timestamps):
+        stop = min(done + int(rng.integers(1, 40)), len(timestamps))
+        store.append(timestamps[done:stop], {"air_temp": values[done:stop]})
+        done = stop
+        _assert_matches(pyramid, timestamps[:done], values[:done])
+
+
+def test_window_selects_overlapping_buckets():
+    rng = np.random.default_rng(22)
+    timestamps, values = _history(300, rng)
+    pyramid = RollupPyramid(SensorStore(timestamps, {"air_temp": values}))
+    start, end = int(timestamps[40]) + 1800, int(timestamps[200])
+    for level, seconds in ROLLUP_LEVELS.items():
+        got = pyramid.query(level, "air_temp", start, end)
+        starts = _expected(timestamps, values, seconds)["timestamps"]
+        expected = starts[(starts + seconds > start) & (starts < end)]
+        assert np.array_equal(got["timestamps"], expected), level
+        assert pyramid.count(level, start, end) == len(expected)
+
+
+def test_tail_edit_rebuilds_the_last_bucket():
+    rng = np.random.default_rng(23)
+    timestamps, values = _history(200, rng)
+    store = SensorStore(timestamps, {"air_temp": values.copy()})
+    pyramid = RollupPyramid(store)
+    _assert_matches(pyramid, timestamps, values)
+    store.update_tail({"air_temp": 80.0})
+    values[-1] = 80.0
+    _assert_matches(pyramid, timestamps, values)
+
+
+def test_lttb_keeps_endpoints_and_exact_count():
+    rng = np.random.default_rng(24)
+    for n in (3, 4, 10, 101, 1000):
+        x = np.cumsum(rng.integers(1, 5, n)).astype(np.float64)
+        y = rng.normal(0.0, 1.0, n)
+        for threshold in sorted({3, 4, n // 2, n - 1}):
+            if threshold < 3 or threshold >= n:
+                continue
+            keep = lttb(x, y, threshold)
+            assert len(keep) == threshold, (n, threshold)
+            assert keep[0] == 0 and keep[-1] == n - 1
+            assert np.all(np.diff(keep) > 0)
+        # Nothing to drop, or too few points asked for: everything is kept
+        assert np.array_equal(lttb(x, y, n), np.arange(n))
+        assert np.array_equal(lttb(x, y, 2), np.arange(n))
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(500, dtype=np.float64)
+    y = np.sin(x / 40)
+    y[317] = 25.0
+    assert 317 in lttb(x, y, 50)
+
+
+def main():
+    print("📊 Rollups and LTTB")
+    print("=" * 60)
+    tests = [
+        test_chunked_folds_merge_into_the_open_bucket,
+        test_window_selects_overlapping_buckets,
+        test_tail_edit_rebuilds_the_last_bucket,
+        test_lttb_keeps_endpoints_and_exact_count,
+        test_lttb_keeps_a_spike,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Weather client against a local stub of the Open-Meteo API.
+
+    python test_weather_service.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import services.weather_service as weather_module
+from services.weather_service import WeatherService
+
+# The stub answers in UTC, where cached forecasts are trimmed to start today
+TODAY = datetime.now(timezone.utc).date()
+HOURLY = {
+    "time": [f"{TODAY}T{h:02d}:00" for h in range(24)],
+    "precipitation": [0.0] * 10 + [4.5] + [0.5] * 13,
+    "temperature_2m": [27.0] * 24,
+    "relativehumidity_2m": [80.0] * 24,
+    "et0_fao_evapotranspiration": [0.1] * 24,
+}
+
+
+class StubServer:
+    """Serves HOURLY, counting requests; `fail` answers 500, `delay` slows every answer."""
+
+    def __init__(self):
+        self.requests = 0
+        self.fail = False
+        self.delay = 0.0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.delay)
+                body = b"{}" if stub.fail else json.dumps({"hourly": HOURLY}).encode()
+                self.send_response(500 if stub.fail else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/forecast"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _service(stub, hour="2026-10-17-10", cache_dir=None):
+    service = WeatherService(url=stub.url, timeout=2.0, cache_dir=cache_dir or tempfile.mkdtemp())
+    service._clock_hour = lambda: hour
+    return service
+
+
+def test_fetches_and_summarizes():
+    stub = StubServer()
+    service = _service(stub)
+    try:
+        forecast = service.get_weather_forecast()
+        assert forecast["rain_next_24h_mm"] == sum(HOURLY["precipitation"])
+        assert forecast["peak_rain_hour"] == f"{TODAY}T10:00"
+        assert service.cache_hour() == "2026-10-17-10"
+        service.get_weather_forecast()
+        assert stub.requests == 1
+    finally:
+        service.close()
+        stub.close()
+
+
+def test_concurrent_callers_share_one_fetch():
+    stub = StubServer()
+    stub.delay = 0.3
+    service = _service(stub)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(lambda _: service.get_weather_forecast(), range(32)))
+        assert stub.requests == 1
+        assert all(r["rain_next_48h_mm"] == results[0]["rain_next_48h_mm"] for r in results)
+    finally:
+        service.close()
+        stub.close()
+
+
+def test_serves_stale_while_refreshing():
+    stub = StubServer()
+    service = _service(stub)
+    try:
+        service.get_weather_forecast()
+        stub.delay = 0.5
+        service._clock_hour = lambda: "2026-10-17-11"
+        started = time.perf_counter()
+        assert service.cache_hour() == "2026-10-17-10"
+        assert service.get_weather_forecast()["hourly_time"] == HOURLY["time"]
+        assert time.perf_counter() - started < 0.2
+        service.refresh().result(timeout=5)
+        assert service.cache_hour() == "2026-10-17-11"
+        assert stub.requests == 2
+    finally:
+        service.close()
+        stub.close()
+
+
+def test_served_hour_never_fetches():
+    stub = StubServer()
+    stub.delay = 1.0
+    cache_dir = tempfile.mkdtemp()
+    service = _service(stub, cache_dir=cache_dir)
+    try:
+        started = time.perf_counter()
+        assert service.served_hour() == "none"
+        assert time.perf_counter() - started < 0.2
+        assert stub.requests == 0
+        # Picks up a file the prefetcher (here another worker) wrote
+        stub.delay = 0.0
+        writer = _service(stub, cache_dir=cache_dir)
+        writer.get_weather_forecast()
+        writer.close()
+        assert service.served_hour() == "2026-10-17-10"
+        assert stub.requests == 1
+    finally:
+        service.close()
+        stub.close()
+
+
+def test_failures_are_not_cached():
+    stub = StubServer()
+    stub.fail = True
+    service = _service(stub)
+    retry = weather_module.WEATHER_RETRY_SECONDS
+    try:
+        assert service.get_weather_forecast()["hourly_time"] == []
+        assert service.cache_hour() == "none"
+        assert stub.requests == 1  # no retry inside WEATHER_RETRY_SECONDS
+        weather_module.WEATHER_RETRY_SECONDS = 0
+        stub.fail = False
+        assert service.get_weather_forecast()["hourly_time"] == HOURLY["time"]
+        assert stub.requests == 2
+    finally:
+        weather_module.WEATHER_RETRY_SECONDS = retry
+        service.close()
+        stub.close()
+
+
+def test_workers_share_the_disk_cache():
+    stub = StubServer()
+    cache_dir = tempfile.mkdtemp()
+    first, second = _service(stub, cache_dir=cache_dir), _service(stub, cache_dir=cache_dir)
+    try:
+        first.get_weather_forecast()
+        assert first.cached_hours() == ["2026-10-17-10"]
+        assert second.get_weather_forecast()["hourly_time"] == HOURLY["time"]
+        assert second.cache_hour() == "2026-10-17-10"
+        assert stub.requests == 1
+    finally:
+        first.close()
+        second.close()
+        stub.close()
+
+
+def test_cold_start_offline_serves_cached_history():
+    stub = StubServer()
+    cache_dir = tempfile.mkdtemp()
+    online = _service(stub, hour="2026-10-17-08", cache_dir=cache_dir)
+    offline = _service(stub, hour="2026-10-17-11", cache_dir=cache_dir)
+    try:
+        online.get_weather_forecast()
+        stub.fail = True
+        started = time.perf_counter()
+        assert offline.get_weather_forecast()["rain_next_48h_mm"] == sum(HOURLY["precipitation"])
+        assert time.perf_counter() - started < 0.2  # served from disk, refreshing in the background
+        assert offline.cache_hour() == "2026-10-17-08"
+    finally:
+        online.close()
+        offline.close()
+        stub.close()
+
+
+def test_prefetch_writes_the_next_hour_once():
+    stub = StubServer()
+    cache_dir = tempfile.mkdtemp()
+    workers = [_service(stub, cache_dir=cache_dir) for _ in range(3)]
+    try:
+        for worker in workers:
+            assert asyncio.run_coroutine_threadsafe(worker.prefetch("2026-10-17-11"), worker._io_loop()).result(timeout=5)
+        assert stub.requests == 1
+        assert workers[0].cached_hours() == ["2026-10-17-11"]
+        workers[1]._clock_hour = lambda: "2026-10-17-11"
+        assert workers[1].get_weather_forecast()["hourly_time"] == HOURLY["time"]
+        assert stub.requests == 1
+    finally:
+        for worker in workers:
+            worker.close()
+        stub.close()
+
+
+def test_forked_worker_starts_its_own_loop():
+    stub = StubServer()
+    service = _service(stub)
+    try:
+        stub.delay = 0.5
+        service.refresh()
+        with service._lock:  # a refresh in flight, and the lock held, at fork time
+            pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                service._clock_hour = lambda: "2026-10-17-11"
+                service.refresh().result(timeout=5)
+                ok = service.cache_hour() == "2026-10-17-11"
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+    finally:
+        service.close()
+        stub.close()
+
+
+def test_old_days_are_trimmed():
+    # A forecast cached yesterday starts at yesterday's 00:00; served today, it starts today
+    yesterday = [f"{TODAY - timedelta(days=1)}T{h:02d}:00" for h in range(24)]
+    data = {"hourly": {"time": yesterday + HOURLY["time"], "precipitation": [9.0] * 24 + HOURLY["precipitation"]}}
+    summary = weather_module.summarize_forecast(data)
+    assert summary["hourly_time"] == HOURLY["time"]
+    assert summary["rain_next_24h_mm"] == sum(HOURLY["precipitation"])
+
+
+def test_now_is_in_the_forecast_timezone():
+    summary = weather_module.summarize_forecast({"hourly": HOURLY, "utc_offset_seconds": 19800})
+    assert summary["utc_offset_seconds"] == 19800
+    expected = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=5, minutes=30)
+    assert abs(weather_module.forecast_now(summary) - expected) < timedelta(seconds=5)
+    # Without an offset it falls back to the timezone the forecast is requested in
+    assert abs(weather_module.forecast_now(None) - expected) < timedelta(seconds=5)
+
+
+def main():
+    print("🌦️ Weather client")
+    print("=" * 60)
+    tests = [
+        test_fetches_and_summarizes,
+        test_concurrent_callers_share_one_fetch,
+        test_serves_stale_while_refreshing,
+        test_served_hour_never_fetches,
+        test_failures_are_not_cached,
+        test_workers_share_the_disk_cache,
+        test_cold_start_offline_serves_cached_history,
+        test_prefetch_writes_the_next_hour_once,
+        test_forked_worker_starts_its_own_loop,
+        test_old_days_are_trimmed,
+        test_now_is_in_the_forecast_timezone,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 60)
+    print(f"📊 Final Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())